@@ -6,6 +6,7 @@ Uses HKBU GenAI Platform for food recognition and calorie estimation
 import streamlit as st
 import os
 import time
+import uuid
 import pandas as pd
 from PIL import Image
 import plotly.express as px
@@ -14,8 +15,20 @@ from datetime import datetime
 
 # Import custom modules
 from utils.api_client import GenAIClient
-from utils.image_utils import save_uploaded_image, is_valid_image
+from utils.image_utils import IngestedImage
+from utils.rate_limit import set_rate_limit_session
+from utils.request_context import RequestContext
 from data.food_calories import get_food_calories
+from data.nutrient_table import macro_row, meal_macro_totals, nutrient_rows
+from jobs import (get_job_queue, JobWorkerPool, JOB_WORKERS, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS,
+                  STATUS_QUEUED, STATUS_DONE, STATUS_FAILED)
+from pipeline import recognize_image
+
+# 纯计算结果的缓存条目上限：按参数缓存，跨重新运行和会话复用，超出后淘汰最旧的条目
+PURE_CACHE_ENTRIES = int(os.environ.get("FOOD_PURE_CACHE_ENTRIES", 256))
+
+# 等待识别任务时，两次查询任务状态（重新运行脚本）之间的秒数
+JOB_PAGE_POLL_INTERVAL = float(os.environ.get("FOOD_JOB_PAGE_POLL_INTERVAL", 0.5))
 
 # 多语言支持 - 定义字典
 TRANSLATIONS = {
@@ -31,6 +44,10 @@ TRANSLATIONS = {
         "saving_image": "Saving image...",
         "identifying_food": "AI is identifying the food, please wait...",
         "getting_nutrition": "Getting nutrition information...",
+        "job_queued": "Waiting for a free recognition worker...",
+        "job_running": "Recognition in progress ({:.0f}s)...",
+        "error_job_timeout": "Recognition did not finish in time",
+        "error_no_workers": "No recognition worker is running",
         "recognition_results": "Recognition Results",
         "food_label": "Food",
         "calories_label": "Calories",
@@ -158,6 +175,10 @@ TRANSLATIONS = {
         "saving_image": "保存图像中...",
         "identifying_food": "AI正在识别食物中，请稍等...",
         "getting_nutrition": "正在获取营养信息...",
+        "job_queued": "正在等待空闲的识别进程...",
+        "job_running": "正在识别 ({:.0f}秒)...",
+        "error_job_timeout": "识别未能按时完成",
+        "error_no_workers": "没有运行中的识别进程",
         "recognition_results": "识别结果",
         "food_label": "食物",
         "calories_label": "热量",
@@ -534,6 +555,13 @@ def init_session_state():
         st.session_state.user_activity = None
     if 'profile_setup' not in st.session_state:
         st.session_state.profile_setup = False
+    # 已提交但尚未取回结果的识别任务ID
+    if 'pending_job' not in st.session_state:
+        st.session_state.pending_job = None
+    # 会话ID：限流排队模式下按会话公平分配API调用
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    set_rate_limit_session(st.session_state.session_id)
 
 def toggle_language():
     """Toggle between English and Chinese"""
@@ -617,6 +645,25 @@ def toggle_camera():
     """切换摄像头开关状态"""
     st.session_state.camera_on = not st.session_state.camera_on
 
+@st.cache_resource
+def get_genai_client(api_key):
+    """获取共享的GenAI客户端，跨重新运行和用户复用连接池"""
+    return GenAIClient(api_key)
+
+@st.cache_resource
+def get_job_workers(api_key):
+    """启动识别工作进程池（每个API key一次），识别任务在脚本重新运行之外执行"""
+    if JOB_WORKERS <= 0:
+        # 工作进程由 run_workers.py 单独运行（或者没有，此时在脚本中直接识别）
+        return None
+    return JobWorkerPool(get_genai_client(api_key), processes=JOB_WORKERS).start()
+
+def job_workers_available(workers):
+    """是否有工作进程执行识别任务：本服务启动的进程池，或由 run_workers.py 运行并发送心跳的工作进程"""
+    if workers is not None and workers.alive():
+        return True
+    return get_job_queue().live_workers() > 0
+
 def process_image(uploaded_file):
     """Process uploaded image and identify food"""
     st.session_state.food_names = None  # 使用复数形式表示可能有多个食物
@@ -626,13 +673,15 @@ def process_image(uploaded_file):
     st.session_state.show_nutrition_details = False  # 重置这个变量，确保每次处理新图片时都折叠营养信息
     
     if uploaded_file is not None:
-        if is_valid_image(uploaded_file):
+        # 一次性读取、校验并解码图片，后续显示、识别和颜色分析都复用内存中的数据
+        ingested = IngestedImage.from_uploaded_file(uploaded_file)
+        if ingested is not None:
             with st.spinner(get_text("saving_image")):
-                image_path = save_uploaded_image(uploaded_file)
+                image_path = ingested.save()
             
             if image_path:
                 # 处理图片并识别食物
-                process_image_path(image_path, uploaded_file.name)
+                process_image_path(ingested, uploaded_file.name)
             else:
                 st.session_state.error_message = get_text("error_saving")
                 st.error(st.session_state.error_message)
@@ -640,122 +689,137 @@ def process_image(uploaded_file):
             st.session_state.error_message = get_text("error_invalid_image")
             st.error(st.session_state.error_message)
 
-def process_image_path(image_path, file_name=None):
-    """处理图片路径并识别食物"""
-    st.session_state.image_path = image_path
+def process_image_path(image, file_name=None):
+    """提交识别任务，image可以是已解码的IngestedImage或图片路径；结果由poll_pending_job取回"""
+    ingested = image if isinstance(image, IngestedImage) else IngestedImage.from_path(image)
+    if ingested is None:
+        st.session_state.error_message = get_text("error_invalid_image")
+        st.error(st.session_state.error_message)
+        return
+    st.session_state.image_path = ingested.path
     
-    # 显示上传的图片
+    # 显示上传的图片（直接使用内存中的像素数据）
     if file_name:
-        st.image(Image.open(image_path), caption=f"{file_name}", use_column_width=True)
+        st.image(ingested.image, caption=f"{file_name}", use_column_width=True)
     else:
-        st.image(Image.open(image_path), caption="Captured photo", use_column_width=True)
+        st.image(ingested.image, caption="Captured photo", use_column_width=True)
     
-    with st.spinner(get_text("identifying_food")):
-        try:
-            # 显示调试信息
-            if st.session_state.debug_mode:
-                st.write(f"图片已保存至: {image_path}")
-            
-            # 创建GenAI客户端
-            client = GenAIClient(st.session_state.api_key)
-            if st.session_state.debug_mode:
-                st.write("API客户端已创建，开始识别食物...")
-            
-            # 识别食物
-            food_names = client.identify_food_in_image(image_path)
-            
-            # 处理多个食物的情况
-            if isinstance(food_names, list):
-                st.session_state.food_names = food_names
-                if st.session_state.debug_mode:
-                    st.write(f"识别到多种食物: {', '.join(food_names)}")
+    try:
+        # 显示调试信息
+        if st.session_state.debug_mode:
+            st.write(f"图片已保存至: {ingested.path}")
+        
+        # 确保工作进程已启动，然后把识别任务放入队列（语言和会话随任务传给工作进程）
+        workers = get_job_workers(st.session_state.api_key)
+        context = RequestContext(language=st.session_state.language, session_id=st.session_state.session_id)
+        if not job_workers_available(workers):
+            # 没有可用的工作进程：在当前脚本中直接识别，而不是提交一个无人执行的任务
+            with st.spinner(get_text("identifying_food")):
+                food_names, nutrition = recognize_image(get_genai_client(st.session_state.api_key), ingested, context)
+            record_recognition(food_names, nutrition)
+            return
+        st.session_state.pending_job = get_job_queue().submit(ingested.raw_bytes, ingested.name, context)
+        if st.session_state.debug_mode:
+            st.write(f"识别任务已提交: {st.session_state.pending_job}")
+    except Exception as e:
+        show_processing_error(e)
+
+def poll_pending_job():
+    """查询已提交的识别任务；未完成时稍等后重新运行脚本再查询，不会阻塞页面，也不会中断或重复识别"""
+    job_id = st.session_state.pending_job
+    if not job_id:
+        return
+    
+    job = get_job_queue().get(job_id)
+    if job is not None and job["status"] not in (STATUS_DONE, STATUS_FAILED):
+        if job["status"] == STATUS_QUEUED and not job_workers_available(get_job_workers(st.session_state.api_key)):
+            # 工作进程已全部停止，任务不会被执行
+            job["error"] = get_text("error_no_workers")
+        elif time.time() - job["created_at"] > JOB_LEASE_SECONDS * JOB_MAX_ATTEMPTS:
+            # 超过所有重试机会仍未完成
+            job["error"] = get_text("error_job_timeout")
+        else:
+            if job["status"] == STATUS_QUEUED:
+                st.caption(get_text("job_queued"))
             else:
-                st.session_state.food_names = [food_names]
-                if st.session_state.debug_mode:
-                    st.write(f"识别到食物: {food_names}")
-            
-            # 存储每种食物的营养信息和数据来源
-            st.session_state.calories_info_list = []
-            st.session_state.data_sources = []
-            
-            # 为每种食物获取营养信息
-            for food_name in st.session_state.food_names:
-                if st.session_state.debug_mode:
-                    st.write(f"开始获取 '{food_name}' 的营养信息...")
-                
-                with st.spinner(get_text("getting_nutrition")):
-                    # First try to get information from online sources
-                    online_data, source = client.get_online_food_calories(food_name)
-                    
-                    if online_data:
-                        st.session_state.calories_info_list.append(online_data)
-                        st.session_state.data_sources.append(source)
-                        if st.session_state.debug_mode:
-                            st.write(f"从 {source} 获取到数据")
-                    else:
-                        # If online data is not available, use local database
-                        if st.session_state.debug_mode:
-                            st.write("在线数据获取失败，尝试使用本地数据库...")
-                        local_data = get_food_calories(food_name)
-                        if local_data:
-                            st.session_state.calories_info_list.append(local_data)
-                            st.session_state.data_sources.append("Built-in Database" if st.session_state.language == "en" else "内置数据库")
-                            if st.session_state.debug_mode:
-                                st.write("使用内置数据库的数据")
-                        else:
-                            # Use online service to generate estimated values
-                            if st.session_state.debug_mode:
-                                st.write("本地数据库中未找到，尝试生成估计值...")
-                            estimated_data = client.fetch_nutrition_data_from_nutritionix(food_name)
-                            if estimated_data:
-                                st.session_state.calories_info_list.append(estimated_data)
-                                st.session_state.data_sources.append("Estimated (Nutritionix API)" if st.session_state.language == "en" else "估计值 (Nutritionix API)")
-                                if st.session_state.debug_mode:
-                                    st.write("使用估计值")
-                            
-                    # Record history for each food
-                    if st.session_state.calories_info_list and len(st.session_state.calories_info_list) > 0:
-                        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        calories = st.session_state.calories_info_list[-1].get("calories", 0)
-                        source = st.session_state.data_sources[-1] if st.session_state.data_sources else "Unknown"
-                        
-                        st.session_state.history.append({
-                            "food_name": food_name,
-                            "calories": calories,
-                            "timestamp": timestamp,
-                            "source": source
-                        })
-                        
-                        # Keep at most 10 history records
-                        if len(st.session_state.history) > 10:
-                            st.session_state.history = st.session_state.history[-10:]
-                
-        except Exception as e:
-            st.session_state.error_message = get_text("error_processing").format(str(e))
-            st.error(st.session_state.error_message)
-            st.info(get_text("api_unavailable"))
-            
-            # 显示详细错误信息
-            if st.session_state.debug_mode:
-                st.write(f"详细错误: {str(e)}")
-                import traceback
-                st.code(traceback.format_exc(), language="python")
-            
-            # Use default value for demo
-            food_name = "hamburger"
-            st.session_state.food_names = [food_name]
+                st.caption(get_text("job_running").format(time.time() - job["started_at"]))
+            with st.spinner(get_text("identifying_food")):
+                time.sleep(JOB_PAGE_POLL_INTERVAL)
+            st.rerun()
+        # 放弃的任务标记为失败，之后启动的工作进程不会再执行它
+        get_job_queue().fail(job_id, job["error"])
+    
+    st.session_state.pending_job = None
+    if job is not None and job["status"] == STATUS_DONE:
+        result = job["result"]
+        if st.session_state.debug_mode:
+            st.write(f"任务 {job_id} 用时 {job['finished_at'] - job['created_at']:.2f}秒，尝试 {job['attempts']} 次")
+        record_recognition(result["food_names"], [tuple(item) for item in result["nutrition"]])
+    else:
+        show_processing_error(job["error"] if job is not None and job["error"] else get_text("error_job_timeout"))
+
+def record_recognition(food_names, nutrition_results):
+    """保存识别到的食物及其营养信息，并记录历史"""
+    st.session_state.food_names = food_names
+    if st.session_state.debug_mode:
+        st.write(f"识别到食物: {', '.join(food_names)}")
+    
+    # 存储每种食物的营养信息和数据来源
+    st.session_state.calories_info_list = []
+    st.session_state.data_sources = []
+    
+    for food_name, (calories_info, source) in zip(food_names, nutrition_results):
+        # 即使没有数据也保留占位，保证与食物列表顺序一致
+        st.session_state.calories_info_list.append(calories_info)
+        st.session_state.data_sources.append(source)
+        if not calories_info:
             if st.session_state.debug_mode:
-                st.write(f"使用默认食物: {food_name}")
-            
-            # Use local data
-            local_data = get_food_calories(food_name)
-            if local_data:
-                st.session_state.calories_info_list = [local_data]
-                st.session_state.data_sources = ["Built-in Database (Demo Mode)" if st.session_state.language == "en" else "内置数据库 (演示模式)"]
-                
-                # 使用时间戳确保唯一ID
-                import time
-                st.session_state.food_names = [f"{food_name}_{int(time.time() * 1000)}"]
+                st.write(f"未找到 '{food_name}' 的营养信息")
+            continue
+        
+        if st.session_state.debug_mode:
+            st.write(f"'{food_name}' 的数据来源: {source}")
+        
+        # Record history for each food
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        st.session_state.history.append({
+            "food_name": food_name,
+            "calories": calories_info.get("calories", 0),
+            "timestamp": timestamp,
+            "source": source
+        })
+        
+        # Keep at most 10 history records
+        if len(st.session_state.history) > 10:
+            st.session_state.history = st.session_state.history[-10:]
+
+def show_processing_error(error):
+    """显示识别错误，并使用演示数据"""
+    st.session_state.error_message = get_text("error_processing").format(str(error))
+    st.error(st.session_state.error_message)
+    st.info(get_text("api_unavailable"))
+    
+    # 显示详细错误信息
+    if st.session_state.debug_mode:
+        st.write(f"详细错误: {str(error)}")
+        if isinstance(error, Exception):
+            import traceback
+            st.code("".join(traceback.format_exception(error)), language="python")
+    
+    # Use default value for demo
+    food_name = "hamburger"
+    st.session_state.food_names = [food_name]
+    if st.session_state.debug_mode:
+        st.write(f"使用默认食物: {food_name}")
+    
+    # Use local data
+    local_data = get_food_calories(food_name)
+    if local_data:
+        st.session_state.calories_info_list = [local_data]
+        st.session_state.data_sources = ["Built-in Database (Demo Mode)" if st.session_state.language == "en" else "内置数据库 (演示模式)"]
+        
+        # 使用时间戳确保唯一ID
+        st.session_state.food_names = [f"{food_name}_{int(time.time() * 1000)}"]
 
 def toggle_nutrition_details():
     """Toggle nutrition details display"""
@@ -763,145 +827,119 @@ def toggle_nutrition_details():
 
 def display_nutrition_details(calories_info):
     """Display detailed nutrition information"""
-    if calories_info and "details" in calories_info and calories_info["details"].get("nutrients"):
-        nutrients = calories_info["details"]["nutrients"]
-        
-        # If it's USDA data, format will be different
-        if isinstance(nutrients, list) and len(nutrients) > 0 and "name" in nutrients[0]:
-            # Nutritionix format data
-            df = pd.DataFrame([
-                {"Nutrient": item["name"], "Value": item["value"], "Unit": item["unit"]}
-                for item in nutrients
-            ])
-            st.dataframe(df, use_container_width=True)
-            
-        elif isinstance(nutrients, list) and len(nutrients) > 0 and "nutrientName" in nutrients[0]:
-            # USDA format data
-            df = pd.DataFrame([
-                {"Nutrient": item.get("nutrientName", ""), "Value": item.get("value", 0), "Unit": item.get("unitName", "")}
-                for item in nutrients if item.get("value") is not None
-            ])
-            st.dataframe(df, use_container_width=True)
-        
-        else:
-            st.write(get_text("no_nutrition_data"))
+    # 本地数据直接读取营养成分表的列，在线数据（Nutritionix或USDA格式）按列表解析
+    rows = nutrient_rows(calories_info)
+    if rows:
+        df = pd.DataFrame([{"Nutrient": name, "Value": value, "Unit": unit} for name, value, unit in rows])
+        st.dataframe(df, use_container_width=True)
     else:
         st.write(get_text("no_nutrition_data"))
 
 def display_nutrient_chart(calories_info):
     """Display nutrition component chart"""
     if calories_info and "details" in calories_info and calories_info["details"].get("nutrients"):
-        nutrients = calories_info["details"]["nutrients"]
+        # Translate nutrient names if Chinese
+        protein_name = "Protein" if st.session_state.language == "en" else "蛋白质"
+        fat_name = "Fat" if st.session_state.language == "en" else "脂肪"
+        carbs_name = "Carbohydrates" if st.session_state.language == "en" else "碳水化合物"
         
-        # Prepare data
-        if isinstance(nutrients, list) and len(nutrients) > 0:
-            if "name" in nutrients[0]:  # Nutritionix format
-                # Translate nutrient names if Chinese
-                protein_name = "Protein" if st.session_state.language == "en" else "蛋白质"
-                fat_name = "Fat" if st.session_state.language == "en" else "脂肪"
-                carbs_name = "Carbohydrates" if st.session_state.language == "en" else "碳水化合物"
+        # 宏量营养素：本地数据直接读取营养成分表的列，在线数据按名称解析
+        protein_value, fat_value, carb_value = (float(value) for value in macro_row(calories_info))
+        macro_nutrients = [
+            (display_name, value)
+            for display_name, value in ((protein_name, protein_value), (fat_name, fat_value), (carbs_name, carb_value))
+            if value > 0
+        ]
+        
+        if macro_nutrients:
+            try:
+                # 准备饼图数据
+                pie_data = pd.DataFrame({
+                    "Nutrient": [display_name for display_name, _ in macro_nutrients],
+                    "Amount": [value for _, value in macro_nutrients]
+                })
                 
-                # Map English names to possible translations
-                nutrient_map = {
-                    "Protein": protein_name, 
-                    "Fat": fat_name, 
-                    "Carbohydrates": carbs_name
-                }
+                # 创建饼图
+                fig = px.pie(
+                    pie_data,
+                    values="Amount",
+                    names="Nutrient",
+                    color="Nutrient",
+                    color_discrete_map={
+                        protein_name: "#66BB6A",
+                        fat_name: "#FFA726",
+                        carbs_name: "#42A5F5"
+                    },
+                    hole=0.4
+                )
                 
-                # Find relevant nutrients
-                macro_nutrients = []
-                for n in nutrients:
-                    for eng_name, display_name in nutrient_map.items():
-                        if n["name"].lower() == eng_name.lower():
-                            n_copy = n.copy()
-                            n_copy["display_name"] = display_name
-                            macro_nutrients.append(n_copy)
+                title = "Macronutrient Distribution" if st.session_state.language == "en" else "宏量营养素分布"
+                fig.update_layout(
+                    title=title,
+                    height=400,
+                    margin=dict(l=20, r=20, t=40, b=20),
+                )
                 
-                if macro_nutrients:
-                    try:
-                        # 准备图表数据
-                        import pandas as pd
-                        import plotly.express as px
-                        
-                        # 准备饼图数据
-                        pie_data = pd.DataFrame({
-                            "Nutrient": [n["display_name"] for n in macro_nutrients],
-                            "Amount": [n["value"] for n in macro_nutrients]
-                        })
-                        
-                        # 创建饼图
-                        fig = px.pie(
-                            pie_data,
-                            values="Amount",
-                            names="Nutrient",
-                            color="Nutrient",
-                            color_discrete_map={
-                                protein_name: "#66BB6A",
-                                fat_name: "#FFA726",
-                                carbs_name: "#42A5F5"
-                            },
-                            hole=0.4
-                        )
-                        
-                        title = "Macronutrient Distribution" if st.session_state.language == "en" else "宏量营养素分布"
-                        fig.update_layout(
-                            title=title,
-                            height=400,
-                            margin=dict(l=20, r=20, t=40, b=20),
-                        )
-                        
-                        st.plotly_chart(fig, use_column_width=True, config={"staticPlot": False, "displayModeBar": False})
-                        
-                        # Display energy source percentages
-                        title = "Energy Source Percentages" if st.session_state.language == "en" else "能量来源占比"
-                        st.markdown(f'<div class="nutrient-title">{title}</div>', unsafe_allow_html=True)
-                        
-                        # Calculate energy contribution from each macronutrient
-                        protein_value = next((n["value"] for n in macro_nutrients if "Protein" in n["name"]), 0)
-                        fat_value = next((n["value"] for n in macro_nutrients if "Fat" in n["name"]), 0)
-                        carb_value = next((n["value"] for n in macro_nutrients if "Carbohydrates" in n["name"]), 0)
-                        
-                        protein_cals = protein_value * 4
-                        fat_cals = fat_value * 9
-                        carb_cals = carb_value * 4
-                        
-                        total_cals = protein_cals + fat_cals + carb_cals
-                        if total_cals > 0:
-                            # Create horizontal bar chart
-                            energy_data = pd.DataFrame({
-                                "Nutrient": [n["display_name"] for n in macro_nutrients],
-                                "Calories": [protein_cals, fat_cals, carb_cals],
-                                "Percentage": [protein_cals/total_cals*100, fat_cals/total_cals*100, carb_cals/total_cals*100]
-                            })
-                            
-                            fig = px.bar(
-                                energy_data, 
-                                y="Nutrient", 
-                                x="Percentage", 
-                                color="Nutrient",
-                                color_discrete_map={
-                                    protein_name: "#66BB6A",
-                                    fat_name: "#FFA726",
-                                    carbs_name: "#42A5F5"
-                                },
-                                text=[f"{x:.1f}%" for x in energy_data["Percentage"]]
-                            )
-                            
-                            x_title = "Percentage of Total Calories" if st.session_state.language == "en" else "占总热量百分比"
-                            fig.update_layout(
-                                height=250,
-                                margin=dict(l=20, r=20, t=20, b=20),
-                                xaxis_title=x_title,
-                                yaxis_title="",
-                                showlegend=False
-                            )
-                            
-                            st.plotly_chart(fig, use_column_width=True, config={"staticPlot": False, "displayModeBar": False})
-                    except Exception as e:
-                        st.error(f"Error displaying chart: {str(e)}")
-                        if st.session_state.debug_mode:
-                            import traceback
-                            st.code(traceback.format_exc(), language="python")
+                st.plotly_chart(fig, use_column_width=True, config={"staticPlot": False, "displayModeBar": False})
+                
+                # Display energy source percentages
+                title = "Energy Source Percentages" if st.session_state.language == "en" else "能量来源占比"
+                st.markdown(f'<div class="nutrient-title">{title}</div>', unsafe_allow_html=True)
+                
+                # Calculate energy contribution from each macronutrient (4/9/4 kcal per gram)
+                energy_per_gram = {protein_name: 4, fat_name: 9, carbs_name: 4}
+                macro_cals = [(display_name, value * energy_per_gram[display_name]) for display_name, value in macro_nutrients]
+                
+                total_cals = sum(cals for _, cals in macro_cals)
+                if total_cals > 0:
+                    # Create horizontal bar chart
+                    energy_data = pd.DataFrame({
+                        "Nutrient": [display_name for display_name, _ in macro_cals],
+                        "Calories": [cals for _, cals in macro_cals],
+                        "Percentage": [cals / total_cals * 100 for _, cals in macro_cals]
+                    })
+                    
+                    fig = px.bar(
+                        energy_data, 
+                        y="Nutrient", 
+                        x="Percentage", 
+                        color="Nutrient",
+                        color_discrete_map={
+                            protein_name: "#66BB6A",
+                            fat_name: "#FFA726",
+                            carbs_name: "#42A5F5"
+                        },
+                        text=[f"{x:.1f}%" for x in energy_data["Percentage"]]
+                    )
+                    
+                    x_title = "Percentage of Total Calories" if st.session_state.language == "en" else "占总热量百分比"
+                    fig.update_layout(
+                        height=250,
+                        margin=dict(l=20, r=20, t=20, b=20),
+                        xaxis_title=x_title,
+                        yaxis_title="",
+                        showlegend=False
+                    )
+                    
+                    st.plotly_chart(fig, use_column_width=True, config={"staticPlot": False, "displayModeBar": False})
+            except Exception as e:
+                st.error(f"Error displaying chart: {str(e)}")
+                if st.session_state.debug_mode:
+                    import traceback
+                    st.code(traceback.format_exc(), language="python")
+
+def get_meal_totals(calories_info_list):
+    """
+    汇总一组识别结果的蛋白质、脂肪和碳水化合物（本地数据直接按行求和，在线数据按名称解析）
+    营养记录引用整张营养成分表，无法作为缓存键，因此按结果列表本身缓存在会话中，
+    只要识别结果不变，重新运行就直接复用
+    """
+    cached = st.session_state.get("meal_totals")
+    if cached is not None and cached[0] is calories_info_list:
+        return cached[1]
+    totals = tuple(float(total) for total in meal_macro_totals(calories_info_list))
+    st.session_state.meal_totals = (calories_info_list, totals)
+    return totals
 
 def display_multiple_results(food_names, calories_info_list, data_sources):
     """Display multiple food recognition and calorie estimation results"""
@@ -910,40 +948,14 @@ def display_multiple_results(food_names, calories_info_list, data_sources):
     # 计算总卡路里
     total_calories = 0
     
-    # 用于汇总营养成分的变量
-    total_protein = 0
-    total_fat = 0
-    total_carbs = 0
+    # 汇总营养成分（每组识别结果只计算一次）
+    total_protein, total_fat, total_carbs = get_meal_totals(calories_info_list)
     
     # 显示每种食物的信息
     for i, (food_name, calories_info, data_source) in enumerate(zip(food_names, calories_info_list, data_sources)):
         if calories_info:
             total_calories += calories_info.get("calories", 0)
             
-            # 提取该食物的营养成分
-            if "details" in calories_info and calories_info["details"].get("nutrients"):
-                nutrients = calories_info["details"]["nutrients"]
-                if isinstance(nutrients, list) and len(nutrients) > 0:
-                    # 处理不同格式的营养数据
-                    if "name" in nutrients[0]:  # Nutritionix格式
-                        for nutrient in nutrients:
-                            name = nutrient["name"].lower()
-                            if "protein" in name:
-                                total_protein += nutrient.get("value", 0)
-                            elif "fat" in name:
-                                total_fat += nutrient.get("value", 0)
-                            elif "carbohydrate" in name or "carbs" in name:
-                                total_carbs += nutrient.get("value", 0)
-                    elif "nutrientName" in nutrients[0]:  # USDA格式
-                        for nutrient in nutrients:
-                            name = nutrient.get("nutrientName", "").lower()
-                            if "protein" in name:
-                                total_protein += nutrient.get("value", 0)
-                            elif "fat" in name and "total" in name:
-                                total_fat += nutrient.get("value", 0)
-                            elif "carbohydrate" in name:
-                                total_carbs += nutrient.get("value", 0)
-            
             if len(food_names) > 1:
                 # 多种食物时显示序号
                 food_number = i + 1
@@ -1002,44 +1014,7 @@ def display_multiple_results(food_names, calories_info_list, data_sources):
         st.markdown(f'<h3 style="margin-top: 20px; color: #2E7D32;">{get_text("single_food_advice")}</h3>', unsafe_allow_html=True)
         
         # 获取特定食物的建议
-        food_name = food_names[0]
-        food_suggestions = {}
-        
-        # 根据食物类型提供特定建议
-        food_name_lower = food_name.lower()
-        if any(protein in food_name_lower for protein in ["chicken", "beef", "pork", "fish", "meat", "鸡", "牛", "猪", "肉", "鱼"]):
-            food_suggestions["en"] = ["Pair this protein with whole grains and vegetables for a balanced meal.", 
-                                     "Try to limit processed meats and opt for lean cuts when possible."]
-            food_suggestions["zh"] = ["将这种蛋白质与全谷物和蔬菜搭配，形成均衡饮食。", 
-                                     "尽量限制加工肉类，尽可能选择瘦肉。"]
-        elif any(veg in food_name_lower for veg in ["vegetable", "veggie", "broccoli", "spinach", "carrot", "蔬菜", "西兰花", "菠菜", "胡萝卜"]):
-            food_suggestions["en"] = ["Great choice! Vegetables are high in fiber, vitamins and minerals.", 
-                                     "Try to include a variety of colorful vegetables in your diet."]
-            food_suggestions["zh"] = ["很好的选择！蔬菜富含纤维、维生素和矿物质。", 
-                                     "尝试在饮食中包含各种颜色的蔬菜。"]
-        elif any(fruit in food_name_lower for fruit in ["fruit", "apple", "banana", "orange", "水果", "苹果", "香蕉", "橙子"]):
-            food_suggestions["en"] = ["Fruits are a great source of vitamins and natural sugars.", 
-                                     "Try to eat the whole fruit rather than just drinking fruit juice to get more fiber."]
-            food_suggestions["zh"] = ["水果是维生素和天然糖分的良好来源。", 
-                                     "尝试食用整个水果而不是仅喝果汁，以获取更多纤维。"]
-        elif any(grain in food_name_lower for grain in ["rice", "bread", "pasta", "noodle", "米饭", "面包", "意面", "面条"]):
-            food_suggestions["en"] = ["Choose whole grains when possible for more fiber and nutrients.", 
-                                     "Balance your carbohydrates with protein and vegetables."]
-            food_suggestions["zh"] = ["尽可能选择全谷物，获取更多纤维和营养。", 
-                                     "将碳水化合物与蛋白质和蔬菜平衡搭配。"]
-        elif any(ff in food_name_lower for ff in ["burger", "pizza", "fries", "hamburger", "汉堡", "披萨", "薯条"]):
-            food_suggestions["en"] = ["Fast foods are typically high in calories, fat and sodium.", 
-                                     "Try to limit these foods and balance with healthier options when possible."]
-            food_suggestions["zh"] = ["快餐通常热量高、脂肪高、钠含量高。", 
-                                     "尽量限制这些食物，尽可能与更健康的选择平衡。"]
-        elif any(dessert in food_name_lower for dessert in ["ice cream", "cake", "cookie", "chocolate", "冰淇淋", "蛋糕", "饼干", "巧克力"]):
-            food_suggestions["en"] = ["Sweets are high in sugar and should be enjoyed in moderation.", 
-                                     "Consider fruit-based desserts for a healthier alternative."]
-            food_suggestions["zh"] = ["甜食糖分高，应适量享用。", 
-                                     "考虑以水果为基础的甜点作为更健康的替代品。"]
-        else:
-            # 通用建议
-            food_suggestions = get_meal_balance_suggestion([food_name])
+        food_suggestions = get_food_suggestions(food_names[0])
         
         # 显示建议
         suggestions = food_suggestions["en"] if st.session_state.language == "en" else food_suggestions["zh"]
@@ -1614,6 +1589,7 @@ def calculate_bmi(height, weight):
         return weight / (height_m * height_m)
     return 0
 
+@st.cache_data(max_entries=PURE_CACHE_ENTRIES, show_spinner=False)
 def calculate_daily_calories(height, weight, age, gender, activity):
     """计算每日卡路里需求"""
     if not all([height, weight, age, gender, activity]):
@@ -1639,6 +1615,7 @@ def calculate_daily_calories(height, weight, age, gender, activity):
     # 总热量需求
     return int(bmr * activity_factor)
 
+@st.cache_data(max_entries=PURE_CACHE_ENTRIES, show_spinner=False)
 def get_fitness_recommendations(gender, age, bmi, activity_level):
     """获取健身建议"""
     recommendations = {
@@ -1743,6 +1720,7 @@ def get_fitness_recommendations(gender, age, bmi, activity_level):
     
     return recommendations
 
+@st.cache_data(max_entries=PURE_CACHE_ENTRIES, show_spinner=False)
 def get_nutrition_plan(gender, weight, activity, goal):
     """获取营养计划"""
     plan = {
@@ -2230,6 +2208,50 @@ def generate_weekly_workout_plan(gender, age, bmi, activity_level, goal):
     
     return weekly_plan
 
+@st.cache_data(max_entries=PURE_CACHE_ENTRIES, show_spinner=False)
+def get_food_suggestions(food_name):
+    """获取单个食物的饮食建议"""
+    food_suggestions = {}
+    
+    # 根据食物类型提供特定建议
+    food_name_lower = food_name.lower()
+    if any(protein in food_name_lower for protein in ["chicken", "beef", "pork", "fish", "meat", "鸡", "牛", "猪", "肉", "鱼"]):
+        food_suggestions["en"] = ["Pair this protein with whole grains and vegetables for a balanced meal.", 
+                                 "Try to limit processed meats and opt for lean cuts when possible."]
+        food_suggestions["zh"] = ["将这种蛋白质与全谷物和蔬菜搭配，形成均衡饮食。", 
+                                 "尽量限制加工肉类，尽可能选择瘦肉。"]
+    elif any(veg in food_name_lower for veg in ["vegetable", "veggie", "broccoli", "spinach", "carrot", "蔬菜", "西兰花", "菠菜", "胡萝卜"]):
+        food_suggestions["en"] = ["Great choice! Vegetables are high in fiber, vitamins and minerals.", 
+                                 "Try to include a variety of colorful vegetables in your diet."]
+        food_suggestions["zh"] = ["很好的选择！蔬菜富含纤维、维生素和矿物质。", 
+                                 "尝试在饮食中包含各种颜色的蔬菜。"]
+    elif any(fruit in food_name_lower for fruit in ["fruit", "apple", "banana", "orange", "水果", "苹果", "香蕉", "橙子"]):
+        food_suggestions["en"] = ["Fruits are a great source of vitamins and natural sugars.", 
+                                 "Try to eat the whole fruit rather than just drinking fruit juice to get more fiber."]
+        food_suggestions["zh"] = ["水果是维生素和天然糖分的良好来源。", 
+                                 "尝试食用整个水果而不是仅喝果汁，以获取更多纤维。"]
+    elif any(grain in food_name_lower for grain in ["rice", "bread", "pasta", "noodle", "米饭", "面包", "意面", "面条"]):
+        food_suggestions["en"] = ["Choose whole grains when possible for more fiber and nutrients.", 
+                                 "Balance your carbohydrates with protein and vegetables."]
+        food_suggestions["zh"] = ["尽可能选择全谷物，获取更多纤维和营养。", 
+                                 "将碳水化合物与蛋白质和蔬菜平衡搭配。"]
+    elif any(ff in food_name_lower for ff in ["burger", "pizza", "fries", "hamburger", "汉堡", "披萨", "薯条"]):
+        food_suggestions["en"] = ["Fast foods are typically high in calories, fat and sodium.", 
+                                 "Try to limit these foods and balance with healthier options when possible."]
+        food_suggestions["zh"] = ["快餐通常热量高、脂肪高、钠含量高。", 
+                                 "尽量限制这些食物，尽可能与更健康的选择平衡。"]
+    elif any(dessert in food_name_lower for dessert in ["ice cream", "cake", "cookie", "chocolate", "冰淇淋", "蛋糕", "饼干", "巧克力"]):
+        food_suggestions["en"] = ["Sweets are high in sugar and should be enjoyed in moderation.", 
+                                 "Consider fruit-based desserts for a healthier alternative."]
+        food_suggestions["zh"] = ["甜食糖分高，应适量享用。", 
+                                 "考虑以水果为基础的甜点作为更健康的替代品。"]
+    else:
+        # 通用建议
+        food_suggestions = get_meal_balance_suggestion([food_name])
+    
+    return food_suggestions
+
+@st.cache_data(max_entries=PURE_CACHE_ENTRIES, show_spinner=False)
 def get_portion_suggestion(food_name):
     """获取食物份量建议"""
     food_name_lower = food_name.lower()
@@ -2295,6 +2317,7 @@ def get_portion_suggestion(food_name):
     else:
         return portion_suggestions["other"]
 
+@st.cache_data(max_entries=PURE_CACHE_ENTRIES, show_spinner=False)
 def get_meal_balance_suggestion(food_names):
     """获取均衡饮食建议"""
     food_types = {
@@ -2487,6 +2510,9 @@ def main():
                 if st.button(get_text('capture_button')):
                     process_image(img_file)
     
+    # 取回识别任务的结果（重新运行时继续等待同一个任务）
+    poll_pending_job()
+    
     # 显示结果
     if st.session_state.food_names and st.session_state.calories_info_list:
         display_multiple_results(st.session_state.food_names, st.session_state.calories_info_list, st.session_state.data_sources)
@@ -0,0 +1,326 @@
+"""
+Binary Food Database
+Compiled, read-only food database that worker processes memory-map and share through the page cache
+
+File layout (little-endian):
+    header          magic, version, counts and section offsets
+    nutrients       one descriptor per nutrient column: name and unit in the string pool
+    records         fixed-width food records: key, display name and portion in the string
+                    pool, then calories and one float64 per nutrient (NaN when missing)
+    index           (name, record id) entries sorted by UTF-8 name, covering keys and aliases
+    strings         deduplicated UTF-8 string pool
+
+Build, from the app directory:
+    python -m data.food_binary_db build --output foods.bin
+    python -m data.food_binary_db build --csv foods.csv --output foods.bin
+
+Then set FOOD_BINARY_DB_PATH to the file so get_food_calories reads it instead of FOOD_CALORIES.
+"""
+
+import argparse
+import bisect
+import csv
+import math
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+from .nutrient_table import NutrientTable
+
+MAGIC = b"FOODDB\x00\x01"
+VERSION = 1
+
+# magic, version, nutrient count, food count, index count, then section offsets
+HEADER = struct.Struct("<8sHHII4Q")
+# name offset/length, unit offset/length
+NUTRIENT = struct.Struct("<IHIH")
+# name offset/length, record id
+INDEX_ENTRY = struct.Struct("<IHI")
+
+
+def record_struct(nutrient_count):
+    """Fixed-width record: key, display name and portion string refs, calories, nutrient values"""
+    return struct.Struct(f"<IHIHIHd{nutrient_count}d")
+
+
+class StringPool:
+    """Builds the string pool, storing each distinct string once"""
+
+    def __init__(self):
+        self._offsets = {}
+        self._data = bytearray()
+
+    def add(self, text):
+        """Return the (offset, length) of a string, adding it on first use"""
+        ref = self._offsets.get(text)
+        if ref is None:
+            encoded = text.encode("utf-8")
+            if len(encoded) > 0xFFFF:
+                raise ValueError(f"String too long for the binary food database: {text[:40]}...")
+            ref = (len(self._data), len(encoded))
+            self._offsets[text] = ref
+            self._data += encoded
+        return ref
+
+    def tobytes(self):
+        return bytes(self._data)
+
+
+def build_binary_db(table, aliases, output_path):
+    """
+    Compile a nutrient table into a binary food database
+
+    Parameters:
+        table (NutrientTable): Foods to write
+        aliases (dict): Alternative name -> food key, indexed next to the keys
+        output_path (str): Output file; written to a temporary file and moved into place
+
+    Returns:
+        int: Size of the file in bytes
+    """
+    pool = StringPool()
+    nutrient_count = len(table.nutrient_names)
+    record = record_struct(nutrient_count)
+
+    nutrients = b"".join(
+        NUTRIENT.pack(*pool.add(name), *pool.add(unit))
+        for name, unit in zip(table.nutrient_names, table.units)
+    )
+    records = bytearray()
+    for food_id, key in enumerate(table.food_keys):
+        records += record.pack(
+            *pool.add(key), *pool.add(table.display_names[food_id]), *pool.add(table.portions[food_id]),
+            float(table.calories[food_id]), *(float(value) for value in table.values[food_id])
+        )
+
+    names = {key: food_id for food_id, key in enumerate(table.food_keys)}
+    for alias, key in aliases.items():
+        if key in names:
+            names.setdefault(alias.lower().strip(), names[key])
+    index = b"".join(
+        INDEX_ENTRY.pack(*pool.add(name), food_id)
+        for name, food_id in sorted(names.items(), key=lambda item: item[0].encode("utf-8"))
+    )
+
+    nutrients_offset = HEADER.size
+    records_offset = nutrients_offset + len(nutrients)
+    index_offset = records_offset + len(records)
+    strings_offset = index_offset + len(index)
+    header = HEADER.pack(
+        MAGIC, VERSION, nutrient_count, len(table.food_keys), len(names),
+        nutrients_offset, records_offset, index_offset, strings_offset
+    )
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "wb") as output:
+        for section in (header, nutrients, bytes(records), index, pool.tobytes()):
+            output.write(section)
+    os.replace(tmp_path, output_path)
+    return os.path.getsize(output_path)
+
+
+class _IndexNames:
+    """Sequence view of the sorted index names as raw UTF-8 bytes, for bisect"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __len__(self):
+        return self._db.index_count
+
+    def __getitem__(self, position):
+        return self._db._index_entry(position)[0]
+
+
+class BinaryFoodRecord(Mapping):
+    """Read-only view of one record in the FOOD_CALORIES format, decoded on access"""
+
+    _fields = ("calories", "portion", "details")
+
+    def __init__(self, db, record_id):
+        self.db = db
+        self.record_id = record_id
+
+    def __getitem__(self, field):
+        if field == "calories":
+            calories = self.db._record(self.record_id)[6]
+            return int(calories) if calories.is_integer() else calories
+        if field == "portion":
+            return self.db._string(*self.db._record(self.record_id)[4:6])
+        if field == "details":
+            return self.db.build_details(self.record_id)
+        raise KeyError(field)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return f"BinaryFoodRecord({self.db.key(self.record_id)!r})"
+
+
+class BinaryFoodDatabase:
+    """Memory-mapped accessor for a file built by build_binary_db"""
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): Path to the binary food database
+        """
+        self.path = path
+        with open(path, "rb") as db_file:
+            self._mmap = mmap.mmap(db_file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.nutrient_count, self.food_count, self.index_count,
+         self._nutrients_offset, self._records_offset, self._index_offset,
+         self._strings_offset) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"Not a version {VERSION} binary food database: {path}")
+        self._record_struct = record_struct(self.nutrient_count)
+        self._index_names = _IndexNames(self)
+
+        # Column descriptors are tiny; decode them once
+        self.nutrient_names = []
+        self.units = []
+        for column in range(self.nutrient_count):
+            name_off, name_len, unit_off, unit_len = NUTRIENT.unpack_from(
+                self._mmap, self._nutrients_offset + column * NUTRIENT.size
+            )
+            self.nutrient_names.append(self._string(name_off, name_len))
+            self.units.append(self._string(unit_off, unit_len))
+
+    def __len__(self):
+        return self.food_count
+
+    def _string(self, offset, length):
+        start = self._strings_offset + offset
+        return self._mmap[start:start + length].decode("utf-8")
+
+    def _record(self, record_id):
+        return self._record_struct.unpack_from(self._mmap, self._records_offset + record_id * self._record_struct.size)
+
+    def _index_entry(self, position):
+        """Return (name bytes, record id) of an index entry"""
+        name_off, name_len, record_id = INDEX_ENTRY.unpack_from(
+            self._mmap, self._index_offset + position * INDEX_ENTRY.size
+        )
+        start = self._strings_offset + name_off
+        return self._mmap[start:start + name_len], record_id
+
+    def key(self, record_id):
+        """Return the food key of a record"""
+        return self._string(*self._record(record_id)[0:2])
+
+    def keys(self):
+        """Return all food keys in record order"""
+        return [self.key(record_id) for record_id in range(self.food_count)]
+
+    def aliases(self):
+        """Return every indexed name that is not a key, mapped to its food key"""
+        aliases = {}
+        for position in range(self.index_count):
+            name, record_id = self._index_entry(position)
+            name = name.decode("utf-8")
+            key = self.key(record_id)
+            if name != key:
+                aliases[name] = key
+        return aliases
+
+    def find(self, name):
+        """
+        Find a record by exact key or alias with a binary search over the name index
+
+        Returns:
+            int: Record id, or None if the name is not indexed
+        """
+        target = name.lower().strip().encode("utf-8")
+        position = bisect.bisect_left(self._index_names, target)
+        if position < self.index_count:
+            found, record_id = self._index_entry(position)
+            if found == target:
+                return record_id
+        return None
+
+    def food_info(self, name):
+        """
+        Get a lazily decoded view of a food
+
+        Parameters:
+            name (str): Food key or alias
+
+        Returns:
+            BinaryFoodRecord: Read-only view, or None if the name is not indexed
+        """
+        record_id = self.find(name)
+        return BinaryFoodRecord(self, record_id) if record_id is not None else None
+
+    def build_details(self, record_id):
+        """Decode the nested "details" dict of a record"""
+        fields = self._record(record_id)
+        nutrients = []
+        for column, value in enumerate(fields[7:]):
+            if not math.isnan(value):
+                nutrients.append({
+                    "name": self.nutrient_names[column],
+                    "value": int(value) if value.is_integer() else value,
+                    "unit": self.units[column]
+                })
+        return {"food_name": self._string(*fields[2:4]), "nutrients": nutrients}
+
+    def close(self):
+        """Unmap the file"""
+        self._mmap.close()
+
+
+def load_foods_csv(path):
+    """
+    Read foods from a CSV file into the FOOD_CALORIES format
+
+    Columns: key, food_name, calories, portion, aliases ("|"-separated), and one
+    column per nutrient named "<Nutrient> (<unit>)", e.g. "Protein (g)"; empty cells are skipped.
+
+    Returns:
+        tuple: (foods dict, aliases dict)
+    """
+    foods, aliases = {}, {}
+    with open(path, "r", encoding="utf-8", newline="") as csv_file:
+        for row in csv.DictReader(csv_file):
+            key = row["key"].lower().strip()
+            nutrients = []
+            for column, value in row.items():
+                if column.endswith(")") and " (" in column and value not in (None, ""):
+                    name, unit = column[:-1].rsplit(" (", 1)
+                    nutrients.append({"name": name, "value": float(value), "unit": unit})
+            foods[key] = {
+                "calories": float(row["calories"]),
+                "portion": row.get("portion") or "100g",
+                "details": {"food_name": row.get("food_name") or key, "nutrients": nutrients}
+            }
+            for alias in (row.get("aliases") or "").split("|"):
+                if alias.strip():
+                    aliases[alias.strip()] = key
+    return foods, aliases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the binary food database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Build from FOOD_CALORIES or a CSV file")
+    build.add_argument("--csv", help="CSV source; defaults to the built-in FOOD_CALORIES table")
+    build.add_argument("--output", default=os.environ.get("FOOD_BINARY_DB_PATH", "foods.bin"), help="Output file")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        foods, aliases = load_foods_csv(args.csv)
+    else:
+        from .builtin_foods import FOOD_CALORIES, FOOD_ALIASES
+        foods, aliases = FOOD_CALORIES, FOOD_ALIASES
+    size = build_binary_db(NutrientTable(foods), aliases, args.output)
+    print(f"Wrote {len(foods)} foods to {args.output} ({size} bytes)")
+
+
+if __name__ == "__main__":
+    main()
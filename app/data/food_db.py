@@ -0,0 +1,172 @@
+"""
+Local Food Database
+Indexed SQLite database of USDA FoodData Central foods, built by data.usda_import
+"""
+
+import os
+import re
+import sqlite3
+import threading
+
+# Path of the database built by data.usda_import; lookups are disabled when unset
+FOOD_DB_PATH = os.environ.get("FOOD_DB_PATH")
+
+# FoodData Central energy nutrients in order of preference: Energy, then the Atwater
+# general and specific factors used by Foundation foods that have no plain Energy value
+ENERGY_NUTRIENT_IDS = (1008, 2047, 2048)
+
+# Canonical nutrients kept from FoodData Central: (nutrient id, name, unit, column)
+FDC_NUTRIENTS = [
+    (1003, "Protein", "g", "protein"),
+    (1004, "Fat", "g", "fat"),
+    (1005, "Carbohydrates", "g", "carbohydrates"),
+    (1079, "Fiber", "g", "fiber"),
+    (2000, "Sugar", "g", "sugar"),
+    (1087, "Calcium", "mg", "calcium"),
+    (1089, "Iron", "mg", "iron"),
+    (1090, "Magnesium", "mg", "magnesium"),
+    (1092, "Potassium", "mg", "potassium"),
+    (1093, "Sodium", "mg", "sodium"),
+    (1253, "Cholesterol", "mg", "cholesterol"),
+    (1057, "Caffeine", "mg", "caffeine"),
+    (1104, "Vitamin A", "IU", "vitamin_a"),
+    (1162, "Vitamin C", "mg", "vitamin_c"),
+    (1110, "Vitamin D", "IU", "vitamin_d"),
+    (1178, "Vitamin B12", "μg", "vitamin_b12"),
+    (1177, "Folate", "μg", "folate"),
+    (1180, "Choline", "mg", "choline"),
+    (1165, "Thiamin", "mg", "thiamin")
+]
+
+# Data types imported, best first; when several foods share a name the best type wins
+DATA_TYPE_RANKS = {
+    "foundation_food": 0,
+    "Foundation": 0,
+    "sr_legacy_food": 1,
+    "SR Legacy": 1,
+    "survey_fndds_food": 2,
+    "Survey (FNDDS)": 2,
+    "branded_food": 3,
+    "Branded": 3
+}
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS foods ("
+    "fdc_id INTEGER PRIMARY KEY, description TEXT NOT NULL, data_type TEXT NOT NULL, "
+    "type_rank INTEGER NOT NULL, brand TEXT, calories REAL NOT NULL, "
+    "portion TEXT, portion_grams REAL, "
+    + ", ".join(f"{column} REAL" for _, _, _, column in FDC_NUTRIENTS) + ")",
+    # Normalized lookup name -> best matching food
+    "CREATE TABLE IF NOT EXISTS food_names (name TEXT PRIMARY KEY, fdc_id INTEGER NOT NULL) WITHOUT ROWID"
+]
+
+
+def normalize_food_name(name):
+    """Lowercase a food name and collapse punctuation and whitespace to single spaces"""
+    return " ".join(re.sub(r"[^\w]+", " ", name.lower()).split())
+
+
+def singularize(name):
+    """Crude singular form of the last word of a normalized name, e.g. "apples" -> "apple" """
+    if name.endswith("ies") and len(name) > 4:
+        return name[:-3] + "y"
+    if name.endswith("oes") and len(name) > 4:
+        return name[:-2]
+    if name.endswith("s") and not name.endswith(("ss", "us", "is")) and len(name) > 3:
+        return name[:-1]
+    return name
+
+
+def lookup_names(description):
+    """
+    Names under which a food description can be found
+
+    Parameters:
+        description (str): FoodData Central description, e.g. "Apples, raw, with skin"
+
+    Returns:
+        set: Normalized names, e.g. {"apples raw with skin", "apples", "apple"}
+    """
+    names = {normalize_food_name(description)}
+    head = normalize_food_name(description.split(",", 1)[0])
+    if head:
+        names.add(head)
+        names.add(singularize(head))
+    names.discard("")
+    return names
+
+
+class FoodDatabase:
+    """Read-only lookups against a database built by data.usda_import"""
+
+    def __init__(self, db_path):
+        """
+        Parameters:
+            db_path (str): Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+    def lookup(self, food_name):
+        """
+        Look a food up by name
+
+        Parameters:
+            food_name (str): Name of the food
+
+        Returns:
+            dict: Calorie information in the FOOD_CALORIES format, or None if not found
+        """
+        query = normalize_food_name(food_name)
+        if not query:
+            return None
+        for name in dict.fromkeys((query, singularize(query))):
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT foods.* FROM food_names JOIN foods ON foods.fdc_id = food_names.fdc_id "
+                    "WHERE food_names.name = ?", (name,)
+                ).fetchone()
+            if row is not None:
+                return self._to_calories_info(row)
+        return None
+
+    @staticmethod
+    def _to_calories_info(row):
+        """Convert a foods row (values per 100 g) to calorie information for one portion"""
+        scale = row["portion_grams"] / 100 if row["portion_grams"] else 1.0
+        nutrients = [
+            {"name": name, "value": round(row[column] * scale, 2), "unit": unit}
+            for _, name, unit, column in FDC_NUTRIENTS
+            if row[column] is not None
+        ]
+        return {
+            "calories": int(round(row["calories"] * scale)),
+            "portion": row["portion"] or "100g",
+            "details": {
+                "food_name": row["description"],
+                "brand": row["brand"] or "Generic",
+                "fdc_id": row["fdc_id"],
+                "nutrients": nutrients
+            }
+        }
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+_food_database = None
+_food_database_lock = threading.Lock()
+
+
+def get_food_database():
+    """Return the process-wide food database, or None if FOOD_DB_PATH is not set or missing"""
+    global _food_database
+    if _food_database is None and FOOD_DB_PATH and os.path.exists(FOOD_DB_PATH):
+        with _food_database_lock:
+            if _food_database is None:
+                _food_database = FoodDatabase(FOOD_DB_PATH)
+    return _food_database
@@ -0,0 +1,306 @@
+"""
+Food Name Index
+Precomputed lookup structures for resolving food names to database keys
+"""
+
+import threading
+from collections import deque
+
+# Minimum confidence (1 - edit distance / name length) for a typo-corrected match;
+# 0.8 rejects one-letter changes to 4-letter names such as "beer" -> "beef"
+FUZZY_MIN_CONFIDENCE = 0.8
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton finding every indexed word contained in a text in one pass"""
+
+    def __init__(self, words):
+        """
+        Build the automaton
+
+        Parameters:
+            words (iterable): Words to index
+        """
+        # Node i: transitions in self._goto[i], failure link in self._fail[i], matches in self._out[i]
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for word in words:
+            if not word:
+                continue
+            node = 0
+            for ch in word:
+                next_node = self._goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][ch] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = next_node
+            self._out[node].append(word)
+
+        # Breadth-first pass to set failure links and merge outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find_all(self, text):
+        """
+        Find all indexed words occurring in a text
+
+        Returns:
+            set: Indexed words that are substrings of text
+        """
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            if self._out[node]:
+                found.update(self._out[node])
+        return found
+
+
+class NgramIndex:
+    """Character n-gram inverted index finding indexed words that contain a query"""
+
+    def __init__(self, words, n=2):
+        """
+        Parameters:
+            words (iterable): Words to index
+            n (int): Gram length; shorter queries fall back to single characters
+        """
+        self.n = n
+        self._postings = {}
+        for word in words:
+            for gram in self._grams(word, n) | self._grams(word, 1):
+                self._postings.setdefault(gram, set()).add(word)
+
+    @staticmethod
+    def _grams(text, n):
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def find_containing(self, query):
+        """
+        Find indexed words containing the query as a substring
+
+        Returns:
+            set: Matching words
+        """
+        if not query:
+            return set()
+        grams = self._grams(query, self.n) if len(query) >= self.n else self._grams(query, 1)
+        # Intersect the shortest posting lists first
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        if not postings or not postings[0]:
+            return set()
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return set()
+        return {word for word in candidates if query in word}
+
+
+def edit_distance(a, b, max_distance=None):
+    """
+    Optimal string alignment (Damerau-Levenshtein) distance between two strings
+
+    Parameters:
+        a (str): First string
+        b (str): Second string
+        max_distance (int): Stop early and return max_distance + 1 once exceeded
+
+    Returns:
+        int: Number of insertions, deletions, substitutions and adjacent transpositions
+    """
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class FuzzyIndex:
+    """
+    SymSpell-style deletion dictionary for typo-tolerant name lookup.
+    Every indexed name's prefix is stored under all its deletions up to max_distance,
+    so a lookup only probes the deletions of the query's prefix and verifies the few
+    candidates found, independent of how many names are indexed.
+    """
+
+    def __init__(self, names, max_distance=2, prefix_length=7):
+        """
+        Parameters:
+            names (iterable): Names to index
+            max_distance (int): Maximum edit distance considered a match
+            prefix_length (int): Only this many leading characters are indexed
+        """
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._deletes = {}
+        for name in names:
+            name = name.lower().strip()
+            for variant in self._deletions(name[:prefix_length]):
+                self._deletes.setdefault(variant, set()).add(name)
+
+    def _deletions(self, text):
+        """All strings obtained from text by deleting up to max_distance characters"""
+        variants = {text}
+        frontier = {text}
+        for _ in range(self.max_distance):
+            next_frontier = set()
+            for word in frontier:
+                for i in range(len(word)):
+                    next_frontier.add(word[:i] + word[i + 1:])
+            variants |= next_frontier
+            frontier = next_frontier
+        return variants
+
+    def lookup(self, query, max_distance=None):
+        """
+        Find the closest indexed name
+
+        Parameters:
+            query (str): Possibly misspelled name
+            max_distance (int): Override of the index's maximum distance; short queries
+                                (4 characters or fewer) always allow a single edit only
+
+        Returns:
+            tuple: (name, distance, confidence) with confidence in 0-1, or (None, None, 0.0)
+        """
+        query = query.lower().strip()
+        if not query:
+            return None, None, 0.0
+        if max_distance is None:
+            max_distance = self.max_distance
+        max_distance = min(max_distance, self.max_distance, 1 if len(query) <= 4 else self.max_distance)
+
+        candidates = set()
+        for variant in self._deletions(query[:self.prefix_length]):
+            candidates.update(self._deletes.get(variant, ()))
+
+        best = None
+        for name in candidates:
+            distance = edit_distance(query, name, max_distance)
+            if distance <= max_distance:
+                rank = (distance, abs(len(name) - len(query)), name)
+                if best is None or rank < best:
+                    best = rank
+        if best is None:
+            return None, None, 0.0
+        distance, _, name = best
+        confidence = 1.0 - distance / max(len(query), len(name))
+        return name, distance, confidence
+
+
+class FoodNameResolver:
+    """
+    Resolves a free-text food name to a database key.
+    Ranking is deterministic: an exact match first, then the longest name contained
+    in the query, then names containing the query (whole-word matches before partial
+    ones, shortest first), then the closest name within a small edit distance;
+    remaining ties break alphabetically. Names are database keys and their aliases.
+    """
+
+    def __init__(self, keys, aliases=None, min_confidence=FUZZY_MIN_CONFIDENCE):
+        """
+        Parameters:
+            keys (iterable): Database keys (lowercase food names)
+            aliases (dict): Alternative name -> database key
+            min_confidence (float): Minimum confidence (0-1) of a typo-corrected match
+        """
+        self.keys = sorted({key.lower().strip() for key in keys})
+        # Every searchable name -> the database key it stands for
+        self._targets = {}
+        for alias, key in (aliases or {}).items():
+            self._targets[alias.lower().strip()] = key.lower().strip()
+        self._targets.update((key, key) for key in self.keys)
+        self.min_confidence = min_confidence
+        # Substring and typo indexes, built on the first query that is not an exact name
+        self._indexes = None
+        self._indexes_lock = threading.Lock()
+
+    def _get_indexes(self):
+        """Return (automaton, ngram index, fuzzy index), building them on first use"""
+        if self._indexes is None:
+            with self._indexes_lock:
+                if self._indexes is None:
+                    names = sorted(self._targets)
+                    self._indexes = (AhoCorasick(names), NgramIndex(names), FuzzyIndex(names))
+        return self._indexes
+
+    @staticmethod
+    def _starts_word(name, query):
+        """Whether query occurs in name at the start of a word"""
+        return name.startswith(query) or f" {query}" in name
+
+    def resolve_exact(self, food_name):
+        """
+        Resolve a food name only if it is exactly a key or an alias
+
+        Parameters:
+            food_name (str): Name to resolve
+
+        Returns:
+            str: Matching database key, or None
+        """
+        return self._targets.get(food_name.lower().strip())
+
+    def resolve(self, food_name):
+        """
+        Resolve a food name
+
+        Parameters:
+            food_name (str): Name to resolve
+
+        Returns:
+            str: Matching database key, or None if nothing matches
+        """
+        query = food_name.lower().strip()
+        if not query:
+            return None
+
+        # Exact match
+        if query in self._targets:
+            return self._targets[query]
+
+        automaton, ngrams, fuzzy = self._get_indexes()
+
+        # Names contained in the query, e.g. "grilled salmon fillet" -> "salmon"
+        contained = automaton.find_all(query)
+        if contained:
+            return self._targets[min(contained, key=lambda name: (-len(name), name))]
+
+        # Names containing the query, e.g. "fries" -> "french fries"
+        containing = ngrams.find_containing(query)
+        if containing:
+            name = min(containing, key=lambda name: (not self._starts_word(name, query), len(name), name))
+            return self._targets[name]
+
+        # Misspelled names, e.g. "hamberger" -> "hamburger"
+        name, _, confidence = fuzzy.lookup(query)
+        if name is not None and confidence >= self.min_confidence:
+            return self._targets[name]
+
+        return None
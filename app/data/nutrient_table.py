@@ -0,0 +1,289 @@
+"""
+Nutrient Table
+Columnar food x nutrient matrix with canonical units and lazily built legacy dict views
+"""
+
+import sys
+from collections.abc import Mapping
+
+import numpy as np
+
+# Columns summed for meal macro totals, in (protein, fat, carbohydrates) order
+MACRO_NUTRIENTS = ("Protein", "Fat", "Carbohydrates")
+
+# Mass units and their size in grams, for converting values to a nutrient's canonical unit
+MASS_UNITS = {"g": 1.0, "mg": 1e-3, "μg": 1e-6, "mcg": 1e-6}
+
+
+def convert_unit(value, unit, target_unit):
+    """
+    Convert a nutrient amount between units
+
+    Parameters:
+        value (float): Amount in unit
+        unit (str): Unit of value
+        target_unit (str): Unit to convert to
+
+    Returns:
+        float: Amount in target_unit
+    """
+    if unit == target_unit:
+        return value
+    if unit in MASS_UNITS and target_unit in MASS_UNITS:
+        return value * MASS_UNITS[unit] / MASS_UNITS[target_unit]
+    raise ValueError(f"Cannot convert {unit} to {target_unit}")
+
+
+def _plain_number(value):
+    """Return a float as an int when it is integral, so views print like the source data"""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class FoodRecord(Mapping):
+    """
+    Read-only legacy view of one table row, shaped like a FOOD_CALORIES entry:
+    {"calories", "portion", "details": {"food_name", "nutrients": [{"name", "value", "unit"}]}}.
+    The nested details are only built when first accessed.
+    """
+
+    _fields = ("calories", "portion", "details")
+
+    def __init__(self, table, food_id):
+        self.table = table
+        self.food_id = food_id
+        self._details = None
+
+    def __getitem__(self, field):
+        if field == "calories":
+            return _plain_number(self.table.calories[self.food_id])
+        if field == "portion":
+            return self.table.portions[self.food_id]
+        if field == "details":
+            if self._details is None:
+                self._details = self.table.build_details(self.food_id)
+            return self._details
+        raise KeyError(field)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return f"FoodRecord({self.table.food_keys[self.food_id]!r})"
+
+
+class NutrientTable:
+    """
+    Food-id x nutrient-id matrix of nutrient amounts in canonical units.
+    Food keys, nutrient names and units are interned strings; missing nutrients are NaN.
+    """
+
+    def __init__(self, foods):
+        """
+        Parameters:
+            foods (dict): Food key -> entry in the FOOD_CALORIES format
+        """
+        self.food_keys = tuple(sys.intern(key) for key in foods)
+        self._food_ids = {key: food_id for food_id, key in enumerate(self.food_keys)}
+
+        # Nutrient columns: the macros first, then others in order of first appearance;
+        # the first unit seen is canonical
+        names = list(MACRO_NUTRIENTS)
+        units = ["g"] * len(MACRO_NUTRIENTS)
+        nutrient_ids = {name: column for column, name in enumerate(names)}
+        for info in foods.values():
+            for nutrient in info["details"]["nutrients"]:
+                name = sys.intern(nutrient["name"])
+                if name not in nutrient_ids:
+                    nutrient_ids[name] = len(names)
+                    names.append(name)
+                    units.append(sys.intern(nutrient["unit"]))
+        self.nutrient_names = tuple(names)
+        self.units = tuple(units)
+        self._nutrient_ids = nutrient_ids
+
+        self.values = np.full((len(foods), len(names)), np.nan)
+        self.calories = np.zeros(len(foods))
+        self.portions = []
+        self.display_names = []
+        # Column ids of each food's nutrients in their original order, for the legacy views
+        self._columns = []
+        for food_id, info in enumerate(foods.values()):
+            self.calories[food_id] = info["calories"]
+            self.portions.append(info["portion"])
+            self.display_names.append(info["details"]["food_name"])
+            columns = []
+            for nutrient in info["details"]["nutrients"]:
+                column = nutrient_ids[nutrient["name"]]
+                self.values[food_id, column] = convert_unit(nutrient["value"], nutrient["unit"], units[column])
+                columns.append(column)
+            self._columns.append(tuple(columns))
+
+        self._macro_columns = np.array([nutrient_ids[name] for name in MACRO_NUTRIENTS])
+        self._records = {}
+
+    def __len__(self):
+        return len(self.food_keys)
+
+    def __contains__(self, key):
+        return key in self._food_ids
+
+    def food_id(self, key):
+        """Return the row of a food key, or None if it is not in the table"""
+        return self._food_ids.get(key)
+
+    def nutrient_id(self, name):
+        """Return the column of a nutrient name, or None if it is not in the table"""
+        return self._nutrient_ids.get(name)
+
+    def food_info(self, key):
+        """
+        Get the legacy dict view of a food
+
+        Parameters:
+            key (str): Food key
+
+        Returns:
+            FoodRecord: Read-only view, or None if the key is not in the table
+        """
+        food_id = self._food_ids.get(key)
+        if food_id is None:
+            return None
+        record = self._records.get(food_id)
+        if record is None:
+            record = self._records.setdefault(food_id, FoodRecord(self, food_id))
+        return record
+
+    def build_details(self, food_id):
+        """Build the nested "details" dict of a food from its row"""
+        row = self.values[food_id]
+        return {
+            "food_name": self.display_names[food_id],
+            "nutrients": [
+                {"name": self.nutrient_names[column], "value": _plain_number(row[column]), "unit": self.units[column]}
+                for column in self._columns[food_id]
+            ]
+        }
+
+    def nutrient_rows(self, food_id):
+        """Return a food's nutrients as (name, value, unit) rows read from its columns"""
+        row = self.values[food_id]
+        return [(self.nutrient_names[column], _plain_number(row[column]), self.units[column])
+                for column in self._columns[food_id]]
+
+    def macro_totals(self, food_ids):
+        """
+        Sum protein, fat and carbohydrates over several foods in one vectorized pass
+
+        Parameters:
+            food_ids (list): Rows to sum; a row may repeat
+
+        Returns:
+            numpy.ndarray: (protein, fat, carbohydrates) in grams
+        """
+        if len(food_ids) == 0:
+            return np.zeros(len(MACRO_NUTRIENTS))
+        return np.nansum(self.values[np.asarray(food_ids)][:, self._macro_columns], axis=0)
+
+
+def macro_row(calories_info):
+    """
+    Get the (protein, fat, carbohydrates) amounts of one food result
+
+    Table-backed records are read straight from their row; other results (online
+    Nutritionix-style "name" lists or USDA "nutrientName" lists) are parsed by name.
+
+    Parameters:
+        calories_info (dict): Food result
+
+    Returns:
+        numpy.ndarray: (protein, fat, carbohydrates) in grams
+    """
+    if isinstance(calories_info, FoodRecord):
+        return calories_info.table.macro_totals([calories_info.food_id])
+
+    totals = np.zeros(len(MACRO_NUTRIENTS))
+    if not calories_info or "details" not in calories_info:
+        return totals
+    nutrients = calories_info["details"].get("nutrients")
+    if not isinstance(nutrients, list) or not nutrients:
+        return totals
+
+    if "name" in nutrients[0]:  # Nutritionix format
+        for nutrient in nutrients:
+            name = nutrient["name"].lower()
+            if "protein" in name:
+                totals[0] += nutrient.get("value", 0)
+            elif "fat" in name:
+                totals[1] += nutrient.get("value", 0)
+            elif "carbohydrate" in name or "carbs" in name:
+                totals[2] += nutrient.get("value", 0)
+    elif "nutrientName" in nutrients[0]:  # USDA format
+        for nutrient in nutrients:
+            name = nutrient.get("nutrientName", "").lower()
+            value = nutrient.get("value") or 0
+            if "protein" in name:
+                totals[0] += value
+            elif "fat" in name and "total" in name:
+                totals[1] += value
+            elif "carbohydrate" in name:
+                totals[2] += value
+    return totals
+
+
+def nutrient_rows(calories_info):
+    """
+    Get the nutrients of one food result as rows for display
+
+    Table-backed records are read from their row's columns; other results are read
+    from their Nutritionix-style "name" or USDA "nutrientName" lists.
+
+    Parameters:
+        calories_info (dict): Food result
+
+    Returns:
+        list: (name, value, unit) tuples, empty if the result has no nutrient data
+    """
+    if isinstance(calories_info, FoodRecord):
+        return calories_info.table.nutrient_rows(calories_info.food_id)
+
+    if not calories_info or "details" not in calories_info:
+        return []
+    nutrients = calories_info["details"].get("nutrients")
+    if not isinstance(nutrients, list) or not nutrients:
+        return []
+
+    if "name" in nutrients[0]:  # Nutritionix format
+        return [(nutrient["name"], nutrient["value"], nutrient["unit"]) for nutrient in nutrients]
+    if "nutrientName" in nutrients[0]:  # USDA format
+        return [(nutrient.get("nutrientName", ""), nutrient["value"], nutrient.get("unitName", ""))
+                for nutrient in nutrients if nutrient.get("value") is not None]
+    return []
+
+
+def meal_macro_totals(calories_info_list):
+    """
+    Sum protein, fat and carbohydrates over all foods of a meal
+
+    Table-backed records are summed as a single row gather per table; only results
+    from online sources need their nutrient lists parsed.
+
+    Parameters:
+        calories_info_list (list): Food results, None for foods without data
+
+    Returns:
+        numpy.ndarray: (protein, fat, carbohydrates) in grams
+    """
+    totals = np.zeros(len(MACRO_NUTRIENTS))
+    rows_by_table = {}
+    for calories_info in calories_info_list:
+        if isinstance(calories_info, FoodRecord):
+            rows_by_table.setdefault(id(calories_info.table), (calories_info.table, []))[1].append(calories_info.food_id)
+        elif calories_info:
+            totals += macro_row(calories_info)
+    for table, food_ids in rows_by_table.values():
+        totals += table.macro_totals(food_ids)
+    return totals
@@ -0,0 +1,406 @@
+"""
+USDA FoodData Central Importer
+Streams FoodData Central bulk downloads (CSV or JSON) into the local food database
+
+Usage, from the app directory:
+    python -m data.usda_import FoodData_Central_csv_2024-04-18.zip --db food_data.db
+    python -m data.usda_import FoodData_Central_foundation_food_json_2024-04-18.json --db food_data.db
+
+Then set FOOD_DB_PATH to the database file so get_food_calories can use it.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+import zipfile
+
+from .food_db import SCHEMA, FDC_NUTRIENTS, ENERGY_NUTRIENT_IDS, DATA_TYPE_RANKS, lookup_names
+from .nutrient_table import convert_unit
+
+# Rows per executemany call
+BATCH_SIZE = 10000
+# Characters read at a time from JSON files
+JSON_CHUNK_SIZE = 1 << 20
+
+# FoodData Central unit names -> units used by the app
+FDC_UNITS = {"G": "g", "MG": "mg", "UG": "μg", "µG": "μg", "IU": "IU", "KCAL": "kcal", "KJ": "kJ"}
+
+NUTRIENT_COLUMNS = {nutrient_id: (column, unit) for nutrient_id, _, unit, column in FDC_NUTRIENTS}
+IMPORTED_NUTRIENT_IDS = set(NUTRIENT_COLUMNS) | set(ENERGY_NUTRIENT_IDS)
+
+FOOD_COLUMNS = (
+    ["fdc_id", "description", "data_type", "type_rank", "brand", "calories", "portion", "portion_grams"]
+    + [column for _, _, _, column in FDC_NUTRIENTS]
+)
+INSERT_FOOD = f"INSERT OR REPLACE INTO foods ({', '.join(FOOD_COLUMNS)}) VALUES ({', '.join('?' * len(FOOD_COLUMNS))})"
+
+
+def canonical_amount(nutrient_id, amount, unit):
+    """
+    Convert a nutrient amount to the app's unit for that nutrient
+
+    Returns:
+        float: Converted amount, or None if the nutrient is not imported or the unit is incompatible
+    """
+    unit = FDC_UNITS.get(unit.upper(), unit) if unit else None
+    if nutrient_id in ENERGY_NUTRIENT_IDS:
+        return float(amount) if unit in (None, "kcal") else None
+    target = NUTRIENT_COLUMNS.get(nutrient_id)
+    if target is None:
+        return None
+    try:
+        return convert_unit(float(amount), unit or target[1], target[1])
+    except ValueError:
+        return None
+
+
+def portion_text(description, grams):
+    """Format a portion like the built-in database, e.g. "1 cup (140g)" """
+    return f"{description} ({grams:g}g)" if description else f"{grams:g}g"
+
+
+def batched(rows, size=BATCH_SIZE):
+    """Group an iterable of rows into lists of at most size rows"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BulkSource:
+    """A FoodData Central download: a directory, a zip archive or a single JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.isdir(path):
+            self._members = {}
+            for root, _, files in os.walk(path):
+                for name in files:
+                    self._members.setdefault(name, os.path.join(root, name))
+            self._zip = None
+        elif zipfile.is_zipfile(path):
+            self._zip = zipfile.ZipFile(path)
+            self._members = {}
+            for name in self._zip.namelist():
+                self._members.setdefault(os.path.basename(name), name)
+        else:
+            self._zip = None
+            self._members = {os.path.basename(path): path}
+
+    def has(self, name):
+        return name in self._members
+
+    def json_files(self):
+        return sorted(name for name in self._members if name.lower().endswith(".json"))
+
+    def open(self, name):
+        """Open a member as a text stream (read lazily, never loaded whole)"""
+        member = self._members[name]
+        if self._zip is not None:
+            return io.TextIOWrapper(self._zip.open(member), encoding="utf-8", newline="")
+        return open(member, "r", encoding="utf-8", newline="")
+
+    def read_csv(self, name):
+        """Yield the rows of a CSV member as dicts"""
+        with self.open(name) as stream:
+            yield from csv.DictReader(stream)
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+
+
+def iter_json_array_items(stream, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Yield the items of the first JSON array in a stream one at a time.
+    Only the item being decoded is held in memory, so multi-GB files are fine.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    while "[" not in buffer:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        buffer += chunk
+    position = buffer.index("[") + 1
+    eof = False
+
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        if position < len(buffer):
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+                yield item
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            return
+        # Item incomplete or buffer exhausted: drop what was consumed and read more
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def json_food_row(food):
+    """
+    Convert a FoodData Central JSON food object to a foods row
+
+    Returns:
+        tuple: Row values in FOOD_COLUMNS order, or None if the food is skipped
+    """
+    data_type = food.get("dataType")
+    rank = DATA_TYPE_RANKS.get(data_type)
+    if rank is None or not food.get("description"):
+        return None
+
+    amounts = {}
+    for item in food.get("foodNutrients", []):
+        nutrient = item.get("nutrient") or {}
+        nutrient_id, amount = nutrient.get("id"), item.get("amount")
+        if nutrient_id in IMPORTED_NUTRIENT_IDS and amount is not None and nutrient_id not in amounts:
+            value = canonical_amount(nutrient_id, amount, nutrient.get("unitName"))
+            if value is not None:
+                amounts[nutrient_id] = value
+    calories = next((amounts[i] for i in ENERGY_NUTRIENT_IDS if i in amounts), None)
+    if calories is None:
+        return None
+
+    portion, grams = None, None
+    portions = [p for p in food.get("foodPortions", []) if p.get("gramWeight")]
+    if portions:
+        first = min(portions, key=lambda p: p.get("sequenceNumber", 0))
+        description = first.get("portionDescription") or " ".join(
+            str(part) for part in (
+                first.get("amount"),
+                (first.get("measureUnit") or {}).get("name"),
+                first.get("modifier")
+            ) if part and part != "undetermined"
+        )
+        grams = float(first["gramWeight"])
+        portion = portion_text(description, grams)
+    elif food.get("servingSize") and str(food.get("servingSizeUnit", "")).lower() in ("g", "grm"):
+        grams = float(food["servingSize"])
+        portion = portion_text(food.get("householdServingFullText"), grams)
+
+    return (
+        (food["fdcId"], food["description"], data_type, rank, food.get("brandOwner"), calories, portion, grams)
+        + tuple(amounts.get(nutrient_id) for nutrient_id, _, _, _ in FDC_NUTRIENTS)
+    )
+
+
+def import_json(conn, source, name):
+    """Import one FoodData Central JSON file"""
+    count = 0
+    with source.open(name) as stream:
+        rows = (row for row in map(json_food_row, iter_json_array_items(stream)) if row is not None)
+        for batch in batched(rows):
+            conn.executemany(INSERT_FOOD, batch)
+            count += len(batch)
+            print(f"{name}: {count} foods imported")
+    conn.commit()
+    return count
+
+
+def import_csv(conn, source):
+    """
+    Import a FoodData Central CSV download.
+    Rows are streamed into staging tables and pivoted inside SQLite, so memory use
+    does not grow with the size of food_nutrient.csv.
+    """
+    conn.executescript("""
+        CREATE TEMP TABLE stage_food (fdc_id INTEGER PRIMARY KEY, description TEXT, data_type TEXT, type_rank INTEGER);
+        CREATE TEMP TABLE stage_nutrient (fdc_id INTEGER, nutrient_id INTEGER, amount REAL);
+        CREATE TEMP TABLE stage_portion (fdc_id INTEGER, seq INTEGER, portion TEXT, grams REAL);
+        CREATE TEMP TABLE stage_brand (fdc_id INTEGER PRIMARY KEY, brand TEXT);
+    """)
+
+    # Small lookup files
+    units = {}
+    if source.has("nutrient.csv"):
+        units = {int(row["id"]): row["unit_name"] for row in source.read_csv("nutrient.csv")}
+    measure_units = {}
+    if source.has("measure_unit.csv"):
+        measure_units = {row["id"]: row["name"] for row in source.read_csv("measure_unit.csv")}
+
+    foods = (
+        (int(row["fdc_id"]), row["description"], row["data_type"], DATA_TYPE_RANKS[row["data_type"]])
+        for row in source.read_csv("food.csv")
+        if row["data_type"] in DATA_TYPE_RANKS and row["description"]
+    )
+    for batch in batched(foods):
+        conn.executemany("INSERT OR REPLACE INTO stage_food VALUES (?, ?, ?, ?)", batch)
+    print("food.csv staged")
+
+    def nutrient_rows():
+        for row in source.read_csv("food_nutrient.csv"):
+            nutrient_id = int(row["nutrient_id"])
+            if nutrient_id in IMPORTED_NUTRIENT_IDS and row["amount"]:
+                amount = canonical_amount(nutrient_id, row["amount"], units.get(nutrient_id))
+                if amount is not None:
+                    yield int(row["fdc_id"]), nutrient_id, amount
+
+    for count, batch in enumerate(batched(nutrient_rows()), 1):
+        conn.executemany("INSERT INTO stage_nutrient VALUES (?, ?, ?)", batch)
+        if count % 100 == 0:
+            print(f"food_nutrient.csv: {count * BATCH_SIZE} nutrient values staged")
+    print("food_nutrient.csv staged")
+
+    if source.has("food_portion.csv"):
+        def portion_rows():
+            for row in source.read_csv("food_portion.csv"):
+                if not row.get("gram_weight") or float(row["gram_weight"]) <= 0:
+                    continue
+                description = row.get("portion_description") or " ".join(
+                    part for part in (row.get("amount"), measure_units.get(row.get("measure_unit_id")), row.get("modifier"))
+                    if part and part != "undetermined"
+                )
+                grams = float(row["gram_weight"])
+                yield int(row["fdc_id"]), int(row.get("seq_num") or 0), portion_text(description, grams), grams
+
+        for batch in batched(portion_rows()):
+            conn.executemany("INSERT INTO stage_portion VALUES (?, ?, ?, ?)", batch)
+        print("food_portion.csv staged")
+
+    if source.has("branded_food.csv"):
+        def branded_rows():
+            for row in source.read_csv("branded_food.csv"):
+                yield int(row["fdc_id"]), row.get("brand_owner") or None, row.get("serving_size"), \
+                    row.get("serving_size_unit", ""), row.get("household_serving_fulltext")
+
+        for batch in batched(branded_rows()):
+            conn.executemany("INSERT OR REPLACE INTO stage_brand VALUES (?, ?)", [(row[0], row[1]) for row in batch])
+            conn.executemany("INSERT INTO stage_portion VALUES (?, 0, ?, ?)", [
+                (fdc_id, portion_text(household, float(size)), float(size))
+                for fdc_id, _, size, unit, household in batch
+                if size and unit.lower() in ("g", "grm") and float(size) > 0
+            ])
+        print("branded_food.csv staged")
+
+    # Pivot the staged nutrient values into one row per food
+    pivot = ", ".join(
+        f"MAX(CASE WHEN nutrient_id = {nutrient_id} THEN amount END) AS n{nutrient_id}"
+        for nutrient_id in sorted(IMPORTED_NUTRIENT_IDS)
+    )
+    energy = f"COALESCE({', '.join(f'n.n{nutrient_id}' for nutrient_id in ENERGY_NUTRIENT_IDS)})"
+    columns = ", ".join(f"n.n{nutrient_id}" for nutrient_id, _, _, _ in FDC_NUTRIENTS)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO foods ({', '.join(FOOD_COLUMNS)})
+        SELECT f.fdc_id, f.description, f.data_type, f.type_rank, b.brand, {energy}, p.portion, p.grams, {columns}
+        FROM stage_food f
+        JOIN (SELECT fdc_id, {pivot} FROM stage_nutrient GROUP BY fdc_id) n ON n.fdc_id = f.fdc_id
+        LEFT JOIN (SELECT fdc_id, portion, grams, MIN(seq) FROM stage_portion GROUP BY fdc_id) p ON p.fdc_id = f.fdc_id
+        LEFT JOIN stage_brand b ON b.fdc_id = f.fdc_id
+        WHERE {energy} IS NOT NULL
+    """)
+    conn.executescript("DROP TABLE stage_food; DROP TABLE stage_nutrient; DROP TABLE stage_portion; DROP TABLE stage_brand;")
+    conn.commit()
+    return conn.execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+
+
+def build_name_index(conn):
+    """Map every lookup name to its best food: best data type first, then shortest description"""
+    conn.execute("CREATE TEMP TABLE name_candidates (name TEXT, fdc_id INTEGER, score INTEGER)")
+    reader = conn.cursor()
+    candidates = (
+        (name, fdc_id, rank * 100000 + len(description))
+        for fdc_id, description, rank in reader.execute("SELECT fdc_id, description, type_rank FROM foods")
+        for name in lookup_names(description)
+    )
+    for batch in batched(candidates):
+        conn.executemany("INSERT INTO name_candidates VALUES (?, ?, ?)", batch)
+    conn.execute("DELETE FROM food_names")
+    # SQLite returns the bare columns of the row holding MIN(score)
+    conn.execute(
+        "INSERT INTO food_names (name, fdc_id) "
+        "SELECT name, fdc_id FROM (SELECT name, fdc_id, MIN(score) FROM name_candidates GROUP BY name)"
+    )
+    conn.execute("DROP TABLE name_candidates")
+    conn.commit()
+    return conn.execute("SELECT COUNT(*) FROM food_names").fetchone()[0]
+
+
+def import_bulk(sources, db_path, vacuum=True):
+    """
+    Build the food database from one or more FoodData Central downloads
+
+    The database is written to a temporary file and moved into place at the end,
+    so running processes keep reading the previous version until the import is done.
+
+    Parameters:
+        sources (list): Paths to CSV directories, zip archives or JSON files
+        db_path (str): Output SQLite file
+        vacuum (bool): Compact the database after importing
+
+    Returns:
+        int: Number of foods in the database
+    """
+    start = time.time()
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        # Bounded page cache (64 MB); large sorts spill to temporary files
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA temp_store=FILE")
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+        for path in sources:
+            source = BulkSource(path)
+            try:
+                if source.has("food.csv") and source.has("food_nutrient.csv"):
+                    import_csv(conn, source)
+                else:
+                    json_files = source.json_files()
+                    if not json_files:
+                        raise ValueError(f"No FoodData Central CSV or JSON files found in {path}")
+                    for name in json_files:
+                        import_json(conn, source, name)
+            finally:
+                source.close()
+
+        names = build_name_index(conn)
+        conn.execute("ANALYZE")
+        conn.commit()
+        if vacuum:
+            conn.execute("VACUUM")
+        foods = conn.execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    print(f"Imported {foods} foods under {names} names into {db_path} in {time.time() - start:.1f}s")
+    return foods
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import USDA FoodData Central bulk downloads into a local database")
+    parser.add_argument("sources", nargs="+", help="CSV directory, zip archive or JSON file from FoodData Central")
+    parser.add_argument("--db", default=os.environ.get("FOOD_DB_PATH", "food_data.db"), help="Output SQLite file")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip compacting the database")
+    args = parser.parse_args(argv)
+
+    csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+    import_bulk(args.sources, args.db, vacuum=not args.no_vacuum)
+
+
+if __name__ == "__main__":
+    main()
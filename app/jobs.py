@@ -0,0 +1,415 @@
+"""
+Recognition Job Queue
+SQLite-backed queue of recognition jobs run by a pool of worker processes
+"""
+
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Mapping
+
+from utils.image_utils import IngestedImage
+from utils.request_context import RequestContext
+from pipeline import recognize_image
+
+# SQLite file holding the jobs; every process using the same file shares one queue
+JOB_DB_PATH = os.environ.get("FOOD_JOB_DB", os.path.join(tempfile.gettempdir(), "food_calorie_jobs.sqlite3"))
+# Worker processes started alongside the UI; with 0 the UI uses workers run separately with
+# run_workers.py, or recognizes images in its own process when none are running
+JOB_WORKERS = int(os.environ.get("FOOD_JOB_WORKERS", 0))
+# Seconds between polls of the queue by idle workers and by waiting clients
+JOB_POLL_INTERVAL = float(os.environ.get("FOOD_JOB_POLL_INTERVAL", 0.25))
+# Seconds between worker heartbeats, and of silence after which a worker is presumed gone
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get("FOOD_JOB_HEARTBEAT_INTERVAL", 2))
+JOB_WORKER_TIMEOUT = float(os.environ.get("FOOD_JOB_WORKER_TIMEOUT", 15))
+# Seconds a worker may hold a job before it is presumed dead and the job is handed to another worker
+JOB_LEASE_SECONDS = float(os.environ.get("FOOD_JOB_LEASE_SECONDS", 300))
+# Times a job is tried before it is marked failed
+JOB_MAX_ATTEMPTS = int(os.environ.get("FOOD_JOB_MAX_ATTEMPTS", 2))
+# Seconds finished jobs are kept for their results to be read
+JOB_RETENTION = float(os.environ.get("FOOD_JOB_RETENTION", 3600))
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def _to_json(value):
+    """Serialize nutrition records, which may be read-only mappings over the nutrient table"""
+    def plain(obj):
+        if isinstance(obj, Mapping):
+            return dict(obj)
+        if hasattr(obj, "item"):
+            # numpy scalars
+            return obj.item()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    return json.dumps(value, ensure_ascii=False, default=plain)
+
+
+class JobQueue:
+    """
+    Durable queue of recognition jobs in SQLite.
+    Jobs carry the image bytes, so any process on the host can run them; a job whose
+    worker stops before finishing it is handed to another worker once its lease expires.
+    """
+
+    def __init__(self, db_path=JOB_DB_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS,
+                 retention=JOB_RETENTION):
+        """
+        Parameters:
+            db_path (str): Path to the SQLite database file
+            lease_seconds (float): Seconds a worker may hold a job before it is retried elsewhere
+            max_attempts (int): Times a job is tried before it is marked failed
+            retention (float): Seconds finished jobs are kept
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS recognition_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, image BLOB, file_name TEXT, "
+            "language TEXT NOT NULL, session_id TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, lease_expires REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS recognition_jobs_status_idx ON recognition_jobs (status, created_at)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS recognition_workers (id TEXT PRIMARY KEY, heartbeat REAL NOT NULL)"
+        )
+
+    def _transaction(self, work):
+        """Run work() inside one write transaction and return its result"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def submit(self, image_bytes, file_name=None, context=None):
+        """
+        Queue an image for recognition
+
+        Parameters:
+            image_bytes (bytes): Raw bytes of the image file
+            file_name (str): Original file name
+            context: RequestContext giving the result language and the session
+
+        Returns:
+            str: Job id
+        """
+        context = context if context is not None else RequestContext()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO recognition_jobs (id, status, image, file_name, language, session_id, attempts, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                (job_id, STATUS_QUEUED, sqlite3.Binary(image_bytes), file_name, context.language,
+                 context.session_id, time.time())
+            )
+        return job_id
+
+    def claim(self):
+        """
+        Take the oldest queued job, or one whose worker's lease has expired
+
+        Returns:
+            tuple: (job_id, image_bytes, file_name, RequestContext), or None if there is nothing to run
+        """
+        def work():
+            now = time.time()
+            self._conn.execute(
+                "UPDATE recognition_jobs SET status = ?, error = ?, image = NULL, finished_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (STATUS_FAILED, "Worker stopped while running the job", now, STATUS_RUNNING, now, self.max_attempts)
+            )
+            row = self._conn.execute(
+                "SELECT id, image, file_name, language, session_id FROM recognition_jobs "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY created_at LIMIT 1",
+                (STATUS_QUEUED, STATUS_RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, image_bytes, file_name, language, session_id = row
+            self._conn.execute(
+                "UPDATE recognition_jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_expires = ? "
+                "WHERE id = ?",
+                (STATUS_RUNNING, now, now + self.lease_seconds, job_id)
+            )
+            return job_id, bytes(image_bytes), file_name, RequestContext(language=language, session_id=session_id)
+
+        return self._transaction(work)
+
+    def complete(self, job_id, result):
+        """Store the JSON-serializable result of a job and drop its image"""
+        self._finish(job_id, STATUS_DONE, result=_to_json(result))
+
+    def fail(self, job_id, error):
+        """Mark a job failed with the reason and drop its image"""
+        self._finish(job_id, STATUS_FAILED, error=str(error))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        now = time.time()
+
+        def work():
+            self._conn.execute(
+                "UPDATE recognition_jobs SET status = ?, result = ?, error = ?, image = NULL, finished_at = ?, "
+                "lease_expires = NULL WHERE id = ?",
+                (status, result, error, now, job_id)
+            )
+            # Finished jobs are only kept long enough for their clients to read them
+            self._conn.execute(
+                "DELETE FROM recognition_jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (STATUS_DONE, STATUS_FAILED, now - self.retention)
+            )
+
+        self._transaction(work)
+
+    def get(self, job_id):
+        """
+        Get the state of a job
+
+        Returns:
+            dict: status, result (decoded JSON or None), error, attempts and timestamps,
+                  or None if the job is unknown or has been purged
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, result, error, attempts, created_at, started_at, finished_at "
+                "FROM recognition_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, result, error, attempts, created_at, started_at, finished_at = row
+        return {
+            "id": job_id,
+            "status": status,
+            "result": json.loads(result) if result is not None else None,
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at
+        }
+
+    def wait(self, job_id, timeout=None, poll_interval=JOB_POLL_INTERVAL):
+        """
+        Poll a job until it is finished
+
+        Parameters:
+            job_id (str): Job id returned by submit
+            timeout (float): Seconds to wait, or None to wait until the job finishes
+            poll_interval (float): Seconds between polls
+
+        Returns:
+            dict: The job as get returns it (possibly still queued or running after a timeout), or None if unknown
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in (STATUS_DONE, STATUS_FAILED):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def heartbeat(self, worker_id):
+        """Record that a worker is alive, forgetting workers silent for much longer than the timeout"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO recognition_workers (id, heartbeat) VALUES (?, ?)", (worker_id, now)
+            )
+            self._conn.execute(
+                "DELETE FROM recognition_workers WHERE heartbeat < ?", (now - 10 * JOB_WORKER_TIMEOUT,)
+            )
+
+    def unregister(self, worker_id):
+        """Remove a stopping worker from the live workers"""
+        with self._lock:
+            self._conn.execute("DELETE FROM recognition_workers WHERE id = ?", (worker_id,))
+
+    def live_workers(self, timeout=JOB_WORKER_TIMEOUT):
+        """
+        Count the workers of any process on the host that sent a heartbeat recently
+
+        Parameters:
+            timeout (float): Seconds since the last heartbeat for a worker to count as alive
+
+        Returns:
+            int: Number of live workers
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM recognition_workers WHERE heartbeat >= ?", (time.time() - timeout,)
+            ).fetchone()
+        return row[0]
+
+    def stats(self):
+        """Return the number of jobs in each status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM recognition_jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def run_job(client, image_bytes, file_name=None, context=None):
+    """
+    Recognize one queued image and look up the nutrition of its foods
+
+    Returns:
+        dict: food_names, and nutrition as [calories_info, source] pairs in the same order
+    """
+    ingested = IngestedImage(image_bytes, file_name or "image.jpg")
+    food_names, nutrition = recognize_image(client, ingested, context)
+    return {"food_names": food_names, "nutrition": [[calories_info, source] for calories_info, source in nutrition]}
+
+
+def work_jobs(client, queue, stop_event=None, poll_interval=JOB_POLL_INTERVAL,
+              heartbeat_interval=JOB_HEARTBEAT_INTERVAL):
+    """
+    Run queued jobs one at a time until stop_event is set, sending heartbeats meanwhile
+
+    Parameters:
+        client: GenAIClient used for the recognitions
+        queue (JobQueue): Queue to take jobs from
+        stop_event: threading or multiprocessing Event that ends the loop, or None to run forever
+        poll_interval (float): Seconds to sleep when the queue is empty
+        heartbeat_interval (float): Seconds between heartbeats, also sent while a job runs
+    """
+    worker_id = uuid.uuid4().hex
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(heartbeat_interval):
+            try:
+                queue.heartbeat(worker_id)
+            except sqlite3.Error as e:
+                print(f"Error sending worker heartbeat: {str(e)}")
+
+    queue.heartbeat(worker_id)
+    heart = threading.Thread(target=beat, name="job-worker-heartbeat", daemon=True)
+    heart.start()
+    try:
+        _work_loop(client, queue, stop_event, poll_interval)
+    finally:
+        stopped.set()
+        heart.join()
+        queue.unregister(worker_id)
+
+
+def _work_loop(client, queue, stop_event, poll_interval):
+    """Claim and run jobs until stop_event is set"""
+    while stop_event is None or not stop_event.is_set():
+        try:
+            job = queue.claim()
+        except sqlite3.Error as e:
+            print(f"Error claiming job: {str(e)}")
+            job = None
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        job_id, image_bytes, file_name, context = job
+        started_at = time.time()
+        try:
+            result = run_job(client, image_bytes, file_name, context)
+        except Exception as e:
+            print(f"Error running job {job_id}: {str(e)}")
+            queue.fail(job_id, e)
+            continue
+        queue.complete(job_id, result)
+        print(f"Job {job_id} done in {time.time() - started_at:.2f}s")
+
+
+def _worker_main(client, db_path, stop_event):
+    """Entry point of a worker process; the client arrives pickled and reopens its own connections"""
+    queue = JobQueue(db_path)
+    try:
+        work_jobs(client, queue, stop_event)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue.close()
+
+
+class JobWorkerPool:
+    """
+    Pool of worker processes running queued jobs.
+    Each process runs one recognition at a time, so throughput grows with the process count.
+    """
+
+    def __init__(self, client, processes=JOB_WORKERS, db_path=JOB_DB_PATH):
+        """
+        Parameters:
+            client: GenAIClient whose configuration each worker process copies
+            processes (int): Number of worker processes
+            db_path (str): SQLite file of the job queue
+        """
+        self.client = client
+        self.processes = processes
+        self.db_path = db_path
+        # Spawned rather than forked: the parent may be a threaded Streamlit or ASGI server
+        self._mp = multiprocessing.get_context("spawn")
+        self._stop_event = self._mp.Event()
+        self._workers = []
+
+    def start(self):
+        """Start the worker processes"""
+        for i in range(self.processes):
+            worker = self._mp.Process(
+                target=_worker_main, args=(self.client, self.db_path, self._stop_event),
+                name=f"recognition-worker-{i}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def stop(self, timeout=10):
+        """Let the workers finish their current jobs, then stop them"""
+        self._stop_event.set()
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+
+    def alive(self):
+        """Number of worker processes still running"""
+        return sum(1 for worker in self._workers if worker.is_alive())
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue, creating it on first use"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+    return _job_queue
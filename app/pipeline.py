@@ -0,0 +1,228 @@
+"""
+Food Recognition Pipeline
+Streamlit-independent processing stages shared by the UI and other entry points
+"""
+
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from data.food_calories import get_food_calories
+from data.nutrient_table import meal_macro_totals
+from utils.rate_limit import track_rate_limits, ENDPOINT_GENAI, ENDPOINT_USDA
+
+# Worker threads shared by all nutrition lookups in this process
+NUTRITION_LOOKUP_WORKERS = int(os.environ.get("FOOD_NUTRITION_LOOKUP_WORKERS", 16))
+# Overall deadline (seconds) for resolving all foods of one image
+NUTRITION_LOOKUP_DEADLINE = float(os.environ.get("FOOD_NUTRITION_LOOKUP_DEADLINE", 10))
+
+_lookup_executor = ThreadPoolExecutor(max_workers=NUTRITION_LOOKUP_WORKERS, thread_name_prefix="nutrition-lookup")
+
+# Data source labels shown to the user
+SOURCE_LABELS = {
+    "en": {
+        "local": "Built-in Database",
+        "estimated": "Estimated (Nutritionix API)",
+        ENDPOINT_USDA: "USDA rate limited",
+        ENDPOINT_GENAI: "recognition rate limited, offline guess"
+    },
+    "zh": {
+        "local": "内置数据库",
+        "estimated": "估计值 (Nutritionix API)",
+        ENDPOINT_USDA: "USDA 请求已限流",
+        ENDPOINT_GENAI: "识别请求已限流，离线估计"
+    }
+}
+
+
+def get_source_label(key, language="en"):
+    """Get a data source label in the given language"""
+    return SOURCE_LABELS.get(language, SOURCE_LABELS["en"])[key]
+
+
+def mark_rate_limited(nutrition, endpoint, language="en"):
+    """
+    Note in the sources of nutrition results that an endpoint's quota made them fall back to offline data
+
+    Parameters:
+        nutrition (list): (calories_info, source) tuples
+        endpoint (str): Rate-limited endpoint, ENDPOINT_USDA or ENDPOINT_GENAI
+        language (str): Interface language for the label
+
+    Returns:
+        list: The tuples with the label appended to every source found
+    """
+    label = get_source_label(endpoint, language)
+    return [(calories_info, f"{source} ({label})" if source else source) for calories_info, source in nutrition]
+
+
+def resolve_food_offline(client, food_name, language="en"):
+    """
+    Resolve nutrition data without any network call
+
+    Parameters:
+        client: GenAIClient instance used for the estimate fallback
+        food_name (str): Name of the food
+        language (str): Interface language for the source label
+
+    Returns:
+        tuple: (calories_info, source) or (None, None) if nothing was found
+    """
+    local_data = get_food_calories(food_name)
+    if local_data:
+        return local_data, get_source_label("local", language)
+
+    estimated_data = client.fetch_nutrition_data_from_nutritionix(food_name)
+    if estimated_data:
+        return estimated_data, get_source_label("estimated", language)
+
+    return None, None
+
+
+def resolve_food_nutrition(client, food_name, language="en"):
+    """
+    Resolve nutrition data for one food: online sources first, then offline fallbacks
+
+    Returns:
+        tuple: (calories_info, source) or (None, None) if nothing was found
+    """
+    with track_rate_limits() as limited:
+        try:
+            online_data, source = client.get_online_food_calories(food_name)
+            if online_data:
+                return online_data, source
+        except Exception as e:
+            print(f"Online lookup failed for {food_name}: {str(e)}")
+
+    offline = resolve_food_offline(client, food_name, language)
+    if ENDPOINT_USDA in limited:
+        # Over the USDA quota: say so instead of passing the fallback off as the usual answer
+        offline = mark_rate_limited([offline], ENDPOINT_USDA, language)[0]
+    return offline
+
+
+def lookup_nutrition_for_foods(client, food_names, language="en", deadline=None):
+    """
+    Resolve nutrition data for all foods of one image concurrently
+
+    Parameters:
+        client: GenAIClient instance
+        food_names (list): Food names in display order
+        language (str): Interface language for source labels
+        deadline (float): Overall time budget in seconds for the online lookups
+
+    Returns:
+        list: (calories_info, source) tuples in the same order as food_names
+    """
+    if deadline is None:
+        deadline = NUTRITION_LOOKUP_DEADLINE
+
+    start_time = time.time()
+    futures = [
+        _lookup_executor.submit(contextvars.copy_context().run, resolve_food_nutrition, client, food_name, language)
+        for food_name in food_names
+    ]
+    wait(futures, timeout=deadline)
+
+    results = []
+    for food_name, future in zip(food_names, futures):
+        if future.done() and not future.exception():
+            results.append(future.result())
+        else:
+            # Missed the deadline: this item falls back to the local database on its own
+            future.cancel()
+            print(f"Nutrition lookup for {food_name} missed the {deadline}s deadline, using offline data")
+            results.append(resolve_food_offline(client, food_name, language))
+
+    print(f"Resolved nutrition for {len(food_names)} foods in {time.time() - start_time:.2f}s")
+    return results
+
+
+def recognize_image(client, ingested, context=None):
+    """
+    Recognize the foods in one image and look up their nutrition
+
+    Parameters:
+        client: GenAIClient instance
+        ingested: IngestedImage to recognize
+        context: RequestContext giving the result language and the session
+
+    Returns:
+        tuple: (food_names, nutrition) with one (calories_info, source) tuple per food;
+        the sources say so when the foods are an offline guess made because the GenAI quota was used up
+    """
+    language = context.language if context is not None else "en"
+    with track_rate_limits() as limited:
+        food_names = client.identify_food_in_image(ingested, context=context)
+    food_names = food_names if isinstance(food_names, list) else [food_names] if food_names else []
+    nutrition = lookup_nutrition_for_foods(client, food_names, language)
+    if ENDPOINT_GENAI in limited:
+        nutrition = mark_rate_limited(nutrition, ENDPOINT_GENAI, language)
+    return food_names, nutrition
+
+
+def build_result_record(food_names, nutrition, started_at, error=None):
+    """
+    Flatten the recognition and nutrition results of one image into a plain record
+
+    Parameters:
+        food_names (list): Recognized food names
+        nutrition (list): (calories_info, source) tuples, one per food
+        started_at (float): time.time() when processing of the image started
+        error (str): Why the image could not be processed, or None
+
+    Returns:
+        dict: foods, sources, calories, totals and macros, error and elapsed seconds
+    """
+    calories_info_list = [calories_info for calories_info, _ in nutrition]
+    calories = [float(info["calories"]) if info else None for info in calories_info_list]
+    protein, fat, carbohydrates = (float(value) for value in meal_macro_totals(calories_info_list))
+    return {
+        "foods": food_names,
+        "sources": [source for _, source in nutrition],
+        "calories": calories,
+        "total_calories": float(sum(value for value in calories if value is not None)),
+        "protein": protein,
+        "fat": fat,
+        "carbohydrates": carbohydrates,
+        "error": error,
+        "elapsed": round(time.time() - started_at, 3)
+    }
+
+
+def analyze_images(client, images, context=None):
+    """
+    Recognize several images (packed into shared model requests) and look up the nutrition of their foods
+
+    Parameters:
+        client: GenAIClient instance
+        images (list): IngestedImages, or None for images that failed to ingest
+        context: RequestContext giving the result language and the session
+
+    Returns:
+        list: One result record (see build_result_record) per image, in order
+    """
+    started_at = time.time()
+    language = context.language if context is not None else "en"
+    records = [None] * len(images)
+    positions = [position for position, ingested in enumerate(images) if ingested is not None]
+    for position, ingested in enumerate(images):
+        if ingested is None:
+            records[position] = build_result_record([], [], started_at, error="Invalid image")
+
+    if positions:
+        try:
+            recognized = client.identify_food_in_images([images[position] for position in positions], context=context)
+        except Exception as e:
+            recognized = [e] * len(positions)
+        for position, food_names in zip(positions, recognized):
+            try:
+                if isinstance(food_names, Exception):
+                    raise food_names
+                food_names = food_names if isinstance(food_names, list) else [food_names] if food_names else []
+                nutrition = lookup_nutrition_for_foods(client, food_names, language)
+                records[position] = build_result_record(food_names, nutrition, started_at)
+            except Exception as e:
+                records[position] = build_result_record([], [], started_at, error=str(e))
+    return records
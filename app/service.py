@@ -0,0 +1,423 @@
+"""
+Recognition Service
+Standalone ASGI service exposing the recognition and nutrition pipeline over HTTP, without Streamlit
+
+Endpoints:
+    POST /recognize         one image (raw body or multipart), answered with one JSON result
+    POST /recognize/batch   several images (multipart), answered with NDJSON lines as they finish
+    GET  /metrics           Prometheus text metrics
+    GET  /health            liveness check
+
+Run with "python run_service.py" or any ASGI server, e.g. "uvicorn service:app --app-dir app".
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import parse_qs
+
+from utils.api_client import GenAIClient
+from utils.api_key import load_api_key
+from utils.batch_recognition import BATCH_MAX_IMAGES
+from utils.image_utils import IngestedImage
+from utils.request_context import RequestContext
+from pipeline import analyze_images
+
+# Threads running the pipeline, and images allowed to wait for one; beyond that requests get 429
+SERVICE_WORKERS = int(os.environ.get("FOOD_SERVICE_WORKERS", 4))
+SERVICE_QUEUE_SIZE = int(os.environ.get("FOOD_SERVICE_QUEUE_SIZE", 64))
+SERVICE_MAX_BODY_BYTES = int(os.environ.get("FOOD_SERVICE_MAX_BODY_BYTES", 50 * 1024 * 1024))
+SERVICE_MAX_BATCH_IMAGES = int(os.environ.get("FOOD_SERVICE_MAX_BATCH_IMAGES", 64))
+
+# Upper bounds (seconds) of the request latency histogram
+LATENCY_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class HTTPError(Exception):
+    """Ends a request with an error status and a JSON message"""
+
+    def __init__(self, status, message, headers=()):
+        self.status = status
+        self.message = message
+        self.headers = list(headers)
+        super().__init__(message)
+
+
+class ResponseTracker:
+    """Wraps the ASGI send callable, remembering whether the response has started and ended"""
+
+    def __init__(self, send):
+        self._send = send
+        self.status = None
+        self.finished = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body"):
+            self.finished = True
+        await self._send(message)
+
+
+class Admission:
+    """Counts the images accepted and not yet processed, refusing new ones beyond a capacity"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, count):
+        """Reserve room for count images; returns False if the service is full"""
+        with self._lock:
+            if self.in_use + count > self.capacity:
+                return False
+            self.in_use += count
+            return True
+
+    def release(self, count):
+        with self._lock:
+            self.in_use -= count
+
+
+class ServiceMetrics:
+    """Request, image and latency counters rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.requests = {}
+        self.latency_buckets = {}
+        self.latency_sum = {}
+        self.images = 0
+        self.image_errors = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, route, status, seconds):
+        with self._lock:
+            self.requests[(route, status)] = self.requests.get((route, status), 0) + 1
+            buckets = self.latency_buckets.setdefault(route, [0] * (len(LATENCY_BUCKETS) + 1))
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[index] += 1
+            buckets[-1] += 1
+            self.latency_sum[route] = self.latency_sum.get(route, 0.0) + seconds
+            if status == 429:
+                self.rejected += 1
+
+    def record_images(self, records):
+        with self._lock:
+            self.images += len(records)
+            self.image_errors += sum(1 for record in records if record.get("error"))
+
+    def render(self, admission, workers, client):
+        """Build the /metrics page"""
+        lines = []
+        with self._lock:
+            lines.append("# TYPE food_requests_total counter")
+            for (route, status), count in sorted(self.requests.items()):
+                lines.append(f'food_requests_total{{route="{route}",status="{status}"}} {count}')
+            lines.append("# TYPE food_request_seconds histogram")
+            for route, buckets in sorted(self.latency_buckets.items()):
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'food_request_seconds_bucket{{route="{route}",le="{bound}"}} {count}')
+                lines.append(f'food_request_seconds_bucket{{route="{route}",le="+Inf"}} {buckets[-1]}')
+                lines.append(f'food_request_seconds_sum{{route="{route}"}} {self.latency_sum[route]:.6f}')
+                lines.append(f'food_request_seconds_count{{route="{route}"}} {buckets[-1]}')
+            lines.append("# TYPE food_images_total counter")
+            lines.append(f"food_images_total {self.images}")
+            lines.append("# TYPE food_image_errors_total counter")
+            lines.append(f"food_image_errors_total {self.image_errors}")
+            lines.append("# TYPE food_rejected_requests_total counter")
+            lines.append(f"food_rejected_requests_total {self.rejected}")
+        lines.append("# TYPE food_images_in_progress gauge")
+        lines.append(f"food_images_in_progress {admission.in_use}")
+        lines.append("# TYPE food_images_capacity gauge")
+        lines.append(f"food_images_capacity {admission.capacity}")
+        lines.append("# TYPE food_workers gauge")
+        lines.append(f"food_workers {workers}")
+        if client is not None:
+            lines.append("# TYPE food_circuit_open gauge")
+            for endpoint, stats in sorted(client.get_circuit_stats().items()):
+                lines.append(f'food_circuit_open{{endpoint="{endpoint}"}} {0 if stats["state"] == "closed" else 1}')
+            lines.append("# TYPE food_nutrition_cache_total counter")
+            for outcome, count in sorted(client.nutrition_cache.stats().items()):
+                lines.append(f'food_nutrition_cache_total{{outcome="{outcome}"}} {count}')
+            dedup = client.get_deduplication_stats()
+            lines.append("# TYPE food_deduplicated_calls_total counter")
+            lines.append(f"food_deduplicated_calls_total {dedup['deduplicated']}")
+        return "\n".join(lines) + "\n"
+
+
+def parse_multipart(content_type, body):
+    """
+    Split a multipart/form-data body into its uploaded files
+
+    Returns:
+        list: (filename, bytes) of every part that carries a file
+    """
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+    )
+    if not message.is_multipart():
+        raise HTTPError(400, "Malformed multipart body")
+    files = []
+    for part in message.iter_parts():
+        filename = part.get_filename()
+        if filename:
+            files.append((os.path.basename(filename), part.get_payload(decode=True) or b""))
+    return files
+
+
+def ingest(image_bytes, filename):
+    """Decode uploaded bytes, returning None if they are not an image"""
+    try:
+        return IngestedImage(image_bytes, filename)
+    except ValueError as e:
+        print(f"Error ingesting image: {str(e)}")
+        return None
+
+
+class RecognitionService:
+    """ASGI application serving the recognition pipeline from a bounded worker pool"""
+
+    def __init__(self, api_key=None, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE_SIZE,
+                 max_body_bytes=SERVICE_MAX_BODY_BYTES, max_batch_images=SERVICE_MAX_BATCH_IMAGES):
+        """
+        Parameters:
+            api_key (str): HKBU GenAI Platform API key, defaults to FOOD_GENAI_API_KEY or config/api_key.txt
+            workers (int): Threads running the pipeline
+            queue_size (int): Images allowed to wait for a worker before requests are refused with 429
+            max_body_bytes (int): Largest accepted request body
+            max_batch_images (int): Most images in one batch request
+        """
+        self.api_key = api_key
+        self.workers = workers
+        self.max_body_bytes = max_body_bytes
+        self.max_batch_images = max_batch_images
+        self.admission = Admission(workers + queue_size)
+        self.metrics = ServiceMetrics()
+        self.client = None
+        self.executor = None
+
+    def start(self):
+        """Create the client and the worker pool; called on ASGI lifespan startup or the first request"""
+        if self.client is not None:
+            return
+        api_key = self.api_key or load_api_key()
+        if not api_key:
+            raise RuntimeError("No API key: set FOOD_GENAI_API_KEY or create config/api_key.txt")
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="service-worker")
+        self.client = GenAIClient(api_key)
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.start()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        started_at = time.time()
+        route, method = scope["path"].rstrip("/") or "/", scope["method"]
+        routes = {
+            "/health": ("GET", self._health),
+            "/metrics": ("GET", self._metrics),
+            "/recognize": ("POST", self._recognize),
+            "/recognize/batch": ("POST", self._recognize_batch)
+        }
+        send = ResponseTracker(send)
+        status = 500
+        try:
+            if route not in routes:
+                raise HTTPError(404, "Not found")
+            allowed_method, handler = routes[route]
+            if method != allowed_method:
+                raise HTTPError(405, "Method not allowed", [(b"allow", allowed_method.encode())])
+            self.start()
+            status = await handler(scope, receive, send)
+        except HTTPError as e:
+            status = await send_error(send, e.status, e.message, e.headers)
+        except Exception as e:
+            print(f"Error handling {method} {route}: {str(e)}")
+            status = await send_error(send, 500, "Internal server error")
+        finally:
+            self.metrics.record_request(route if route in routes else "other", status, time.time() - started_at)
+
+    async def _health(self, scope, receive, send):
+        await send_json(send, 200, {"status": "ok"})
+        return 200
+
+    async def _metrics(self, scope, receive, send):
+        body = self.metrics.render(self.admission, self.workers, self.client).encode("utf-8")
+        await send_response(send, 200, body, b"text/plain; version=0.0.4")
+        return 200
+
+    def _context(self, scope):
+        """Build the request context from the language query parameter and the X-Client-Id header"""
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        headers = dict(scope["headers"])
+        client_id = headers.get(b"x-client-id")
+        return RequestContext(
+            language=query.get("language", ["en"])[0],
+            session_id=client_id.decode("latin-1") if client_id else None
+        )
+
+    async def _read_images(self, scope, receive):
+        """Read the request body and return its images as (filename, bytes)"""
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and int(content_length) > self.max_body_bytes:
+            raise HTTPError(413, f"Body larger than {self.max_body_bytes} bytes")
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(400, "Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                raise HTTPError(413, f"Body larger than {self.max_body_bytes} bytes")
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        if content_type.startswith("multipart/form-data"):
+            return parse_multipart(content_type, body)
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return [(query.get("filename", ["image.jpg"])[0], body)]
+
+    def _admit(self, count):
+        """Reserve room for count images, refusing the request with 429 when the service is full"""
+        if not self.admission.try_acquire(count):
+            raise HTTPError(429, "Service busy, retry later", [(b"retry-after", b"1")])
+
+    def _process(self, files, context):
+        """Run on a worker: ingest and analyze a group of images"""
+        return analyze_images(self.client, [ingest(data, filename) for filename, data in files], context)
+
+    def _submit(self, files, context):
+        """
+        Queue a group of images on the workers
+
+        Their room is given back when the worker is done with them, or when the group is dropped before
+        it runs (the request was cancelled, or the service stopped)
+
+        Returns:
+            asyncio.Future: The group's records
+        """
+        future = self.executor.submit(self._process, files, context)
+        future.add_done_callback(lambda _: self.admission.release(len(files)))
+        return asyncio.wrap_future(future)
+
+    async def _recognize(self, scope, receive, send):
+        context = self._context(scope)
+        files = await self._read_images(scope, receive)
+        if len(files) != 1:
+            raise HTTPError(400, "Expected exactly one image; use /recognize/batch for several")
+        self._admit(1)
+        records = await self._submit(files, context)
+        self.metrics.record_images(records)
+        await send_json(send, 200, {"filename": files[0][0], **records[0]})
+        return 200
+
+    async def _recognize_batch(self, scope, receive, send):
+        context = self._context(scope)
+        files = await self._read_images(scope, receive)
+        if not files:
+            raise HTTPError(400, "No images in the request")
+        if len(files) > self.max_batch_images:
+            raise HTTPError(413, f"At most {self.max_batch_images} images per batch")
+        self._admit(len(files))
+
+        # Groups of images share model requests; each group is streamed back as soon as it finishes
+        groups = [list(range(start, min(start + BATCH_MAX_IMAGES, len(files))))
+                  for start in range(0, len(files), BATCH_MAX_IMAGES)]
+
+        async def run_group(group):
+            records = await self._submit([files[index] for index in group], context)
+            return group, records
+
+        tasks = [asyncio.ensure_future(run_group(group)) for group in groups]
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/x-ndjson")]
+            })
+            for next_group in asyncio.as_completed(tasks):
+                group, records = await next_group
+                self.metrics.record_images(records)
+                lines = [
+                    json.dumps({"index": index, "filename": files[index][0], **record}, ensure_ascii=False) + "\n"
+                    for index, record in zip(group, records)
+                ]
+                await send({"type": "http.response.body", "body": "".join(lines).encode("utf-8"), "more_body": True})
+        finally:
+            # After a failure the remaining groups are not awaited; queued ones are dropped and their room freed
+            for task in tasks:
+                task.cancel()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        return 200
+
+
+async def send_response(send, status, body, content_type, headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())] + list(headers)
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send_response(send, status, body, b"application/json", headers)
+
+
+async def send_error(send, status, message, headers=()):
+    """
+    Answer with a JSON error, or end a response whose headers are already sent with an NDJSON error line
+
+    Parameters:
+        send (ResponseTracker): The request's send callable
+
+    Returns:
+        int: Status the client received
+    """
+    if send.status is None:
+        await send_json(send, status, {"error": message}, headers)
+        return status
+    if not send.finished:
+        line = json.dumps({"error": message}, ensure_ascii=False) + "\n"
+        await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": False})
+    return send.status
+
+
+# ASGI entry point, e.g. "uvicorn service:app --app-dir app"
+app = RecognitionService()
@@ -5,53 +5,41 @@ GenAI Client for interacting with HKBU GenAI Platform and other APIs
 import os
 import base64
 import json
-import requests
 import time
 from PIL import Image
-import streamlit as st
 
-class GenAIClient:
-    """Client for interacting with AI APIs"""
+from .http_session import get_session
+from .model_dispatch import ModelDispatcher, DEFAULT_STRATEGY, dispatch_cancelled
+from .batch_recognition import (BatchItem, BatchSizer, BATCH_PROMPT_ZH, BATCH_PROMPT_EN, BATCH_REQUEST_TIMEOUT,
+                                build_batch_content, estimate_image_tokens, get_batch_latency_stats, parse_batch_answer)
+from .recognition_cache import get_recognition_cache, make_recognition_key, make_recognition_scope
+from .perceptual_hash import dhash
+from .color_features import get_color_engine
+from .nutrition_cache import get_nutrition_cache, make_nutrition_key
+from .single_flight import get_single_flight
+from .rate_limit import (get_rate_limiter, parse_retry_after, rate_limit_session, track_rate_limits, report_rate_limited,
+                         RateLimitExceeded, ENDPOINT_GENAI, ENDPOINT_USDA)
+from .request_context import DEFAULT_CONTEXT
+from .circuit_breaker import get_circuit_breakers, CircuitOpenError
+from .image_utils import IngestedImage, prepare_image_for_upload, UPLOAD_MAX_EDGE, UPLOAD_FORMAT, UPLOAD_QUALITY
+from data.food_index import FuzzyIndex, FUZZY_MIN_CONFIDENCE
 
-    def __init__(self, api_key):
-        """Initialize client with API key"""
-        self.api_key = api_key
-        self.base_url = "https://genai.hkbu.edu.hk/api/v1"
-        self.headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        self.timeout = 15  # Timeout in seconds
+# Hosts used by the client, each served by its own pooled keep-alive session
+GENAI_HOST = "genai.hkbu.edu.hk"
+USDA_HOST = "api.nal.usda.gov"
 
-    def encode_image(self, image_path):
-        """Encode image to base64"""
-        try:
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
-        except Exception as e:
-            print(f"Error encoding image: {str(e)}")
-            return None
-            
-    def identify_food_in_image(self, image_path):
-        """
-        Identify food in an image using HKBU GenAI Platform
-        Returns a list of food names if multiple foods are detected, or a single food name
-        """
-        # Encode image to base64
-        base64_image = self.encode_image(image_path)
-        if not base64_image:
-            print("Failed to encode image")
-            return None
-        
-        # Use the correct HKBU GenAI Platform API format
-        base_url = "https://genai.hkbu.edu.hk/general/rest/deployments"
-        api_version = "2024-05-01-preview"
-        
-        # Available models list
-        models = ["gpt-4-o", "gpt-4-o-mini"]
-        
-        # Optimize prompts, specifically for multiple food recognition
-        prompt_zh = """这张图片中有哪些食物？如果有多种食物，请列出所有食物名称，用逗号分隔。
+# USDA FoodData Central data set queried for online lookups
+USDA_DATA_TYPE = "Survey (FNDDS)"
+
+# HKBU GenAI Platform deployment API
+DEPLOYMENTS_URL = "https://genai.hkbu.edu.hk/general/rest/deployments"
+API_VERSION = "2024-05-01-preview"
+
+# Available models list, in order of preference
+DEFAULT_MODELS = ["gpt-4-o", "gpt-4-o-mini"]
+
+# Optimize prompts, specifically for multiple food recognition
+PROMPT_ZH = """这张图片中有哪些食物？如果有多种食物，请列出所有食物名称，用逗号分隔。
 请只回答具体的食物名称，不要使用"餐点"、"膳食"、"meal"这样的通用词汇。
 每种食物需要单独命名，例如"汉堡和薯条"应该回答"汉堡,薯条"而不是"快餐"。
 如果是组合食物，请列出主要成分，例如"意大利面配肉酱"、"米饭配牛肉"。
@@ -70,7 +58,7 @@ class GenAIClient:
 - 冰淇淋 (ice cream)
 """
 
-        prompt_en = """What specific foods are in this image? If there are multiple foods, list all food names separated by commas.
+PROMPT_EN = """What specific foods are in this image? If there are multiple foods, list all food names separated by commas.
 DO NOT use generic terms like "meal" or "dish" - identify each specific food item.
 For example, if you see "hamburger and fries", answer with "hamburger, french fries" not "fast food meal".
 If it's a combination food, list the main components like "pasta with meat sauce" or "rice with beef".
@@ -88,305 +76,731 @@ Be especially careful to identify these common foods:
 - cake
 - ice cream
 """
+
+# Leading phrases and generic terms removed from model answers
+ANSWER_PREFIXES = ["这是", "这张图片是", "图片中的食物是", "食物是",
+                   "这是一个", "这是一份", "一个", "一份", "包含", "这是"]
+ANSWER_MARKERS = ['。', '，', '、', '：', ':', '.', ',', '1.', '2.', '3.', '4.', '5.', '-']
+GENERIC_FOOD_TERMS = ["meal", "dish", "food", "餐点", "膳食", "食物"]
+
+# Source labels of online results
+USDA_SOURCE = "USDA Food Database (Real-time)"
+NUTRITIONIX_SOURCE = "Nutritionix API (Real-time)"
+
+
+class USDAUnavailable(Exception):
+    """Raised when USDA answers a lookup with an error status; such lookups are not cached"""
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        super().__init__(f"USDA answered with status {status_code}")
+
+
+def parse_food_names(content):
+    """
+    Split a model answer into cleaned food names
+
+    Parameters:
+        content (str): Raw answer text from the model
+
+    Returns:
+        list: Specific food names found in the answer
+    """
+    food_items = []
+
+    # Split content to get food list
+    for item in content.split(','):
+        food_name = item.strip().lower()
+
+        # Remove common leading phrases
+        for prefix in ANSWER_PREFIXES:
+            if food_name.startswith(prefix):
+                food_name = food_name[len(prefix):].strip()
+
+        # Remove punctuation and number markers
+        for ch in ANSWER_MARKERS:
+            food_name = food_name.replace(ch, '').strip()
+
+        # Filter out generic terms and empty values
+        if food_name and food_name not in GENERIC_FOOD_TERMS:
+            print(f"Processed food name: '{food_name}'")
+            food_items.append(food_name)
+
+    return food_items
+
+
+# Food name translations between English and Chinese
+FOOD_NAME_TRANSLATIONS = {
+    # English food names and their Chinese translations
+    "pizza": "披萨",
+    "hamburger": "汉堡",
+    "burger": "汉堡",
+    "cheeseburger": "芝士汉堡",
+    "sandwich": "三明治",
+    "salad": "沙拉",
+    "fried chicken": "炸鸡",
+    "chicken": "鸡肉",
+    "french fries": "薯条",
+    "fries": "薯条",
+    "potato": "土豆",
+    "rice": "米饭",
+    "bread": "面包",
+    "cake": "蛋糕",
+    "donut": "甜甜圈",
+    "cookie": "饼干",
+    "ice cream": "冰淇淋",
+    "coffee": "咖啡",
+    "tea": "茶",
+    "soda": "汽水",
+    "juice": "果汁",
+    "water": "水",
+    "cola": "可乐",
+    "beef": "牛肉",
+    "steak": "牛排",
+    "pork": "猪肉",
+    "fish": "鱼",
+    "sushi": "寿司",
+    "pasta": "意大利面",
+    "noodles": "面条",
+    
+    # Chinese food names and their English translations
+    "披萨": "pizza",
+    "比萨": "pizza",
+    "汉堡": "hamburger",
+    "芝士汉堡": "cheeseburger",
+    "奶酪汉堡": "cheeseburger",
+    "三明治": "sandwich",
+    "沙拉": "salad",
+    "炸鸡": "fried chicken",
+    "鸡肉": "chicken",
+    "薯条": "french fries",
+    "土豆": "potato",
+    "米饭": "rice",
+    "面包": "bread",
+    "蛋糕": "cake",
+    "甜甜圈": "donut",
+    "饼干": "cookie",
+    "冰淇淋": "ice cream",
+    "咖啡": "coffee",
+    "茶": "tea",
+    "汽水": "soda",
+    "果汁": "juice",
+    "水": "water",
+    "可乐": "cola",
+    "牛肉": "beef",
+    "牛排": "steak",
+    "猪肉": "pork",
+    "鱼": "fish",
+    "寿司": "sushi",
+    "意大利面": "pasta",
+    "面条": "noodles"
+}
+
+# Typo-tolerant index over the translatable names, built once at import
+FOOD_NAME_TRANSLATION_INDEX = FuzzyIndex(FOOD_NAME_TRANSLATIONS.keys())
+
+
+def correct_food_name(food_name):
+    """
+    Correct a misspelled food name against the known translatable names
+
+    Parameters:
+        food_name (str): Lowercase food name, possibly misspelled (e.g. "hamberger")
+
+    Returns:
+        str: The closest known name if it is a confident match, otherwise food_name unchanged
+    """
+    if food_name in FOOD_NAME_TRANSLATIONS:
+        return food_name
+    name, _, confidence = FOOD_NAME_TRANSLATION_INDEX.lookup(food_name)
+    if name is not None and confidence >= FUZZY_MIN_CONFIDENCE:
+        return name
+    return food_name
+
+
+class GenAIClient:
+    """Client for interacting with AI APIs"""
+
+    def __init__(self, api_key, models=None, dispatch_strategy=DEFAULT_STRATEGY, recognition_cache=None,
+                 color_engine=None, nutrition_cache=None, single_flight=None, rate_limiter=None,
+                 circuit_breakers=None):
+        """
+        Initialize client with API key
+
+        Parameters:
+            api_key (str): HKBU GenAI Platform API key
+            models (list): Vision models to use, in order of preference
+            dispatch_strategy (str): How models are called: "sequential", "hedged" or "race"
+            recognition_cache: RecognitionCache to use, defaults to the process-wide cache
+            color_engine: ColorFeatureEngine for the offline fallback, defaults to the shared engine
+            nutrition_cache: NutritionCache for online lookups, defaults to the process-wide cache
+            single_flight: SingleFlight coalescing identical concurrent calls, defaults to the shared group
+            rate_limiter: RateLimiter guarding outbound calls, defaults to the process-wide limiter
+            circuit_breakers: CircuitBreakerRegistry for the remote endpoints, defaults to the process-wide one
+        """
+        self.api_key = api_key
+        self.models = list(models) if models else list(DEFAULT_MODELS)
+        self.dispatcher = ModelDispatcher(dispatch_strategy)
+        self.batch_dispatcher = ModelDispatcher(dispatch_strategy, stats=get_batch_latency_stats())
+        self.batch_sizer = BatchSizer()
+        self.recognition_cache = recognition_cache if recognition_cache is not None else get_recognition_cache()
+        self.color_engine = color_engine if color_engine is not None else get_color_engine()
+        self.nutrition_cache = nutrition_cache if nutrition_cache is not None else get_nutrition_cache()
+        self.single_flight = single_flight if single_flight is not None else get_single_flight()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.circuit_breakers = circuit_breakers if circuit_breakers is not None else get_circuit_breakers()
+        # Upload preprocessing: maximum edge in pixels, target format and quality
+        self.upload_max_edge = UPLOAD_MAX_EDGE
+        self.upload_format = UPLOAD_FORMAT
+        self.upload_quality = UPLOAD_QUALITY
+        self.base_url = "https://genai.hkbu.edu.hk/api/v1"
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        self.timeout = 15  # Timeout in seconds
+
+    def get_model_latency_stats(self):
+        """Return per-model call counts and latency percentiles used for hedging"""
+        return self.dispatcher.stats.snapshot()
+
+    def get_circuit_stats(self):
+        """Return the state of the circuit breaker of every remote endpoint"""
+        return self.circuit_breakers.stats()
+
+    def get_deduplication_stats(self):
+        """Return how many calls ran and how many shared an identical call already in flight"""
+        return self.single_flight.stats()
+
+    def __getstate__(self):
+        """
+        Pickle only the configuration: the caches, limiters and breakers hold locks and
+        connections, so an unpickled client uses the process-wide ones of its new process
+        """
+        return {
+            "api_key": self.api_key,
+            "models": self.models,
+            "dispatch_strategy": self.dispatcher.strategy,
+            "upload_max_edge": self.upload_max_edge,
+            "upload_format": self.upload_format,
+            "upload_quality": self.upload_quality,
+            "batch_max_images": self.batch_sizer.max_images
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["api_key"], models=state["models"], dispatch_strategy=state["dispatch_strategy"])
+        self.upload_max_edge = state["upload_max_edge"]
+        self.upload_format = state["upload_format"]
+        self.upload_quality = state["upload_quality"]
+        self.batch_sizer = BatchSizer(max_images=state["batch_max_images"])
+
+    def read_image_bytes(self, image_path):
+        """Read raw image bytes from disk"""
+        try:
+            with open(image_path, "rb") as image_file:
+                return image_file.read()
+        except Exception as e:
+            print(f"Error reading image: {str(e)}")
+            return None
+
+    def encode_image(self, image_path):
+        """Encode image to base64, downscaled and re-encoded for upload"""
+        image_bytes = self.read_image_bytes(image_path)
+        if image_bytes is None:
+            return None
+        prepared = prepare_image_for_upload(
+            image_bytes,
+            max_edge=self.upload_max_edge,
+            image_format=self.upload_format,
+            quality=self.upload_quality
+        )
+        if prepared is None:
+            return base64.b64encode(image_bytes).decode('utf-8')
+        return prepared["base64"]
+            
+    def identify_food_in_image(self, image, context=None):
+        """
+        Identify food in an image using HKBU GenAI Platform
+        Accepts an IngestedImage (decoded once at upload) or a path to an image file
+        The RequestContext gives the result language and the session; defaults to English
+        Returns a list of food names if multiple foods are detected, or a single food name
+        """
+        ingested = image if isinstance(image, IngestedImage) else IngestedImage.from_path(image)
+        if ingested is None:
+            print("Failed to encode image")
+            return None
         
-        # Choose prompt based on current language
-        prompt = prompt_zh if hasattr(st.session_state, 'language') and st.session_state.language == "zh" else prompt_en
+        context = context if context is not None else DEFAULT_CONTEXT
+        with rate_limit_session(context.session_id):
+            return self._identify(ingested, context.language)
+
+    def _identify(self, ingested, language):
+        """Recognize one ingested image: caches, then the models, then offline analysis"""
+        # Choose prompt based on the requested language
+        prompt = PROMPT_ZH if language == "zh" else PROMPT_EN
         
-        # Collect recognition results
-        image_analysis_results = []
+        # Identical images are answered from the recognition cache without any network call
+        cache_key = make_recognition_key(ingested.content_hash, language, self.models)
+        cached_result = self.recognition_cache.get(cache_key)
+        if cached_result is not None:
+            print(f"Recognition cache hit: {cached_result}")
+            return cached_result
         
-        # Try different models
-        for model in models:
-            endpoint = f"{base_url}/{model}/chat/completions?api-version={api_version}"
-            print(f"Attempting to call model: {model}, endpoint: {endpoint}")
-            
-            # Use correct request header format
-            headers = {
-                "Content-Type": "application/json",
-                "api-key": self.api_key
-            }
-            
-            # Request payload
-            payload = {
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "max_tokens": 50,
-                "temperature": 0.1
-            }
-            
-            try:
-                print(f"Sending request to {model} model")
-                
-                response = requests.post(
-                    endpoint,
-                    headers=headers,
-                    json=payload,
-                    timeout=30
-                )
-                
-                print(f"Response status code: {response.status_code}")
-                print(f"Response content: {response.text[:200]}")
-                
-                if response.status_code == 200:
-                    try:
-                        result = response.json()
-                        
-                        if "choices" in result and len(result["choices"]) > 0:
-                            content = result["choices"][0]["message"]["content"].strip()
-                            print(f"Original recognition result: '{content}'")
-                            
-                            # Handle the case of multiple foods
-                            food_items = []
-                            
-                            # Split content to get food list
-                            for item in content.split(','):
-                                food_name = item.strip().lower()
-                                
-                                # Remove common leading phrases
-                                for prefix in ["这是", "这张图片是", "图片中的食物是", "食物是", 
-                                              "这是一个", "这是一份", "一个", "一份", "包含", "这是"]:
-                                    if food_name.startswith(prefix):
-                                        food_name = food_name[len(prefix):].strip()
-                                
-                                # Remove punctuation and number markers
-                                for ch in ['。', '，', '、', '：', ':', '.', ',', '1.', '2.', '3.', '4.', '5.', '-']:
-                                    food_name = food_name.replace(ch, '').strip()
-                                
-                                # Filter out generic terms and empty values
-                                if food_name and food_name not in ["meal", "dish", "food", "餐点", "膳食", "食物"]:
-                                    print(f"Processed food name: '{food_name}'")
-                                    food_items.append(food_name)
-                                
-                            # Add recognition results to the total list
-                            image_analysis_results.extend(food_items)
-                            
-                            # Return if at least one food is found
-                            if food_items:
-                                # Map food names to current interface language
-                                translated_foods = self.translate_food_names(food_items)
-                                
-                                # If only one food, return string
-                                if len(translated_foods) == 1:
-                                    return translated_foods[0]
-                                # If multiple foods, return list
-                                else:
-                                    return translated_foods
-                    except Exception as e:
-                        print(f"Error processing response: {str(e)}")
-                else:
-                    print(f"API request failed, status code: {response.status_code}")
-                    print(f"Error response: {response.text}")
-            except Exception as e:
-                print(f"Request exception: {str(e)}")
+        # While the GenAI endpoint is failing, don't wait on timeouts: analyze the image locally
+        if self.circuit_breakers.get(ENDPOINT_GENAI).is_open():
+            print("GenAI circuit open, using offline image analysis")
+            return self._identify_offline(ingested, language, use_filename=False)
         
-        # If API recognized food but hasn't returned yet
-        if image_analysis_results:
-            # Filter out generic terms like "meal"
-            specific_foods = [food for food in image_analysis_results if food.lower() != "meal"]
-            
-            # If filtered out but has generic "meal" term, use image analysis to determine specific food
-            if not specific_foods and "meal" in [food.lower() for food in image_analysis_results]:
-                # Use image analysis
-                specific_foods = self.analyze_image_colors(image_path)
-            
-            # If there are specific food names
-            if specific_foods:
-                translated_foods = self.translate_food_names(specific_foods)
-                if len(translated_foods) == 1:
-                    return translated_foods[0]
-                else:
-                    return translated_foods
+        # Identical images uploaded concurrently share one model call;
+        # quota refusals only matter to the caller if no model answers
+        with track_rate_limits() as limited:
+            result = self.single_flight.do(
+                ("recognition", cache_key), self._recognize_with_models, ingested, language, prompt, cache_key
+            )
+        if result is not None:
+            return result
         
+        if ENDPOINT_GENAI in limited:
+            print("GenAI quota used up, using offline image analysis")
+            report_rate_limited(ENDPOINT_GENAI)
+        return self._identify_offline(ingested, language)
+
+    def _identify_offline(self, ingested, language, use_filename=True):
+        """
+        Guess the food without the models: from the filename, then image colors, then defaults
+        Returns a list of food names or a single food name
+        """
         # Try to extract food name from image filename
-        try:
-            filename = os.path.basename(image_path).lower()
-            common_foods = ["hamburger", "burger", "pizza", "sandwich", "salad", 
-                            "chicken", "pasta", "rice", "fish", "bread", 
-                            "steak", "sushi", "taco", "donut", "cake", "cookie"]
+        if use_filename:
+            try:
+                filename = os.path.basename(ingested.name).lower()
+                common_foods = ["hamburger", "burger", "pizza", "sandwich", "salad", 
+                                "chicken", "pasta", "rice", "fish", "bread", 
+                                "steak", "sushi", "taco", "donut", "cake", "cookie"]
             
-            found_foods = []
-            for food in common_foods:
-                if food in filename:
-                    found_foods.append(food)
+                found_foods = []
+                for food in common_foods:
+                    if food in filename:
+                        found_foods.append(food)
             
-            if found_foods:
-                print(f"Using filename to recognize food: {found_foods}")
-                translated_foods = self.translate_food_names(found_foods)
-                if len(translated_foods) == 1:
-                    return translated_foods[0]
-                else:
-                    return translated_foods
-        except Exception as filename_error:
-            print(f"Error recognizing food from filename: {str(filename_error)}")
+                if found_foods:
+                    print(f"Using filename to recognize food: {found_foods}")
+                    translated_foods = self.translate_food_names(found_foods, language)
+                    if len(translated_foods) == 1:
+                        return translated_foods[0]
+                    else:
+                        return translated_foods
+            except Exception as filename_error:
+                print(f"Error recognizing food from filename: {str(filename_error)}")
         
         # Image analysis, find common food features
-        found_foods = self.analyze_image_colors(image_path)
+        found_foods = self.analyze_image_colors(ingested.image)
         if found_foods:
-            translated_foods = self.translate_food_names(found_foods)
+            translated_foods = self.translate_food_names(found_foods, language)
             if len(translated_foods) == 1:
                 return translated_foods[0]
             else:
                 return translated_foods
         
         # Finally use default value
-        if "hamburger" in image_path.lower() or "burger" in image_path.lower():
-            return "汉堡" if hasattr(st.session_state, 'language') and st.session_state.language == "zh" else "hamburger"
-        elif "pizza" in image_path.lower():
-            return "披萨" if hasattr(st.session_state, 'language') and st.session_state.language == "zh" else "pizza"
+        filename = ingested.name.lower()
+        if "hamburger" in filename or "burger" in filename:
+            return "汉堡" if language == "zh" else "hamburger"
+        elif "pizza" in filename:
+            return "披萨" if language == "zh" else "pizza"
         
         # Completely not found, return hamburger as default
-        return "汉堡" if hasattr(st.session_state, 'language') and st.session_state.language == "zh" else "hamburger"
+        return "汉堡" if language == "zh" else "hamburger"
 
-    def analyze_image_colors(self, image_path):
-        """Analyze image color recognition for possible food"""
-        try:
-            from PIL import Image
-            img = Image.open(image_path)
+    def _recognize_with_models(self, ingested, language, prompt, cache_key):
+        """
+        Recognize an image that missed the exact cache: near-duplicate lookup, then the models
+        Returns the recognition result, or None if no model found any food
+        """
+        image_url, cache_scope, image_phash, similar_result = self._prepare_recognition(ingested, language)
+        if similar_result is not None:
+            return similar_result
+        
+        # Call the models using the configured dispatch strategy
+        food_items = self.dispatcher.dispatch(
+            self.models,
+            lambda model: self._request_model(model, prompt, image_url)
+        )
+        return self._finish_recognition(food_items, language, cache_key, cache_scope, image_phash)
+
+    def _prepare_recognition(self, ingested, language):
+        """
+        Build the upload payload of an image and look for a near-duplicate recognition
+        Returns (image_url, cache_scope, image_phash, similar_result)
+        """
+        # Downscale and re-encode the already decoded pixels to a small upload payload
+        prepared = ingested.prepare_upload(
+            max_edge=self.upload_max_edge,
+            image_format=self.upload_format,
+            quality=self.upload_quality
+        )
+        image_url = f"data:{prepared['mime_type']};base64,{prepared['base64']}"
+        
+        # Re-takes of the same dish are never byte-identical, so also look for near duplicates
+        cache_scope = make_recognition_scope(language, self.models)
+        image_phash = dhash(prepared["image"])
+        similar_result, distance = self.recognition_cache.find_similar(cache_scope, image_phash)
+        if similar_result is not None:
+            print(f"Near-duplicate recognition cache hit (distance {distance}): {similar_result}")
+        return image_url, cache_scope, image_phash, similar_result
+
+    def _finish_recognition(self, food_items, language, cache_key, cache_scope, image_phash):
+        """
+        Translate and cache the food names found by the models
+        Returns the recognition result, or None if no model found any food
+        """
+        if food_items:
+            # Map food names to the requested language
+            translated_foods = self.translate_food_names(food_items, language)
             
-            # Get image main colors
-            img = img.resize((50, 50))
-            colors = img.getcolors(2500)
+            # If only one food, return string
+            result = translated_foods[0] if len(translated_foods) == 1 else translated_foods
+            self.recognition_cache.set(cache_key, result, scope=cache_scope, phash=image_phash)
+            return result
+        
+        return None
+
+    def _request_model(self, model, prompt, image_url):
+        """
+        Send one recognition request to a model
+        Returns a list of food names, or None if the call failed or found nothing
+        """
+        endpoint, headers, payload = self._model_request(model, prompt, image_url)
+        circuit = self._admit_model_call(model)
+        if circuit is None:
+            return None
+        
+        try:
+            print(f"Sending request to {model} model")
             
-            if colors:
-                # Sort by appearance frequency
-                colors.sort(reverse=True)
-                
-                # Check various food feature colors
-                has_brown = any(
-                    100 < r < 200 and 50 < g < 150 and 0 < b < 100
-                    for count, (r, g, b) in colors if count > 50
-                )
-                
-                has_red = any(
-                    200 < r < 255 and 0 < g < 100 and 0 < b < 100
-                    for count, (r, g, b) in colors if count > 50
-                )
-                
-                has_yellow = any(
-                    200 < r < 255 and 150 < g < 220 and 0 < b < 100
-                    for count, (r, g, b) in colors if count > 50
-                )
-                
-                has_green = any(
-                    0 < r < 100 and 150 < g < 255 and 0 < b < 100
-                    for count, (r, g, b) in colors if count > 50
-                )
+            response = get_session(GENAI_HOST).post(
+                endpoint,
+                headers=headers,
+                json=payload,
+                timeout=30
+            )
+        except Exception as e:
+            # Timeouts and connection errors
+            circuit.record_failure()
+            print(f"Request exception: {str(e)}")
+            return None
+        
+        return self._handle_model_response(response, circuit)
+
+    def _model_request(self, model, prompt, image_url):
+        """
+        Build one recognition request
+        Returns (endpoint, headers, payload)
+        """
+        endpoint = f"{DEPLOYMENTS_URL}/{model}/chat/completions?api-version={API_VERSION}"
+        print(f"Attempting to call model: {model}, endpoint: {endpoint}")
+        
+        # Use correct request header format
+        headers = {
+            "Content-Type": "application/json",
+            "api-key": self.api_key
+        }
+        
+        # Request payload
+        payload = {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url
+                            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": 50,
+            "temperature": 0.1
+        }
+        return endpoint, headers, payload
+
+    def _admit_model_call(self, model):
+        """
+        Check the GenAI circuit and quota before calling a model
+        Returns the GenAI circuit breaker, which must then be given the call's outcome, or None to skip the call
+        """
+        # Another model already won the race: send nothing
+        if dispatch_cancelled():
+            return None
+        
+        # Endpoint failing: skip the call instead of waiting on a certain timeout (and keep the token)
+        circuit = self.circuit_breakers.get(ENDPOINT_GENAI)
+        if not circuit.allow_request():
+            print(f"Skipping {model}: GenAI circuit open")
+            return None
+        
+        # Out of quota: skip the call instead of waiting on a certain 429, giving back any probe slot
+        try:
+            self.rate_limiter.acquire(ENDPOINT_GENAI)
+        except RateLimitExceeded as e:
+            circuit.release()
+            print(f"Skipping {model}: {str(e)}")
+            return None
+        
+        # The race may have been won while this call waited for a token
+        if dispatch_cancelled():
+            circuit.release()
+            return None
+        return circuit
+
+    def _record_model_outcome(self, response, circuit):
+        """Feed the status of a model response to the GenAI circuit breaker and rate limiter"""
+        print(f"Response status code: {response.status_code}")
+        print(f"Response content: {response.text[:200]}")
+        
+        # Any answer short of a server error shows the endpoint is up
+        if response.status_code >= 500:
+            circuit.record_failure()
+        else:
+            circuit.record_success()
+        
+        if response.status_code == 429:
+            self.rate_limiter.penalize(ENDPOINT_GENAI, parse_retry_after(response.headers.get("Retry-After")))
+
+    def _handle_model_response(self, response, circuit):
+        """
+        Record the outcome of a model call and parse its answer
+        Works with requests and httpx responses alike
+        Returns a list of food names, or None if the call failed or found nothing
+        """
+        self._record_model_outcome(response, circuit)
+        
+        if response.status_code == 200:
+            try:
+                result = response.json()
                 
-                # Based on color features infer food
-                found_foods = []
-                if has_brown:
-                    found_foods.append("hamburger")
-                if has_red:
-                    found_foods.append("pizza")
-                if has_yellow:
-                    found_foods.append("french fries")
-                if has_green:
-                    found_foods.append("salad")
+                if "choices" in result and len(result["choices"]) > 0:
+                    content = result["choices"][0]["message"]["content"].strip()
+                    print(f"Original recognition result: '{content}'")
                     
-                return found_foods
+                    # Handle the case of multiple foods
+                    return parse_food_names(content) or None
+            except Exception as e:
+                print(f"Error processing response: {str(e)}")
+        else:
+            print(f"API request failed, status code: {response.status_code}")
+            print(f"Error response: {response.text}")
+        
+        return None
+
+    def identify_food_in_images(self, images, context=None):
+        """
+        Identify food in many images, packing several images into each model request
+        
+        Images the batch answers miss are retried one by one through identify_food_in_image.
+        
+        Parameters:
+            images (list): IngestedImages or paths to image files
+            context: RequestContext giving the result language and the session; defaults to English
+            
+        Returns:
+            list: One result per image, in order, as identify_food_in_image returns them
+        """
+        context = context if context is not None else DEFAULT_CONTEXT
+        with rate_limit_session(context.session_id):
+            return self._identify_batch(images, context.language)
+
+    def _identify_batch(self, images, language):
+        """Recognize many images in batches, retrying the ones the batches miss one by one"""
+        results, pending = self._plan_batches(images, language)
+        retry = []
+        
+        # While the GenAI endpoint is failing, every image is retried (and analyzed offline) one by one
+        if pending and not self.circuit_breakers.get(ENDPOINT_GENAI).is_open():
+            prompt_template = BATCH_PROMPT_ZH if language == "zh" else BATCH_PROMPT_EN
+            while pending:
+                batch = self.batch_sizer.take(pending)
+                outcome = self.batch_dispatcher.dispatch(
+                    self.models,
+                    lambda model: self._request_batch(model, prompt_template, batch)
+                )
+                retry.extend(self._apply_batch_outcome(batch, outcome, results, language))
+        else:
+            retry = pending
+        
+        for item in retry:
+            result = self._identify(item.ingested, language)
+            for position in item.positions:
+                results[position] = result
+        return results
+
+    def _plan_batches(self, images, language):
+        """
+        Answer what the recognition caches can and collect the distinct images left for the models
+        Returns (results, pending): results holds None for every image still pending
+        """
+        results = [None] * len(images)
+        pending = {}
+        for position, image in enumerate(images):
+            ingested = image if isinstance(image, IngestedImage) else IngestedImage.from_path(image)
+            if ingested is None:
+                print("Failed to encode image")
+                continue
+            
+            cache_key = make_recognition_key(ingested.content_hash, language, self.models)
+            item = pending.get(cache_key)
+            if item is not None:
+                # The same image twice in one run is only sent once
+                item.positions.append(position)
+                continue
+            cached_result = self.recognition_cache.get(cache_key)
+            if cached_result is not None:
+                results[position] = cached_result
+                continue
+            
+            image_url, cache_scope, image_phash, similar_result = self._prepare_recognition(ingested, language)
+            if similar_result is not None:
+                results[position] = similar_result
+                continue
+            width, height = ingested.prepare_upload(
+                max_edge=self.upload_max_edge,
+                image_format=self.upload_format,
+                quality=self.upload_quality
+            )["image"].size
+            item = BatchItem(ingested, cache_key, cache_scope, image_phash, image_url,
+                             estimate_image_tokens(width, height))
+            item.positions.append(position)
+            pending[cache_key] = item
+        return results, list(pending.values())
+
+    def _request_batch(self, model, prompt_template, batch):
+        """
+        Send one batch recognition request to a model
+        Returns (answers by batch index, truncated), or None if the call failed or answered nothing
+        """
+        endpoint, headers, payload = self._batch_request(model, prompt_template, batch)
+        circuit = self._admit_model_call(model)
+        if circuit is None:
+            return None
+        
+        try:
+            print(f"Sending batch of {len(batch)} images to {model} model")
+            response = get_session(GENAI_HOST).post(
+                endpoint,
+                headers=headers,
+                json=payload,
+                timeout=BATCH_REQUEST_TIMEOUT
+            )
+        except Exception as e:
+            # Timeouts and connection errors
+            circuit.record_failure()
+            print(f"Request exception: {str(e)}")
+            return None
+        
+        return self._handle_batch_response(response, circuit, len(batch))
+
+    def _batch_request(self, model, prompt_template, batch):
+        """
+        Build one batch recognition request
+        Returns (endpoint, headers, payload)
+        """
+        endpoint, headers, payload = self._model_request(model, "", "")
+        payload["messages"][0]["content"] = build_batch_content(
+            prompt_template.format(count=len(batch)),
+            [item.image_url for item in batch]
+        )
+        payload["max_tokens"] = self.batch_sizer.max_tokens(len(batch))
+        return endpoint, headers, payload
+
+    def _handle_batch_response(self, response, circuit, count):
+        """
+        Record the outcome of a batch call and split its answer per image
+        Returns (answers by batch index, truncated), or None if the call failed or answered nothing
+        """
+        self._record_model_outcome(response, circuit)
+        if response.status_code != 200:
+            print(f"Batch request failed, status code: {response.status_code}")
+            return None
+        try:
+            choice = response.json()["choices"][0]
+            content = choice["message"]["content"].strip()
+        except Exception as e:
+            print(f"Error processing batch response: {str(e)}")
+            return None
+        print(f"Original batch recognition result: '{content}'")
+        
+        answers = {index: parse_food_names(",".join(foods)) for index, foods in parse_batch_answer(content, count).items()}
+        if not answers:
+            return None
+        return answers, choice.get("finish_reason") == "length"
+
+    def _apply_batch_outcome(self, batch, outcome, results, language):
+        """
+        Store the answers of one batch and adapt the batch size
+        Returns the items the batch failed to answer, to be retried one by one
+        """
+        answers, truncated = outcome if outcome is not None else ({}, False)
+        self.batch_sizer.record(len(batch), len(answers), truncated)
+        
+        retry = []
+        for index, item in enumerate(batch):
+            food_items = answers.get(index)
+            if food_items is None:
+                retry.append(item)
+                continue
+            result = self._finish_recognition(food_items, language, item.cache_key, item.cache_scope, item.image_phash)
+            if result is None:
+                # The model saw no food: guess from colors like a single recognition would
+                result = self._identify_offline(item.ingested, language)
+            for position in item.positions:
+                results[position] = result
+        if retry:
+            print(f"Batch left {len(retry)} of {len(batch)} images unanswered, retrying them one by one")
+        return retry
+
+    def analyze_image_colors(self, image):
+        """
+        Analyze image color recognition for possible food
+        Accepts a PIL image in any mode, an IngestedImage or a path to an image file
+        """
+        try:
+            if isinstance(image, IngestedImage):
+                img = image.image
+            elif isinstance(image, Image.Image):
+                img = image
+            else:
+                img = Image.open(image)
+            
+            # Based on color features infer food
+            return self.color_engine.infer_foods(img)
         except Exception as color_error:
             print(f"Error with color analysis: {str(color_error)}")
         
         return []
 
-    def translate_food_names(self, food_names):
-        """Translate food names to current interface language"""
-        food_mapping = {
-            # English food names and their Chinese translations
-            "pizza": "披萨",
-            "hamburger": "汉堡",
-            "burger": "汉堡",
-            "cheeseburger": "芝士汉堡",
-            "sandwich": "三明治",
-            "salad": "沙拉",
-            "fried chicken": "炸鸡",
-            "chicken": "鸡肉",
-            "french fries": "薯条",
-            "fries": "薯条",
-            "potato": "土豆",
-            "rice": "米饭",
-            "bread": "面包",
-            "cake": "蛋糕",
-            "donut": "甜甜圈",
-            "cookie": "饼干",
-            "ice cream": "冰淇淋",
-            "coffee": "咖啡",
-            "tea": "茶",
-            "soda": "汽水",
-            "juice": "果汁",
-            "water": "水",
-            "cola": "可乐",
-            "beef": "牛肉",
-            "steak": "牛排",
-            "pork": "猪肉",
-            "fish": "鱼",
-            "sushi": "寿司",
-            "pasta": "意大利面",
-            "noodles": "面条",
-            
-            # Chinese food names and their English translations
-            "披萨": "pizza",
-            "比萨": "pizza",
-            "汉堡": "hamburger",
-            "芝士汉堡": "cheeseburger",
-            "奶酪汉堡": "cheeseburger",
-            "三明治": "sandwich",
-            "沙拉": "salad",
-            "炸鸡": "fried chicken",
-            "鸡肉": "chicken",
-            "薯条": "french fries",
-            "土豆": "potato",
-            "米饭": "rice",
-            "面包": "bread",
-            "蛋糕": "cake",
-            "甜甜圈": "donut",
-            "饼干": "cookie",
-            "冰淇淋": "ice cream",
-            "咖啡": "coffee",
-            "茶": "tea",
-            "汽水": "soda",
-            "果汁": "juice",
-            "水": "water",
-            "可乐": "cola",
-            "牛肉": "beef",
-            "牛排": "steak",
-            "猪肉": "pork",
-            "鱼": "fish",
-            "寿司": "sushi",
-            "意大利面": "pasta",
-            "面条": "noodles"
-        }
-        
+    def translate_food_names(self, food_names, language="en"):
+        """Translate food names to the given language ("en" or "zh"), correcting misspellings first"""
         result = []
         for food in food_names:
-            food = food.lower().strip()
+            food = correct_food_name(food.lower().strip())
             
             # Check if translation is needed
-            if hasattr(st.session_state, 'language') and st.session_state.language == "zh":
+            if language == "zh":
                 # Current is Chinese interface, if it's English food name, translate to Chinese
-                if food in food_mapping and not any(c >= '\u4e00' and c <= '\u9fff' for c in food):
-                    result.append(food_mapping[food])
+                if food in FOOD_NAME_TRANSLATIONS and not any(c >= '\u4e00' and c <= '\u9fff' for c in food):
+                    result.append(FOOD_NAME_TRANSLATIONS[food])
                 else:
                     result.append(food)
             else:
                 # Current is English interface, if it's Chinese food name, translate to English
-                if food in food_mapping and any(c >= '\u4e00' and c <= '\u9fff' for c in food):
-                    result.append(food_mapping[food])
+                if food in FOOD_NAME_TRANSLATIONS and any(c >= '\u4e00' and c <= '\u9fff' for c in food):
+                    result.append(FOOD_NAME_TRANSLATIONS[food])
                 else:
                     result.append(food)
         
@@ -395,64 +809,157 @@ Be especially careful to identify these common foods:
     def get_online_food_calories(self, food_name):
         """
         Try to get food calories from online sources
+        USDA answers go through the nutrition cache; the Nutritionix estimate used when
+        USDA has no answer is made up locally and never cached.
+        Returns (calories_info, source) or (None, None) if not found
+        """
+        key = make_nutrition_key(food_name, USDA_DATA_TYPE)
+        # Concurrent lookups of the same food share one cache read and, on a miss, one fetch
+        try:
+            usda_data, source = self.single_flight.do(
+                ("nutrition", key), self.nutrition_cache.get_or_fetch, key, lambda: self._fetch_usda_entry(food_name)
+            )
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            # Not cached as a miss: the caller falls back to the local database right away
+            print(f"Online nutrition lookup skipped: {str(e)}")
+            return None, None
+        except Exception as e:
+            # Timeouts, connection errors and error statuses are not cached either
+            print(f"Error fetching data from USDA: {str(e)}")
+            usda_data, source = None, None
+        if usda_data:
+            return usda_data, source
+
+        return self._estimate_online(food_name)
+
+    def fetch_online_food_calories(self, food_name):
+        """
+        Query the online sources directly, bypassing the cache
         Returns (calories_info, source) or (None, None) if not found
         """
         # First try USDA - Real-time data
         usda_data = self.fetch_nutrition_data_from_usda(food_name)
         if usda_data:
-            return usda_data, "USDA Food Database (Real-time)"
-            
-        # Then try Nutritionix - Real-time data
+            return usda_data, USDA_SOURCE
+
+        return self._estimate_online(food_name)
+
+    def _estimate_online(self, food_name):
+        """Fall back to the Nutritionix-style estimate; returns (calories_info, source) or (None, None)"""
         nutritionix_data = self.fetch_nutrition_data_from_nutritionix(food_name)
         if nutritionix_data:
-            return nutritionix_data, "Nutritionix API (Real-time)"
+            return nutritionix_data, NUTRITIONIX_SOURCE
             
         # If all fails, return None
         return None, None
 
+    def _fetch_usda_entry(self, food_name):
+        """
+        Fetch the nutrition cache entry of a food: (calories_info, source), or (None, None) when USDA has no match
+        Raises on rate limits, open circuits and failed calls, so only real answers are cached
+        """
+        usda_data = self.query_usda(food_name)
+        return (usda_data, USDA_SOURCE) if usda_data else (None, None)
+
     def fetch_nutrition_data_from_usda(self, food_name):
         """
         Fetch nutrition data from USDA database
         Returns a dictionary with calories info or None if not found
+        Raises RateLimitExceeded when the USDA quota is used up and CircuitOpenError while USDA is failing
         """
         try:
-            # Use USDA FoodData Central API - Using demo key
-            api_key = "DEMO_KEY"  # In a real product, this should be replaced with your key
-            url = f"https://api.nal.usda.gov/fdc/v1/foods/search?api_key={api_key}&query={food_name}&pageSize=1&dataType=Survey%20%28FNDDS%29"
-            
-            print(f"Fetching nutrition data from USDA for: {food_name}")
-            response = requests.get(url, timeout=8)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("foods") and len(data["foods"]) > 0:
-                    food = data["foods"][0]
-                    
-                    # Extract nutrients
-                    nutrients = food.get("foodNutrients", [])
-                    calories = next((n["value"] for n in nutrients if n["nutrientName"] == "Energy" and n["unitName"] == "KCAL"), None)
-                    
-                    if calories:
-                        # Prepare the result
-                        result = {
-                            "calories": int(calories),
-                            "portion": f"{food.get('servingSize', 100)}{food.get('servingSizeUnit', 'g')}",
-                            "details": {
-                                "food_name": food.get("description", food_name),
-                                "brand": food.get("brandOwner", "Generic"),
-                                "nutrients": nutrients
-                            }
-                        }
-                        print(f"Successfully retrieved USDA data for {food_name}")
-                        return result
-            
-            print(f"No USDA data found for {food_name}")
-            return None
-            
+            return self.query_usda(food_name)
+        except (RateLimitExceeded, CircuitOpenError):
+            raise
         except Exception as e:
             print(f"Error fetching data from USDA: {str(e)}")
             return None
 
+    def query_usda(self, food_name):
+        """
+        Send one USDA lookup
+        Returns a dictionary with calories info or None if USDA has no match
+        Raises RateLimitExceeded, CircuitOpenError, USDAUnavailable or the request's own exception
+        """
+        url, params = self._usda_request(food_name)
+        circuit = self._admit_usda_call()
+        try:
+            response = get_session(USDA_HOST).get(url, params=params, timeout=8)
+        except Exception:
+            # Timeouts and connection errors
+            circuit.record_failure()
+            raise
+        return self._handle_usda_response(food_name, response, circuit)
+
+    def _usda_request(self, food_name):
+        """
+        Build one USDA FoodData Central search request
+        Returns (url, params)
+        """
+        # Use USDA FoodData Central API - Using demo key
+        api_key = "DEMO_KEY"  # In a real product, this should be replaced with your key
+        url = "https://api.nal.usda.gov/fdc/v1/foods/search"
+        params = {"api_key": api_key, "query": food_name, "pageSize": 1, "dataType": USDA_DATA_TYPE}
+        
+        print(f"Fetching nutrition data from USDA for: {food_name}")
+        return url, params
+
+    def _admit_usda_call(self):
+        """
+        Check the USDA circuit and quota before a lookup
+        Returns the USDA circuit breaker, which must then be given the call's outcome
+        Raises CircuitOpenError or RateLimitExceeded when the call should not be made
+        """
+        circuit = self.circuit_breakers.get(ENDPOINT_USDA)
+        circuit.before_call()
+        try:
+            self.rate_limiter.acquire(ENDPOINT_USDA)
+        except RateLimitExceeded:
+            circuit.release()
+            raise
+        return circuit
+
+    def _handle_usda_response(self, food_name, response, circuit):
+        """
+        Record the outcome of a USDA lookup and parse its first match
+        Works with requests and httpx responses alike
+        Returns a dictionary with calories info or None if not found
+        Raises USDAUnavailable for error statuses
+        """
+        if response.status_code >= 500:
+            circuit.record_failure()
+        else:
+            circuit.record_success()
+        if response.status_code == 429:
+            self.rate_limiter.penalize(ENDPOINT_USDA, parse_retry_after(response.headers.get("Retry-After")))
+        if response.status_code != 200:
+            raise USDAUnavailable(response.status_code)
+        
+        data = response.json()
+        if data.get("foods") and len(data["foods"]) > 0:
+            food = data["foods"][0]
+            
+            # Extract nutrients
+            nutrients = food.get("foodNutrients", [])
+            calories = next((n["value"] for n in nutrients if n["nutrientName"] == "Energy" and n["unitName"] == "KCAL"), None)
+            
+            if calories:
+                # Prepare the result
+                result = {
+                    "calories": int(calories),
+                    "portion": f"{food.get('servingSize', 100)}{food.get('servingSizeUnit', 'g')}",
+                    "details": {
+                        "food_name": food.get("description", food_name),
+                        "brand": food.get("brandOwner", "Generic"),
+                        "nutrients": nutrients
+                    }
+                }
+                print(f"Successfully retrieved USDA data for {food_name}")
+                return result
+        
+        print(f"No USDA data found for {food_name}")
+        return None
+
     def fetch_nutrition_data_from_nutritionix(self, food_name):
         """
         Fetch nutrition data from Nutritionix API
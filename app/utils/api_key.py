@@ -0,0 +1,30 @@
+"""
+API Key Loading
+Finds the HKBU GenAI Platform API key for the entry points that run without the web interface
+"""
+
+import os
+
+# Key file read when no key is passed or set in the environment
+API_KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config", "api_key.txt")
+
+
+def load_api_key(api_key=None, key_file=API_KEY_FILE):
+    """
+    Take the API key from the argument, FOOD_GENAI_API_KEY or config/api_key.txt
+
+    Parameters:
+        api_key (str): Key given explicitly, e.g. on the command line
+        key_file (str): File to read the key from as a last resort
+
+    Returns:
+        str: The API key, or None if none was found
+    """
+    if api_key:
+        return api_key
+    if os.environ.get("FOOD_GENAI_API_KEY"):
+        return os.environ["FOOD_GENAI_API_KEY"]
+    if os.path.exists(key_file):
+        with open(key_file, "r") as f:
+            return f.read().strip() or None
+    return None
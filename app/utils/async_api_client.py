@@ -0,0 +1,373 @@
+"""
+Async GenAI Client
+Asyncio-native variant of GenAIClient for running many recognitions from one event loop
+"""
+
+import asyncio
+import os
+
+import httpx
+
+from .api_client import GenAIClient, PROMPT_ZH, PROMPT_EN, USDA_DATA_TYPE, USDA_SOURCE
+from .batch_recognition import BATCH_PROMPT_ZH, BATCH_PROMPT_EN, BATCH_REQUEST_TIMEOUT
+from .circuit_breaker import CircuitOpenError
+from .http_session import DEFAULT_POOL_MAXSIZE, DEFAULT_MAX_RETRIES
+from .image_utils import IngestedImage
+from .nutrition_cache import make_nutrition_key
+from .rate_limit import (rate_limit_session, track_rate_limits, report_rate_limited, RateLimitExceeded,
+                         MODE_QUEUED, ENDPOINT_GENAI)
+from .recognition_cache import make_recognition_key
+from .request_context import DEFAULT_CONTEXT
+from .single_flight import AsyncSingleFlight
+
+# Most outbound requests one client keeps in flight at once
+ASYNC_MAX_CONCURRENCY = int(os.environ.get("FOOD_ASYNC_MAX_CONCURRENCY", 8))
+
+
+class AsyncGenAIClient(GenAIClient):
+    """
+    GenAIClient whose network calls are coroutines on an httpx.AsyncClient.
+    Shares the caches, rate limiter and circuit breakers of the synchronous client;
+    CPU-bound image work and the SQLite-backed caches and quotas run in worker threads
+    so the event loop stays free.
+
+    Use as "async with AsyncGenAIClient(api_key) as client:" or call aclose() when done.
+    """
+
+    def __init__(self, api_key, max_concurrency=ASYNC_MAX_CONCURRENCY, http_client=None, single_flight=None, **kwargs):
+        """
+        Initialize client with API key
+
+        Parameters:
+            api_key (str): HKBU GenAI Platform API key
+            max_concurrency (int): Most outbound requests in flight at once
+            http_client: httpx.AsyncClient to send requests with, defaults to a pooled client owned by this one
+            single_flight: AsyncSingleFlight coalescing identical concurrent calls, defaults to one per client
+            kwargs: Other GenAIClient parameters (models, dispatch_strategy, caches, rate_limiter, ...)
+        """
+        super().__init__(api_key, single_flight=single_flight if single_flight is not None else AsyncSingleFlight(),
+                         **kwargs)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._owns_http_client = http_client is None
+        if http_client is None:
+            # Connection errors are retried by the transport; 5xx answers go to the circuit breakers
+            http_client = httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(
+                retries=DEFAULT_MAX_RETRIES,
+                limits=httpx.Limits(max_connections=max(max_concurrency, DEFAULT_POOL_MAXSIZE))
+            ))
+        self.http_client = http_client
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["max_concurrency"] = self.max_concurrency
+        return state
+
+    def __setstate__(self, state):
+        # The unpickled client opens its own HTTP client in its new process
+        super().__setstate__(state)
+        self.max_concurrency = state["max_concurrency"]
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close the HTTP client if this client created it"""
+        if self._owns_http_client:
+            await self.http_client.aclose()
+
+    async def _admit(self, admit, *args):
+        """
+        Run an admission check; it may block in queued rate limit mode and reads the database
+        when the quota is shared through SQLite, so then it waits in a thread
+        """
+        if self.rate_limiter.mode == MODE_QUEUED or self.rate_limiter.db_path:
+            return await asyncio.to_thread(admit, *args)
+        return admit(*args)
+
+    async def _handle_response(self, handler, *args):
+        """
+        Run a response handler; on a 429 it penalizes the quota, which writes to the database
+        when the quota is shared through SQLite, so then it runs in a thread
+        """
+        if self.rate_limiter.db_path:
+            return await asyncio.to_thread(handler, *args)
+        return handler(*args)
+
+    async def _with_recognition_cache(self, function, *args):
+        """Run a function that uses the recognition cache, in a thread when the cache has a SQLite tier"""
+        if self.recognition_cache.disk is not None:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+
+    async def identify_food_in_image(self, image, context=None, *, deadline=None):
+        """
+        Identify food in an image using HKBU GenAI Platform
+
+        Parameters:
+            image: IngestedImage (decoded once at upload) or a path to an image file
+            context: RequestContext giving the result language and the session; defaults to English
+            deadline (float): Seconds the models may take before falling back to offline analysis
+
+        Returns:
+            A list of food names if multiple foods are detected, or a single food name
+        """
+        if isinstance(image, IngestedImage):
+            ingested = image
+        else:
+            ingested = await asyncio.to_thread(IngestedImage.from_path, image)
+        if ingested is None:
+            print("Failed to encode image")
+            return None
+
+        context = context if context is not None else DEFAULT_CONTEXT
+        with rate_limit_session(context.session_id):
+            return await self._identify_async(ingested, context.language, deadline)
+
+    async def _identify_async(self, ingested, language, deadline):
+        """Recognize one ingested image: caches, then the models, then offline analysis"""
+        # Choose prompt based on the requested language
+        prompt = PROMPT_ZH if language == "zh" else PROMPT_EN
+
+        # Identical images are answered from the recognition cache without any network call
+        cache_key = make_recognition_key(ingested.content_hash, language, self.models)
+        cached_result = await self._with_recognition_cache(self.recognition_cache.get, cache_key)
+        if cached_result is not None:
+            print(f"Recognition cache hit: {cached_result}")
+            return cached_result
+
+        # While the GenAI endpoint is failing, don't wait on timeouts: analyze the image locally
+        if self.circuit_breakers.get(ENDPOINT_GENAI).is_open():
+            print("GenAI circuit open, using offline image analysis")
+            return await asyncio.to_thread(self._identify_offline, ingested, language, False)
+
+        # Identical images recognized concurrently share one model call;
+        # quota refusals only matter to the caller if no model answers
+        with track_rate_limits() as limited:
+            try:
+                result = await asyncio.wait_for(self.single_flight.do(
+                    ("recognition", cache_key), self._recognize_with_models_async, ingested, language, prompt, cache_key
+                ), deadline)
+            except asyncio.TimeoutError:
+                print(f"Recognition deadline of {deadline}s exceeded, using offline image analysis")
+                result = None
+        if result is not None:
+            return result
+
+        if ENDPOINT_GENAI in limited:
+            print("GenAI quota used up, using offline image analysis")
+            report_rate_limited(ENDPOINT_GENAI)
+        return await asyncio.to_thread(self._identify_offline, ingested, language)
+
+    async def _recognize_with_models_async(self, ingested, language, prompt, cache_key):
+        """
+        Recognize an image that missed the exact cache: near-duplicate lookup, then the models
+        Returns the recognition result, or None if no model found any food
+        """
+        image_url, cache_scope, image_phash, similar_result = await asyncio.to_thread(
+            self._prepare_recognition, ingested, language
+        )
+        if similar_result is not None:
+            return similar_result
+
+        # Call the models using the configured dispatch strategy
+        food_items = await self.dispatcher.dispatch_async(
+            self.models,
+            lambda model: self._request_model_async(model, prompt, image_url)
+        )
+        return await self._with_recognition_cache(
+            self._finish_recognition, food_items, language, cache_key, cache_scope, image_phash
+        )
+
+    async def _request_model_async(self, model, prompt, image_url):
+        """
+        Send one recognition request to a model
+        Returns a list of food names, or None if the call failed or found nothing
+        """
+        endpoint, headers, payload = self._model_request(model, prompt, image_url)
+        circuit = await self._admit(self._admit_model_call, model)
+        if circuit is None:
+            return None
+
+        try:
+            print(f"Sending request to {model} model")
+            async with self._semaphore:
+                response = await self.http_client.post(endpoint, headers=headers, json=payload, timeout=30)
+        except asyncio.CancelledError:
+            # Lost a race or hit a deadline: says nothing about the endpoint
+            circuit.release()
+            raise
+        except Exception as e:
+            # Timeouts and connection errors
+            circuit.record_failure()
+            print(f"Request exception: {str(e)}")
+            return None
+
+        return await self._handle_response(self._handle_model_response, response, circuit)
+
+    async def identify_food_in_images(self, images, context=None, *, deadline=None):
+        """
+        Identify food in many images, packing several images into each model request.
+        Batches are sent concurrently; images they miss are retried one by one.
+
+        Parameters:
+            images (list): IngestedImages or paths to image files
+            context: RequestContext giving the result language and the session; defaults to English
+            deadline (float): Seconds each batch (and each retry) may take
+
+        Returns:
+            list: One result per image, in order, as identify_food_in_image returns them
+        """
+        context = context if context is not None else DEFAULT_CONTEXT
+        with rate_limit_session(context.session_id):
+            return await self._identify_batch_async(images, context.language, deadline)
+
+    async def _identify_batch_async(self, images, language, deadline):
+        """Recognize many images in concurrent batches, retrying the ones the batches miss one by one"""
+        results, pending = await asyncio.to_thread(self._plan_batches, images, language)
+        retry = []
+
+        # While the GenAI endpoint is failing, every image is retried (and analyzed offline) one by one
+        if pending and not self.circuit_breakers.get(ENDPOINT_GENAI).is_open():
+            prompt_template = BATCH_PROMPT_ZH if language == "zh" else BATCH_PROMPT_EN
+            batches = []
+            while pending:
+                batches.append(self.batch_sizer.take(pending))
+
+            async def recognize_batch(batch):
+                try:
+                    outcome = await asyncio.wait_for(self.batch_dispatcher.dispatch_async(
+                        self.models,
+                        lambda model: self._request_batch_async(model, prompt_template, batch)
+                    ), deadline)
+                except asyncio.TimeoutError:
+                    print(f"Batch recognition deadline of {deadline}s exceeded")
+                    outcome = None
+                return await asyncio.to_thread(self._apply_batch_outcome, batch, outcome, results, language)
+
+            for failed in await asyncio.gather(*(recognize_batch(batch) for batch in batches)):
+                retry.extend(failed)
+        else:
+            retry = pending
+
+        retried = await asyncio.gather(*(self._identify_async(item.ingested, language, deadline) for item in retry))
+        for item, result in zip(retry, retried):
+            for position in item.positions:
+                results[position] = result
+        return results
+
+    async def _request_batch_async(self, model, prompt_template, batch):
+        """
+        Send one batch recognition request to a model
+        Returns (answers by batch index, truncated), or None if the call failed or answered nothing
+        """
+        endpoint, headers, payload = self._batch_request(model, prompt_template, batch)
+        circuit = await self._admit(self._admit_model_call, model)
+        if circuit is None:
+            return None
+
+        try:
+            print(f"Sending batch of {len(batch)} images to {model} model")
+            async with self._semaphore:
+                response = await self.http_client.post(endpoint, headers=headers, json=payload,
+                                                       timeout=BATCH_REQUEST_TIMEOUT)
+        except asyncio.CancelledError:
+            circuit.release()
+            raise
+        except Exception as e:
+            # Timeouts and connection errors
+            circuit.record_failure()
+            print(f"Request exception: {str(e)}")
+            return None
+
+        return await self._handle_response(self._handle_batch_response, response, circuit, len(batch))
+
+    async def get_online_food_calories(self, food_name, deadline=None):
+        """
+        Try to get food calories from online sources
+        USDA answers go through the nutrition cache; the Nutritionix estimate is never cached.
+
+        Parameters:
+            food_name (str): Food name to look up
+            deadline (float): Seconds the online lookup may take
+
+        Returns:
+            tuple: (calories_info, source) or (None, None) if not found
+        """
+        key = make_nutrition_key(food_name, USDA_DATA_TYPE)
+        # Concurrent lookups of the same food share one cache read and, on a miss, one fetch
+        try:
+            usda_data, source = await asyncio.wait_for(self.single_flight.do(
+                ("nutrition", key), self.nutrition_cache.get_or_fetch_async, key,
+                lambda: self._fetch_usda_entry_async(food_name)
+            ), deadline)
+        except (RateLimitExceeded, CircuitOpenError) as e:
+            # Not cached as a miss: the caller falls back to the local database right away
+            print(f"Online nutrition lookup skipped: {str(e)}")
+            return None, None
+        except asyncio.TimeoutError:
+            print(f"Online nutrition lookup for {food_name} exceeded its deadline of {deadline}s")
+            return None, None
+        except Exception as e:
+            # Timeouts, connection errors and error statuses are not cached either
+            print(f"Error fetching data from USDA: {str(e)}")
+            usda_data, source = None, None
+        if usda_data:
+            return usda_data, source
+
+        return self._estimate_online(food_name)
+
+    async def fetch_online_food_calories(self, food_name):
+        """
+        Query the online sources directly, bypassing the cache
+        Returns (calories_info, source) or (None, None) if not found
+        """
+        # First try USDA - Real-time data
+        usda_data = await self.fetch_nutrition_data_from_usda(food_name)
+        if usda_data:
+            return usda_data, USDA_SOURCE
+
+        return self._estimate_online(food_name)
+
+    async def _fetch_usda_entry_async(self, food_name):
+        """Asyncio counterpart of _fetch_usda_entry"""
+        usda_data = await self.query_usda(food_name)
+        return (usda_data, USDA_SOURCE) if usda_data else (None, None)
+
+    async def fetch_nutrition_data_from_usda(self, food_name):
+        """
+        Fetch nutrition data from USDA database
+        Returns a dictionary with calories info or None if not found
+        Raises RateLimitExceeded when the USDA quota is used up and CircuitOpenError while USDA is failing
+        """
+        try:
+            return await self.query_usda(food_name)
+        except (RateLimitExceeded, CircuitOpenError):
+            raise
+        except Exception as e:
+            print(f"Error fetching data from USDA: {str(e)}")
+            return None
+
+    async def query_usda(self, food_name):
+        """
+        Send one USDA lookup
+        Returns a dictionary with calories info or None if USDA has no match
+        Raises RateLimitExceeded, CircuitOpenError, USDAUnavailable or the request's own exception
+        """
+        url, params = self._usda_request(food_name)
+        circuit = await self._admit(self._admit_usda_call)
+        try:
+            async with self._semaphore:
+                response = await self.http_client.get(url, params=params, timeout=8)
+        except asyncio.CancelledError:
+            circuit.release()
+            raise
+        except Exception:
+            # Timeouts and connection errors
+            circuit.record_failure()
+            raise
+        return await self._handle_response(self._handle_usda_response, food_name, response, circuit)
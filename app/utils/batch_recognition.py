@@ -0,0 +1,203 @@
+"""
+Batch Recognition
+Packs several images into one vision request and splits the indexed answer back per image
+"""
+
+import json
+import math
+import os
+import re
+import threading
+
+from .model_dispatch import ModelLatencyStats
+
+# Most images sent in one request, and the size batches start at
+BATCH_MAX_IMAGES = int(os.environ.get("FOOD_BATCH_MAX_IMAGES", 8))
+# Budget for the image tokens of one request
+BATCH_MAX_INPUT_TOKENS = int(os.environ.get("FOOD_BATCH_MAX_INPUT_TOKENS", 16000))
+# Answer tokens reserved per image, and the most answer tokens one request may ask for
+BATCH_ANSWER_TOKENS = int(os.environ.get("FOOD_BATCH_ANSWER_TOKENS", 40))
+BATCH_MAX_OUTPUT_TOKENS = int(os.environ.get("FOOD_BATCH_MAX_OUTPUT_TOKENS", 1024))
+# Batch requests carry many images; they need more time than a single recognition
+BATCH_REQUEST_TIMEOUT = float(os.environ.get("FOOD_BATCH_REQUEST_TIMEOUT", 90))
+
+BATCH_PROMPT_ZH = """下面有{count}张编号为1到{count}的图片。请分别识别每张图片中的具体食物。
+请只用JSON回答，键是图片编号，值是该图片中食物名称的列表，例如：
+{{"1": ["汉堡", "薯条"], "2": ["披萨"], "3": []}}
+不要使用"餐点"、"膳食"这样的通用词汇，没有食物的图片给出空列表，不需要任何解释。"""
+
+BATCH_PROMPT_EN = """There are {count} images below, numbered 1 to {count}. Identify the specific foods in each image.
+Answer with JSON only: keys are the image numbers, values are lists of the food names in that image, for example:
+{{"1": ["hamburger", "french fries"], "2": ["pizza"], "3": []}}
+DO NOT use generic terms like "meal" or "dish". Give an empty list for an image without food. No explanations."""
+
+# Latencies of batch calls are much longer than single ones, so they get their own hedge statistics
+_batch_latency_stats = ModelLatencyStats(default_delay=30.0, max_delay=120.0)
+
+
+def get_batch_latency_stats():
+    """Return the process-wide latency statistics of batch recognition calls"""
+    return _batch_latency_stats
+
+
+def estimate_image_tokens(width, height):
+    """
+    Estimate the prompt tokens a vision model charges for an image
+
+    Follows the tiling scheme of the GPT-4o models: the image is fit within
+    2048x2048, its short side scaled down to 768, then cut into 512px tiles.
+
+    Parameters:
+        width (int): Image width in pixels
+        height (int): Image height in pixels
+
+    Returns:
+        int: Estimated tokens
+    """
+    scale = min(1.0, 2048.0 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768.0 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def build_batch_content(prompt, image_urls):
+    """
+    Build the message content of a batch request: the prompt, then each image after its number
+
+    Parameters:
+        prompt (str): Batch prompt formatted with the image count
+        image_urls (list): Data URLs of the images, in numbering order
+
+    Returns:
+        list: Chat message content parts
+    """
+    content = [{"type": "text", "text": prompt}]
+    for number, image_url in enumerate(image_urls, 1):
+        content.append({"type": "text", "text": f"Image {number}:"})
+        content.append({"type": "image_url", "image_url": {"url": image_url}})
+    return content
+
+
+# "3": ["pizza", "salad"] entries, used to salvage answers from truncated or malformed JSON
+_ENTRY_PATTERN = re.compile(r'"?(\d+)"?\s*:\s*\[([^\]]*)\]')
+
+
+def parse_batch_answer(content, count):
+    """
+    Split an indexed batch answer back per image
+
+    Parameters:
+        content (str): Raw answer text from the model
+        count (int): Number of images in the batch
+
+    Returns:
+        dict: 0-based image index -> list of raw food names; images missing from the answer are absent
+    """
+    text = content.strip()
+    # The answer is an object, or sometimes an array, possibly wrapped in a code fence
+    start = min((position for position in (text.find("{"), text.find("[")) if position != -1), default=-1)
+    end = text.rfind("}" if text[start:start + 1] == "{" else "]")
+    entries = []
+    try:
+        data = json.loads(text[start:end + 1]) if start != -1 and end > start else None
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        entries = list(data.items())
+    elif isinstance(data, list):
+        entries = [(number, foods) for number, foods in enumerate(data, 1)]
+    else:
+        # Keep every complete entry of an answer cut off by the token limit
+        for number, items in _ENTRY_PATTERN.findall(text):
+            entries.append((number, re.findall(r'"([^"]*)"', items)))
+
+    answers = {}
+    for number, foods in entries:
+        try:
+            index = int(number) - 1
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= index < count:
+            continue
+        if isinstance(foods, str):
+            foods = [foods]
+        if isinstance(foods, list):
+            answers[index] = [str(food) for food in foods]
+    return answers
+
+
+class BatchItem:
+    """One distinct image waiting for batch recognition, with the input positions it answers"""
+
+    def __init__(self, ingested, cache_key, cache_scope, image_phash, image_url, tokens):
+        self.ingested = ingested
+        self.cache_key = cache_key
+        self.cache_scope = cache_scope
+        self.image_phash = image_phash
+        self.image_url = image_url
+        self.tokens = tokens
+        self.positions = []
+
+
+class BatchSizer:
+    """
+    Adaptive batch size: grows by one image after each fully answered batch and halves
+    after a failed, truncated or partially answered one, within the token budgets.
+    """
+
+    def __init__(self, max_images=BATCH_MAX_IMAGES, max_input_tokens=BATCH_MAX_INPUT_TOKENS,
+                 answer_tokens=BATCH_ANSWER_TOKENS, max_output_tokens=BATCH_MAX_OUTPUT_TOKENS):
+        """
+        Parameters:
+            max_images (int): Most images in one request
+            max_input_tokens (int): Budget for the image tokens of one request
+            answer_tokens (int): Answer tokens reserved per image
+            max_output_tokens (int): Most answer tokens one request may ask for
+        """
+        self.answer_tokens = answer_tokens
+        self.max_images = max(1, min(max_images, (max_output_tokens - answer_tokens) // answer_tokens))
+        self.max_input_tokens = max_input_tokens
+        self.size = self.max_images
+        self._lock = threading.Lock()
+
+    def max_tokens(self, count):
+        """Answer tokens to ask for a batch of count images"""
+        return self.answer_tokens * (count + 1)
+
+    def take(self, pending):
+        """
+        Remove the next batch from the front of the pending items
+
+        Parameters:
+            pending (list): BatchItems waiting for recognition
+
+        Returns:
+            list: The batch; always at least one item if any are pending
+        """
+        with self._lock:
+            size = self.size
+        batch = []
+        tokens = 0
+        while pending and len(batch) < size:
+            item = pending[0]
+            if batch and tokens + item.tokens > self.max_input_tokens:
+                break
+            batch.append(pending.pop(0))
+            tokens += item.tokens
+        return batch
+
+    def record(self, requested, answered, truncated=False):
+        """
+        Adapt the batch size to the outcome of a batch
+
+        Parameters:
+            requested (int): Images in the batch
+            answered (int): Images the answer covered
+            truncated (bool): Whether the answer hit the token limit
+        """
+        with self._lock:
+            if answered == requested and not truncated:
+                self.size = min(self.max_images, self.size + 1)
+            else:
+                self.size = max(1, min(self.size, requested) // 2)
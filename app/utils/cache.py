@@ -0,0 +1,227 @@
+"""
+Caching Utilities
+In-memory LRU and on-disk SQLite cache tiers shared by the API client caches
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Sentinel returned on cache misses so that None can be cached as a value
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with optional per-entry TTL"""
+
+    def __init__(self, maxsize=256, ttl=None, on_evict=None):
+        """
+        Parameters:
+            maxsize (int): Maximum number of entries kept in memory
+            ttl (float): Default time to live in seconds, or None to never expire
+            on_evict (callable): Called with the list of keys dropped for size or expiry
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        """Get a value, refreshing its recency; returns default on miss or expiry"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is None or expires_at >= time.time():
+                self._data.move_to_end(key)
+                return value
+            del self._data[key]
+        if self.on_evict is not None:
+            self.on_evict([key])
+        return default
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entries beyond maxsize"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False)[0])
+        if evicted and self.on_evict is not None:
+            self.on_evict(evicted)
+
+    def delete(self, key):
+        """Remove a value if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove all values"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    On-disk cache tier backed by SQLite, shared between processes on the same host.
+    Values are stored as JSON with a TTL; the least recently used entries are evicted
+    once the entry count or total payload size exceeds its limits.
+    """
+
+    def __init__(self, db_path, table="cache", ttl=7 * 24 * 3600, max_entries=100000, max_bytes=256 * 1024 * 1024,
+                 on_evict=None):
+        """
+        Parameters:
+            db_path (str): Path to the SQLite database file
+            table (str): Table name, so several caches can share one file
+            ttl (float): Default time to live in seconds, or None to never expire
+            max_entries (int): Maximum number of entries kept
+            max_bytes (int): Maximum total size of stored values in bytes
+            on_evict (callable): Called with the list of keys this process dropped for size or expiry
+        """
+        self.db_path = db_path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        # Writes between eviction passes: a pass counts the whole table, so it runs once per
+        # 0.1% of max_entries written, and the table overshoots its limits by at most that much
+        self._evict_interval = max(1, max_entries // 1000)
+        self._writes_since_evict = 0
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_idx ON {table} (accessed_at)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_idx ON {table} (expires_at)")
+        self._conn.commit()
+
+    def get(self, key, default=MISSING):
+        """Get a value; returns default on miss or expiry"""
+        return self.get_entry(key, default=(default, None))[0]
+
+    def get_entry(self, key, default=(MISSING, None)):
+        """
+        Get a value together with the time it was stored
+
+        Returns:
+            tuple: (value, created_at), or default on miss or expiry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+            value, created_at, expires_at = row
+            expired = expires_at is not None and expires_at < now
+            if expired:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            else:
+                self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        if expired:
+            if self.on_evict is not None:
+                self.on_evict([key])
+            return default
+        return json.loads(value), created_at
+
+    def set(self, key, value, ttl=None, created_at=None):
+        """Store a JSON-serializable value, periodically evicting entries beyond the size limits"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        created_at = now if created_at is None else created_at
+        expires_at = created_at + ttl if ttl is not None else None
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, payload, len(payload), created_at, now, expires_at)
+            )
+            self._writes_since_evict += 1
+            evicted = []
+            if self._writes_since_evict >= self._evict_interval:
+                self._writes_since_evict = 0
+                evicted = self._evict()
+            self._conn.commit()
+        if evicted and self.on_evict is not None:
+            self.on_evict(evicted)
+
+    def _evict(self):
+        """
+        Delete expired entries, then least recently used ones beyond the limits
+
+        Returns:
+            list: Deleted keys
+        """
+        now = time.time()
+        evicted = [row[0] for row in self._conn.execute(
+            f"SELECT key FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))]
+        if evicted:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        count, total_size = self._conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+        if count > self.max_entries:
+            keys = [row[0] for row in self._conn.execute(
+                f"SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?", (count - self.max_entries,))]
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in keys])
+            evicted.extend(keys)
+        if total_size > self.max_bytes:
+            rows = self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed_at ASC").fetchall()
+            for key, size in rows:
+                if total_size <= self.max_bytes:
+                    break
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                evicted.append(key)
+                total_size -= size
+        return evicted
+
+    def execute(self, sql, params=()):
+        """
+        Run a statement on the cache database, for auxiliary tables kept next to the cache
+
+        Returns:
+            list: Fetched rows
+        """
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.commit()
+        return rows
+
+    def delete(self, key):
+        """Remove a value if present"""
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        """Remove all values"""
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
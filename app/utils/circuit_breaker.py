@@ -0,0 +1,167 @@
+"""
+Circuit Breaker
+Per-endpoint circuit breakers that stop calling a remote service while it is failing
+"""
+
+import os
+import threading
+import time
+
+STATE_CLOSED = "closed"        # calls go through; consecutive failures are counted
+STATE_OPEN = "open"            # calls are refused until the recovery timeout passes
+STATE_HALF_OPEN = "half_open"  # a limited number of probe calls decide whether to close again
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("FOOD_CIRCUIT_FAILURE_THRESHOLD", 3))
+CIRCUIT_RECOVERY_TIMEOUT = float(os.environ.get("FOOD_CIRCUIT_RECOVERY_TIMEOUT", 30))
+CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.environ.get("FOOD_CIRCUIT_HALF_OPEN_MAX_CALLS", 1))
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because its endpoint's circuit is open"""
+
+    def __init__(self, name):
+        self.name = name
+        super().__init__(f"Circuit for {name} is open")
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker for one endpoint"""
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout=CIRCUIT_RECOVERY_TIMEOUT, half_open_max_calls=CIRCUIT_HALF_OPEN_MAX_CALLS):
+        """
+        Parameters:
+            name (str): Endpoint name
+            failure_threshold (int): Consecutive failures that open the circuit
+            recovery_timeout (float): Seconds the circuit stays open before probing
+            half_open_max_calls (int): Probe calls allowed at once while half-open
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _update_state(self):
+        """Move from open to half-open once the recovery timeout has passed (lock held)"""
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = STATE_HALF_OPEN
+            self._probes = 0
+
+    def _open(self):
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        print(f"Circuit for {self.name} opened after {self._failures} consecutive failures")
+
+    @property
+    def state(self):
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def is_open(self):
+        """Whether calls would be refused right now (a half-open circuit with a free probe slot is not)"""
+        with self._lock:
+            self._update_state()
+            if self._state == STATE_OPEN:
+                return True
+            return self._state == STATE_HALF_OPEN and self._probes >= self.half_open_max_calls
+
+    def allow_request(self):
+        """
+        Ask to make a call; every allowed call must be followed by record_success or record_failure
+
+        Returns:
+            bool: True if the call may go ahead
+        """
+        with self._lock:
+            self._update_state()
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def before_call(self):
+        """Like allow_request, but raises CircuitOpenError when the call is refused"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name)
+
+    def record_success(self):
+        """Record a successful call; a successful probe closes the circuit"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                print(f"Circuit for {self.name} closed")
+            self._state = STATE_CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        """Record a failed call; enough consecutive failures, or a failed probe, open the circuit"""
+        with self._lock:
+            self._failures += 1
+            if self._state == STATE_HALF_OPEN or (
+                    self._state == STATE_CLOSED and self._failures >= self.failure_threshold):
+                self._open()
+
+    def release(self):
+        """Give back an allowed call that ended without an outcome, e.g. because it was cancelled"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def stats(self):
+        """Return the state and counters"""
+        with self._lock:
+            self._update_state()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected
+            }
+
+
+class CircuitBreakerRegistry:
+    """Creates and holds one circuit breaker per endpoint"""
+
+    def __init__(self, **settings):
+        """
+        Parameters:
+            settings: Keyword arguments passed to every CircuitBreaker
+        """
+        self.settings = settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Return the breaker for an endpoint, creating it on first use"""
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, **self.settings)
+                self._breakers[name] = breaker
+            return breaker
+
+    def stats(self):
+        """Return the stats of every breaker by endpoint"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+_circuit_breakers = CircuitBreakerRegistry()
+
+
+def get_circuit_breakers():
+    """Return the process-wide circuit breaker registry"""
+    return _circuit_breakers
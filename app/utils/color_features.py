@@ -0,0 +1,88 @@
+"""
+Color Feature Engine
+Vectorized color-range analysis used to guess foods when the vision model is unavailable
+"""
+
+import numpy as np
+from PIL import Image
+
+# Default color classes: strict (low, high) bounds per RGB channel and the food each suggests
+DEFAULT_COLOR_RULES = [
+    {"name": "brown", "food": "hamburger", "r": (100, 200), "g": (50, 150), "b": (0, 100)},
+    {"name": "red", "food": "pizza", "r": (200, 255), "g": (0, 100), "b": (0, 100)},
+    {"name": "yellow", "food": "french fries", "r": (200, 255), "g": (150, 220), "b": (0, 100)},
+    {"name": "green", "food": "salad", "r": (0, 100), "g": (150, 255), "b": (0, 100)}
+]
+
+
+class ColorFeatureEngine:
+    """Matches the frequent colors of an image against all color rules in one NumPy pass"""
+
+    def __init__(self, rules=None, sample_size=50, min_count=50):
+        """
+        Parameters:
+            rules (list): Color rules with "name", "food" and "r"/"g"/"b" (low, high) bounds
+            sample_size (int): Images are downsampled to sample_size x sample_size pixels
+            min_count (int): A class suggests its food when one exact color inside it covers more pixels than this
+        """
+        self.rules = rules if rules is not None else DEFAULT_COLOR_RULES
+        self.sample_size = sample_size
+        self.min_count = min_count
+        # Bounds as (classes, channels) arrays so one comparison covers every rule
+        self._lows = np.array([[rule[c][0] for c in ("r", "g", "b")] for rule in self.rules], dtype=np.int16)
+        self._highs = np.array([[rule[c][1] for c in ("r", "g", "b")] for rule in self.rules], dtype=np.int16)
+
+    def to_pixels(self, image):
+        """Downsample an image of any mode to an (N, 3) RGB pixel array"""
+        if image.mode != "RGB":
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                # Composite transparent images on white so transparent areas aren't read as black
+                image = image.convert("RGBA")
+                background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+                image = Image.alpha_composite(background, image)
+            image = image.convert("RGB")
+        small = image.resize((self.sample_size, self.sample_size), Image.BICUBIC)
+        return np.asarray(small, dtype=np.int16).reshape(-1, 3)
+
+    def pixel_fractions(self, image):
+        """
+        Compute the fraction of pixels falling in each color class
+
+        Parameters:
+            image (PIL.Image): Image in any mode
+
+        Returns:
+            dict: Color class name -> fraction of pixels (0-1)
+        """
+        if not self.rules:
+            return {}
+        fractions = self._inside(self.to_pixels(image)).mean(axis=1)
+        return {rule["name"]: float(fraction) for rule, fraction in zip(self.rules, fractions)}
+
+    def frequent_colors(self, image):
+        """Return the exact colors covering more than min_count pixels of the downsampled image, as an (N, 3) array"""
+        pixels = self.to_pixels(image).astype(np.int32)
+        codes = (pixels[:, 0] << 16) | (pixels[:, 1] << 8) | pixels[:, 2]
+        colors, counts = np.unique(codes, return_counts=True)
+        frequent = colors[counts > self.min_count]
+        return np.stack([frequent >> 16, (frequent >> 8) & 0xFF, frequent & 0xFF], axis=1).astype(np.int16)
+
+    def infer_foods(self, image):
+        """Suggest foods for every color class that one of the image's frequent colors falls in"""
+        if not self.rules:
+            return []
+        matched = self._inside(self.frequent_colors(image)).any(axis=1)
+        return [rule["food"] for rule, found in zip(self.rules, matched) if found]
+
+    def _inside(self, pixels):
+        """(classes, pixels) booleans: whether each pixel lies strictly inside each class's bounds"""
+        inside = (pixels[None, :, :] > self._lows[:, None, :]) & (pixels[None, :, :] < self._highs[:, None, :])
+        return inside.all(axis=2)
+
+
+_color_engine = ColorFeatureEngine()
+
+
+def get_color_engine():
+    """Return the process-wide color feature engine"""
+    return _color_engine
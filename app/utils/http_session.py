@@ -0,0 +1,123 @@
+"""
+Shared HTTP Session Manager
+Provides process-wide pooled, keep-alive sessions for outbound API calls
+"""
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from .model_dispatch import dispatch_cancelled
+
+# Default connection pool settings (can be overridden with environment variables)
+DEFAULT_POOL_CONNECTIONS = int(os.environ.get("FOOD_HTTP_POOL_CONNECTIONS", 10))
+DEFAULT_POOL_MAXSIZE = int(os.environ.get("FOOD_HTTP_POOL_MAXSIZE", 20))
+DEFAULT_MAX_RETRIES = int(os.environ.get("FOOD_HTTP_MAX_RETRIES", 2))
+DEFAULT_BACKOFF_FACTOR = float(os.environ.get("FOOD_HTTP_BACKOFF_FACTOR", 0.3))
+
+# Status codes worth retrying on: transient gateway and server errors.
+# 429 is left to the rate limiter, which backs off without holding the request open.
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+# Methods whose error statuses are retried
+RETRY_METHODS = frozenset(["GET"])
+
+
+class CancellableRetry(Retry):
+    """Retry policy that stops retrying a model call once another model has won its race"""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if dispatch_cancelled():
+            raise MaxRetryError(_pool, url, error)
+        return super().increment(method, url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+
+
+class SessionManager:
+    """Holds one pooled requests.Session per host, shared by the whole process"""
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR):
+        """
+        Initialize the session manager
+
+        Parameters:
+            pool_connections (int): Number of host pools kept per session
+            pool_maxsize (int): Maximum number of kept-alive connections per host
+            max_retries (int): Maximum retries for connection errors, and for retryable statuses of GETs
+            backoff_factor (float): Exponential backoff factor between retries
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _build_session(self):
+        """Create a session whose adapters pool and retry connections"""
+        # Connection failures are retried for every method, as nothing was sent yet. Read timeouts
+        # are never retried, and status codes only for idempotent GETs: a slow or failing vision POST
+        # goes straight back to the circuit breakers and deadlines instead of being sent again
+        retry = CancellableRetry(
+            total=self.max_retries,
+            read=0,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=RETRY_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+            pool_block=False
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        # requests keeps connections alive by default; make it explicit for proxies
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+
+    def get_session(self, host="default"):
+        """
+        Get the pooled session for a host, creating it on first use
+
+        Parameters:
+            host (str): Host name the session is dedicated to
+
+        Returns:
+            requests.Session: Shared session for the host
+        """
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = self._build_session()
+                    self._sessions[host] = session
+        return session
+
+    def close(self):
+        """Close all pooled sessions"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+# Process-wide manager; module state survives Streamlit reruns and is shared by all users
+_session_manager = SessionManager()
+
+
+def get_session_manager():
+    """Return the process-wide session manager"""
+    return _session_manager
+
+
+def get_session(host="default"):
+    """Return the shared pooled session for a host"""
+    return _session_manager.get_session(host)
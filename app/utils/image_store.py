@@ -0,0 +1,245 @@
+"""
+Managed Image Store
+Bounded, self-cleaning storage for uploaded images with quotas and a background reaper
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Storage modes
+MODE_DISK = "disk"      # files under a directory (default: temp_images)
+MODE_SPOOL = "spool"    # files under a tmpfs-backed directory such as /dev/shm
+MODE_MEMORY = "memory"  # bytes kept in process memory only
+MODES = (MODE_DISK, MODE_SPOOL, MODE_MEMORY)
+
+MEMORY_PREFIX = "memory://"
+# Each store writes into its own "store-<pid>-<id>" subdirectory of the root
+STORE_DIR_PREFIX = "store-"
+
+IMAGE_STORE_MODE = os.environ.get("FOOD_IMAGE_STORE_MODE", MODE_DISK)
+IMAGE_STORE_DIR = os.environ.get("FOOD_IMAGE_STORE_DIR", "temp_images")
+IMAGE_STORE_MAX_BYTES = int(os.environ.get("FOOD_IMAGE_STORE_MAX_BYTES", 512 * 1024 * 1024))
+IMAGE_STORE_MAX_FILES = int(os.environ.get("FOOD_IMAGE_STORE_MAX_FILES", 2000))
+IMAGE_STORE_MAX_AGE = float(os.environ.get("FOOD_IMAGE_STORE_MAX_AGE", 24 * 3600))
+IMAGE_STORE_REAP_INTERVAL = float(os.environ.get("FOOD_IMAGE_STORE_REAP_INTERVAL", 300))
+
+
+def default_spool_dir():
+    """Directory for spool mode: tmpfs if available, otherwise the system temp directory"""
+    base_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base_dir, "food_calorie_images")
+
+
+class ImageStore:
+    """
+    Stores images up to a byte and file-count quota and expires them by age.
+    The oldest images are evicted first when a quota is exceeded; images held by a
+    session are never evicted. On disk, a store only manages the files in its own
+    subdirectory, and removes other stores' subdirectories only once they have not
+    been refreshed for max_age, i.e. their process has stopped.
+    """
+
+    def __init__(self, root=IMAGE_STORE_DIR, mode=MODE_DISK, max_bytes=IMAGE_STORE_MAX_BYTES,
+                 max_files=IMAGE_STORE_MAX_FILES, max_age=IMAGE_STORE_MAX_AGE):
+        """
+        Parameters:
+            root (str): Directory for disk mode (spool mode picks a tmpfs directory)
+            mode (str): "disk", "spool" or "memory"
+            max_bytes (int): Maximum total size of stored images
+            max_files (int): Maximum number of stored images
+            max_age (float): Seconds after which an image expires
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown image store mode: {mode}")
+        self.mode = mode
+        self.root = default_spool_dir() if mode == MODE_SPOOL else root
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_age = max_age
+        self.reap_interval = IMAGE_STORE_REAP_INTERVAL
+        # reference -> (size, created_at), oldest first
+        self._index = OrderedDict()
+        self._memory = {}
+        # reference -> number of sessions holding it
+        self._holds = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stop_event = threading.Event()
+
+        self.directory = None
+        if self.mode != MODE_MEMORY:
+            self.directory = os.path.join(self.root, f"{STORE_DIR_PREFIX}{os.getpid()}-{uuid.uuid4().hex[:8]}")
+            os.makedirs(self.directory, exist_ok=True)
+            self.cleanup()
+
+    def _remove_orphans(self):
+        """
+        Refresh this store's directory and remove the directories of stores that stopped
+
+        Returns:
+            int: Number of directories removed
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        os.utime(self.directory)
+        # A running store refreshes its directory at least every reap interval
+        cutoff = time.time() - max(self.max_age, 3 * self.reap_interval)
+        removed = 0
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if (entry.name.startswith(STORE_DIR_PREFIX) and entry.path != self.directory
+                        and entry.is_dir() and entry.stat().st_mtime < cutoff):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+        return removed
+
+    def put(self, image_bytes, extension=".jpg"):
+        """
+        Store image bytes
+
+        Returns:
+            str: Reference to the image (a file path, or a memory:// key in memory mode)
+        """
+        name = f"{uuid.uuid4()}{extension}"
+        if self.mode == MODE_MEMORY:
+            ref = f"{MEMORY_PREFIX}{name}"
+            with self._lock:
+                self._memory[ref] = image_bytes
+        else:
+            ref = os.path.join(self.directory, name)
+            with open(ref, "wb") as image_file:
+                image_file.write(image_bytes)
+
+        with self._lock:
+            self._index[ref] = (len(image_bytes), time.time())
+            self._total_bytes += len(image_bytes)
+        self._enforce_quota(keep=ref)
+        return ref
+
+    def get(self, ref):
+        """Get the bytes of a stored image, or None if it has been removed"""
+        if ref.startswith(MEMORY_PREFIX):
+            with self._lock:
+                return self._memory.get(ref)
+        try:
+            with open(ref, "rb") as image_file:
+                return image_file.read()
+        except OSError:
+            return None
+
+    def hold(self, ref):
+        """Protect an image from expiry and eviction until it is released, e.g. while a session shows it"""
+        with self._lock:
+            self._holds[ref] = self._holds.get(ref, 0) + 1
+
+    def release(self, ref):
+        """Release a hold taken with hold()"""
+        with self._lock:
+            count = self._holds.get(ref, 0) - 1
+            if count > 0:
+                self._holds[ref] = count
+            else:
+                self._holds.pop(ref, None)
+
+    def _evictable(self, predicate=None, keep=None):
+        """Return the oldest image that is not held or kept (and satisfies predicate), or None; call with the lock held"""
+        for ref, (size, created_at) in self._index.items():
+            if ref in self._holds or ref == keep:
+                continue
+            if predicate is not None and not predicate(created_at):
+                # The index is ordered by age, so no later image qualifies either
+                return None
+            return ref
+        return None
+
+    def delete(self, ref):
+        """Remove a stored image"""
+        with self._lock:
+            entry = self._index.pop(ref, None)
+            if entry is not None:
+                self._total_bytes -= entry[0]
+            self._memory.pop(ref, None)
+        if not ref.startswith(MEMORY_PREFIX):
+            try:
+                os.remove(ref)
+            except OSError:
+                pass
+
+    def _enforce_quota(self, keep=None):
+        """Evict the oldest images that are not held (or the kept one) until the store is within its quotas"""
+        while True:
+            with self._lock:
+                if self._total_bytes <= self.max_bytes and len(self._index) <= self.max_files:
+                    return
+                ref = self._evictable(keep=keep)
+            if ref is None:
+                return
+            self.delete(ref)
+
+    def cleanup(self):
+        """
+        Remove expired images and enforce the quotas
+
+        Returns:
+            int: Number of images removed
+        """
+        removed = len(self._index)
+        cutoff = time.time() - self.max_age
+        while True:
+            with self._lock:
+                ref = self._evictable(lambda created_at: created_at < cutoff)
+            if ref is None:
+                break
+            self.delete(ref)
+        self._enforce_quota()
+        if self.directory is not None:
+            self._remove_orphans()
+        return removed - len(self._index)
+
+    def start_reaper(self, interval=IMAGE_STORE_REAP_INTERVAL):
+        """Start a daemon thread that periodically cleans up the store"""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self.reap_interval = interval
+
+        def reap():
+            while not self._stop_event.wait(interval):
+                try:
+                    removed = self.cleanup()
+                    if removed:
+                        print(f"Image store reaper removed {removed} images")
+                except Exception as e:
+                    print(f"Error cleaning image store: {str(e)}")
+
+        self._stop_event.clear()
+        self._reaper = threading.Thread(target=reap, name="image-store-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        """Stop the background reaper thread"""
+        self._stop_event.set()
+
+    def stats(self):
+        """Return the number and total size of stored images"""
+        return {"mode": self.mode, "files": len(self._index), "bytes": self._total_bytes, "held": len(self._holds)}
+
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store():
+    """Return the process-wide image store, creating it and its reaper on first use"""
+    global _image_store
+    if _image_store is None:
+        with _image_store_lock:
+            if _image_store is None:
+                store = ImageStore(mode=IMAGE_STORE_MODE)
+                store.start_reaper()
+                _image_store = store
+    return _image_store
@@ -4,65 +4,259 @@ Used for processing uploaded image files
 """
 
 import os
-import uuid
-from pathlib import Path
-from datetime import datetime
-from PIL import Image
+import time
+import base64
+from PIL import Image, ImageOps
 import io
+import hashlib
 
-def save_uploaded_image(uploaded_file, save_dir="temp_images"):
+from .image_store import get_image_store, MEMORY_PREFIX
+
+def save_uploaded_image(uploaded_file, store=None):
     """
     Save the uploaded image file
     
     Parameters:
         uploaded_file: Streamlit uploaded file object
-        save_dir (str): Save directory
+        store: ImageStore to use, defaults to the process-wide managed store
         
     Returns:
         str: Path to the saved image file
     """
-    # Ensure save directory exists
-    os.makedirs(save_dir, exist_ok=True)
-    
-    # Generate unique filename
-    file_extension = os.path.splitext(uploaded_file.name)[1].lower()
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(save_dir, unique_filename)
-    
-    # Read the uploaded file
-    img_bytes = uploaded_file.getvalue()
-    
-    # Use PIL to open the image to validate it's a valid image file
-    try:
-        with Image.open(io.BytesIO(img_bytes)) as img:
-            # Save the image
-            img.save(file_path)
-        return file_path
-    except Exception as e:
-        print(f"Error saving image: {str(e)}")
+    ingested = IngestedImage.from_uploaded_file(uploaded_file)
+    if ingested is None:
+        print("Error saving image: not a valid image file")
         return None
+    return ingested.save(store)
 
-def is_valid_image(file):
+# Upload preprocessing defaults: the vision model only needs a small image to name foods
+UPLOAD_MAX_EDGE = int(os.environ.get("FOOD_UPLOAD_MAX_EDGE", 768))
+UPLOAD_FORMAT = os.environ.get("FOOD_UPLOAD_FORMAT", "JPEG").upper()
+UPLOAD_QUALITY = int(os.environ.get("FOOD_UPLOAD_QUALITY", 80))
+# Largest edge kept in memory for display and color analysis after ingest
+INGEST_MAX_EDGE = int(os.environ.get("FOOD_INGEST_MAX_EDGE", 1600))
+
+UPLOAD_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png"
+}
+
+VALID_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png']
+
+
+def decode_image(image_bytes, max_edge=None):
     """
-    Validate if the file is a valid image (JPG or PNG)
+    Decode image bytes into an upright RGB image
     
     Parameters:
-        file: Streamlit uploaded file object
+        image_bytes (bytes): Raw bytes of the image file
+        max_edge (int): If set, let the JPEG decoder scale down towards this edge while decoding
         
     Returns:
-        bool: Returns True if the file is a valid JPG or PNG image
+        tuple: (PIL image, original format, True if the pixels match the file as stored)
     """
-    if file is None:
-        return False
+    img = Image.open(io.BytesIO(image_bytes))
+    original_format = img.format
+    original_size = img.size
+    if max_edge and original_format == "JPEG":
+        img.draft("RGB", (max_edge, max_edge))
+    img.load()
+    
+    # Apply the EXIF orientation so the photo is upright
+    upright = img.getexif().get(0x0112, 1) == 1
+    img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img, original_format, upright and img.size == original_size
+
+
+def encode_image_for_upload(img, original_bytes=None, original_format=None, unchanged=False,
+                            max_edge=UPLOAD_MAX_EDGE, image_format=UPLOAD_FORMAT, quality=UPLOAD_QUALITY):
+    """
+    Downscale and re-encode an already decoded, upright image for the vision model
+    
+    Parameters:
+        img (PIL.Image): Decoded RGB image
+        original_bytes (bytes): Original file bytes, sent as-is when they are smaller
+        original_format (str): Format of the original file
+        unchanged (bool): True if img has the same pixels as original_bytes
+        max_edge (int): Maximum width or height of the uploaded image in pixels
+        image_format (str): Target format, "JPEG" or "WEBP"
+        quality (int): Target encoder quality (1-100)
         
-    # Check file extension
-    file_extension = os.path.splitext(file.name)[1].lower()
-    if file_extension not in ['.jpg', '.jpeg', '.png']:
-        return False
+    Returns:
+        dict: "base64" encoded image, "mime_type", the downscaled PIL "image" and
+              per-stage "stats" (byte sizes and timings in milliseconds)
+    """
+    stats = {"original_bytes": len(original_bytes) if original_bytes is not None else 0}
+    
+    start_time = time.perf_counter()
+    if max(img.size) > max_edge:
+        img = img.copy()
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        unchanged = False
+    stats["resize_ms"] = (time.perf_counter() - start_time) * 1000
+    stats["width"], stats["height"] = img.size
+    
+    # Re-encode at the target quality
+    start_time = time.perf_counter()
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, quality=quality, optimize=True)
+    encoded = buffer.getvalue()
+    mime_type = UPLOAD_MIME_TYPES.get(image_format, "image/jpeg")
+    
+    # Keep the original when it's already small, upright and smaller than the re-encoded copy
+    if (unchanged and original_bytes is not None and len(encoded) >= len(original_bytes)
+            and original_format in UPLOAD_MIME_TYPES):
+        encoded = original_bytes
+        mime_type = UPLOAD_MIME_TYPES[original_format]
+    stats["encode_ms"] = (time.perf_counter() - start_time) * 1000
+    
+    start_time = time.perf_counter()
+    base64_image = base64.b64encode(encoded).decode('utf-8')
+    stats["base64_ms"] = (time.perf_counter() - start_time) * 1000
+    
+    stats["encoded_bytes"] = len(encoded)
+    stats["bytes_saved"] = stats["original_bytes"] - stats["encoded_bytes"]
     
-    # Try to open the file with PIL to confirm it's a valid image
+    return {
+        "base64": base64_image,
+        "mime_type": mime_type,
+        "image": img,
+        "stats": stats
+    }
+
+
+def prepare_image_for_upload(image_bytes, max_edge=UPLOAD_MAX_EDGE, image_format=UPLOAD_FORMAT, quality=UPLOAD_QUALITY):
+    """
+    Decode, orient, downscale and re-encode an image for the vision model
+    
+    Parameters:
+        image_bytes (bytes): Raw bytes of the original image file
+        max_edge (int): Maximum width or height of the uploaded image in pixels
+        image_format (str): Target format, "JPEG" or "WEBP"
+        quality (int): Target encoder quality (1-100)
+        
+    Returns:
+        dict: "base64" encoded image, "mime_type", the downscaled PIL "image" and
+              per-stage "stats" (byte sizes and timings in milliseconds),
+              or None if the image could not be decoded
+    """
     try:
-        with Image.open(io.BytesIO(file.getvalue())):
-            return True
-    except:
-        return False 
\ No newline at end of file
+        start_time = time.perf_counter()
+        img, original_format, unchanged = decode_image(image_bytes, max_edge=max_edge)
+        decode_ms = (time.perf_counter() - start_time) * 1000
+        prepared = encode_image_for_upload(
+            img, image_bytes, original_format, unchanged,
+            max_edge=max_edge, image_format=image_format, quality=quality
+        )
+    except Exception as e:
+        print(f"Error preparing image for upload: {str(e)}")
+        return None
+    
+    prepared["stats"]["decode_ms"] = decode_ms
+    return prepared
+
+
+class IngestedImage:
+    """
+    An uploaded image decoded exactly once.
+    Keeps the original encoded bytes and the upright pixel buffer in memory and hands
+    them to display, recognition and color analysis without further disk reads or decodes.
+    """
+
+    def __init__(self, image_bytes, name="image.jpg", max_edge=INGEST_MAX_EDGE):
+        """
+        Validate and decode image bytes
+        
+        Parameters:
+            image_bytes (bytes): Raw bytes of the image file
+            name (str): Original file name
+            max_edge (int): Largest edge kept in the pixel buffer
+            
+        Raises:
+            ValueError: If the bytes can't be decoded as an image
+        """
+        self.raw_bytes = image_bytes
+        self.name = name
+        self.extension = os.path.splitext(name)[1].lower() or ".jpg"
+        self.path = None
+        self.max_edge = max_edge
+        try:
+            self.image, self.format, self._unchanged = decode_image(image_bytes, max_edge=max_edge)
+        except Exception as e:
+            raise ValueError(f"Invalid image: {str(e)}")
+        if max(self.image.size) > max_edge:
+            self.image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            self._unchanged = False
+        self._content_hash = None
+        self._uploads = {}
+
+    @classmethod
+    def from_uploaded_file(cls, uploaded_file):
+        """Ingest a Streamlit uploaded file; returns None if it isn't a valid JPG or PNG image"""
+        if uploaded_file is None:
+            return None
+        if os.path.splitext(uploaded_file.name)[1].lower() not in VALID_IMAGE_EXTENSIONS:
+            return None
+        try:
+            return cls(uploaded_file.getvalue(), uploaded_file.name)
+        except ValueError as e:
+            print(f"Error ingesting image: {str(e)}")
+            return None
+
+    @classmethod
+    def from_path(cls, image_path):
+        """Ingest an image file from disk; returns None if it isn't a valid image"""
+        try:
+            if image_path.startswith(MEMORY_PREFIX):
+                image_bytes = get_image_store().get(image_path)
+                if image_bytes is None:
+                    raise ValueError(f"Image no longer in store: {image_path}")
+            else:
+                with open(image_path, "rb") as image_file:
+                    image_bytes = image_file.read()
+            ingested = cls(image_bytes, os.path.basename(image_path))
+        except (OSError, ValueError) as e:
+            print(f"Error ingesting image: {str(e)}")
+            return None
+        ingested.path = image_path
+        return ingested
+
+    @property
+    def content_hash(self):
+        """SHA-256 hex digest of the original bytes"""
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.raw_bytes).hexdigest()
+        return self._content_hash
+
+    def prepare_upload(self, max_edge=UPLOAD_MAX_EDGE, image_format=UPLOAD_FORMAT, quality=UPLOAD_QUALITY):
+        """Get the downscaled upload payload (see encode_image_for_upload), computed once per setting"""
+        settings = (max_edge, image_format, quality)
+        if settings not in self._uploads:
+            self._uploads[settings] = encode_image_for_upload(
+                self.image, self.raw_bytes, self.format, self._unchanged,
+                max_edge=max_edge, image_format=image_format, quality=quality
+            )
+        return self._uploads[settings]
+
+    def save(self, store=None):
+        """
+        Store the original bytes without re-encoding
+        
+        Parameters:
+            store: ImageStore to use, defaults to the process-wide managed store
+            
+        Returns:
+            str: Reference to the saved image (a path, or a memory:// key), or None on failure
+        """
+        if self.path:
+            return self.path
+        store = store if store is not None else get_image_store()
+        try:
+            self.path = store.put(self.raw_bytes, self.extension)
+        except OSError as e:
+            print(f"Error saving image: {str(e)}")
+            return None
+        return self.path
@@ -0,0 +1,307 @@
+"""
+Model Dispatch Strategies
+Decides how recognition requests are spread over the available vision models
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Supported strategies
+STRATEGY_SEQUENTIAL = "sequential"  # try models one after another (original behaviour)
+STRATEGY_HEDGED = "hedged"          # start the next model if the current one is slower than its p95
+STRATEGY_RACE = "race"              # call all models at once, first valid answer wins
+STRATEGIES = (STRATEGY_SEQUENTIAL, STRATEGY_HEDGED, STRATEGY_RACE)
+
+DEFAULT_STRATEGY = os.environ.get("FOOD_MODEL_DISPATCH", STRATEGY_SEQUENTIAL)
+
+_dispatch_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="model-dispatch")
+
+# Event shared by the calls of one concurrent dispatch, set once the dispatch has its answer
+_cancel_event = contextvars.ContextVar("dispatch_cancel_event", default=None)
+
+
+def dispatch_cancelled():
+    """Whether the model call running in this context has lost its race and should neither send nor retry"""
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+class ModelLatencyStats:
+    """Rolling per-model latency statistics used to derive the hedge delay"""
+
+    def __init__(self, window=200, min_samples=5, default_delay=8.0, min_delay=0.5, max_delay=30.0):
+        """
+        Parameters:
+            window (int): Number of recent successful calls kept per model
+            min_samples (int): Samples required before the p95 is trusted
+            default_delay (float): Hedge delay in seconds used until enough samples exist
+            min_delay (float): Lower bound for the hedge delay
+            max_delay (float): Upper bound for the hedge delay
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._latencies = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds, success):
+        """Record one call; only successful calls feed the latency window"""
+        with self._lock:
+            counts = self._counts.setdefault(model, {"success": 0, "failure": 0})
+            counts["success" if success else "failure"] += 1
+            if success:
+                self._latencies.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model, q):
+        """
+        Get a latency percentile for a model
+
+        Parameters:
+            model (str): Model name
+            q (float): Percentile between 0 and 100
+
+        Returns:
+            float: Latency in seconds, or None if there are no samples
+        """
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def hedge_delay(self, model):
+        """Delay before hedging a call to this model, based on its p95 latency"""
+        with self._lock:
+            sample_count = len(self._latencies.get(model, ()))
+        if sample_count < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, min(self.max_delay, self.percentile(model, 95)))
+
+    def snapshot(self):
+        """Return per-model call counts and latency percentiles"""
+        with self._lock:
+            counts = {model: dict(model_counts) for model, model_counts in self._counts.items()}
+        return {
+            model: {
+                **model_counts,
+                "p50": self.percentile(model, 50),
+                "p95": self.percentile(model, 95)
+            }
+            for model, model_counts in counts.items()
+        }
+
+
+# Shared by all clients so the hedge delay learns from every request in the process
+_latency_stats = ModelLatencyStats()
+
+
+def get_latency_stats():
+    """Return the process-wide model latency statistics"""
+    return _latency_stats
+
+
+class ModelDispatcher:
+    """Runs a model call function over several models using a dispatch strategy"""
+
+    def __init__(self, strategy=DEFAULT_STRATEGY, stats=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown dispatch strategy: {strategy}")
+        self.strategy = strategy
+        self.stats = stats if stats is not None else _latency_stats
+
+    def _timed_call(self, call_fn, model):
+        """Call one model and record its latency"""
+        start_time = time.time()
+        result = None
+        try:
+            result = call_fn(model)
+            return result
+        finally:
+            # A loser that gave up because another model won says nothing about its own model
+            if result or not dispatch_cancelled():
+                self.stats.record(model, time.time() - start_time, bool(result))
+
+    def dispatch(self, models, call_fn):
+        """
+        Get the first valid answer from the given models
+
+        Parameters:
+            models (list): Model names in order of preference
+            call_fn (callable): Function taking a model name, returning a result or None on failure
+
+        Returns:
+            The first truthy result, or None if every model failed
+        """
+        if not models:
+            return None
+        if self.strategy == STRATEGY_SEQUENTIAL:
+            return self._dispatch_sequential(models, call_fn)
+        if self.strategy == STRATEGY_RACE:
+            return self._dispatch_concurrent(models, call_fn, hedge=False)
+        return self._dispatch_concurrent(models, call_fn, hedge=True)
+
+    def _dispatch_sequential(self, models, call_fn):
+        """Try models one after another"""
+        for model in models:
+            try:
+                result = self._timed_call(call_fn, model)
+            except Exception as e:
+                print(f"Model {model} call failed: {str(e)}")
+                continue
+            if result:
+                return result
+        return None
+
+    def _dispatch_concurrent(self, models, call_fn, hedge):
+        """
+        Run models concurrently. With hedge=True the next model is only started when the
+        running ones fail or take longer than the p95-based hedge delay; otherwise all
+        models are started at once. The first valid result wins and the remaining calls
+        are cancelled: pending ones never start, and in-flight ones see dispatch_cancelled()
+        so they send nothing (and retry nothing) once the answer is in.
+        """
+        pending_models = list(models)
+        in_flight = {}
+        cancel_event = threading.Event()
+
+        def launch_next():
+            model = pending_models.pop(0)
+            # Run in a copy of the caller's context so per-session state (e.g. rate limit session) follows
+            context = contextvars.copy_context()
+            context.run(_cancel_event.set, cancel_event)
+            in_flight[_dispatch_executor.submit(context.run, self._timed_call, call_fn, model)] = model
+            return model
+
+        if hedge:
+            current_model = launch_next()
+        else:
+            while pending_models:
+                launch_next()
+
+        result = None
+        while in_flight:
+            timeout = self.stats.hedge_delay(current_model) if hedge and pending_models else None
+            done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Current call is slower than usual: hedge with the next model
+                current_model = launch_next()
+                print(f"Hedging recognition request with model {current_model}")
+                continue
+
+            for future in done:
+                model = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Model {model} call failed: {str(e)}")
+                    result = None
+                if result:
+                    break
+
+            if result:
+                break
+
+            # Every finished call failed: start the next model right away
+            if hedge and pending_models:
+                current_model = launch_next()
+
+        cancel_event.set()
+        for future in in_flight:
+            future.cancel()
+        return result
+
+    async def dispatch_async(self, models, call_fn):
+        """
+        Asyncio counterpart of dispatch: call_fn is a coroutine function taking a model name.
+        Losing calls are cancelled rather than abandoned.
+
+        Returns:
+            The first truthy result, or None if every model failed
+        """
+        if not models:
+            return None
+        if self.strategy == STRATEGY_SEQUENTIAL:
+            for model in models:
+                try:
+                    result = await self._timed_call_async(call_fn, model)
+                except Exception as e:
+                    print(f"Model {model} call failed: {str(e)}")
+                    continue
+                if result:
+                    return result
+            return None
+        return await self._dispatch_concurrent_async(models, call_fn, hedge=self.strategy == STRATEGY_HEDGED)
+
+    async def _timed_call_async(self, call_fn, model):
+        """Await one model call and record its latency"""
+        start_time = time.time()
+        try:
+            result = await call_fn(model)
+        except asyncio.CancelledError:
+            # A loser cancelled because another model won (or the caller gave up) says nothing about its own model
+            raise
+        except Exception:
+            self.stats.record(model, time.time() - start_time, False)
+            raise
+        self.stats.record(model, time.time() - start_time, bool(result))
+        return result
+
+    async def _dispatch_concurrent_async(self, models, call_fn, hedge):
+        """Asyncio counterpart of _dispatch_concurrent, run as tasks on the current event loop"""
+        pending_models = list(models)
+        in_flight = {}
+
+        def launch_next():
+            model = pending_models.pop(0)
+            in_flight[asyncio.ensure_future(self._timed_call_async(call_fn, model))] = model
+            return model
+
+        if hedge:
+            current_model = launch_next()
+        else:
+            while pending_models:
+                launch_next()
+
+        result = None
+        try:
+            while in_flight:
+                timeout = self.stats.hedge_delay(current_model) if hedge and pending_models else None
+                done, _ = await asyncio.wait(list(in_flight), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Current call is slower than usual: hedge with the next model
+                    current_model = launch_next()
+                    print(f"Hedging recognition request with model {current_model}")
+                    continue
+
+                for task in done:
+                    model = in_flight.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"Model {model} call failed: {str(e)}")
+                        result = None
+                    if result:
+                        break
+
+                if result:
+                    break
+
+                # Every finished call failed: start the next model right away
+                if hedge and pending_models:
+                    current_model = launch_next()
+        finally:
+            # Also reached when the caller is cancelled or its deadline expires
+            for task in in_flight:
+                task.cancel()
+        return result
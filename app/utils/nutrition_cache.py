@@ -0,0 +1,244 @@
+"""
+Nutrition Lookup Cache
+Read-through cache of online nutrition lookups with negative caching and stale-while-revalidate
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import LRUCache, SQLiteCache, MISSING
+
+# Optional on-disk tier shared by all processes on the host, enabled by pointing this at a SQLite file
+NUTRITION_CACHE_DB = os.environ.get("FOOD_NUTRITION_CACHE_DB")
+NUTRITION_CACHE_SIZE = int(os.environ.get("FOOD_NUTRITION_CACHE_SIZE", 2048))
+# Results younger than this are served as is
+NUTRITION_CACHE_TTL = float(os.environ.get("FOOD_NUTRITION_CACHE_TTL", 7 * 24 * 3600))
+# Older results are still served up to this age while a background refresh runs
+NUTRITION_CACHE_STALE_TTL = float(os.environ.get("FOOD_NUTRITION_CACHE_STALE_TTL", 30 * 24 * 3600))
+# Foods no source knew about are remembered this long
+NUTRITION_CACHE_NEGATIVE_TTL = float(os.environ.get("FOOD_NUTRITION_CACHE_NEGATIVE_TTL", 3600))
+NUTRITION_CACHE_MAX_ENTRIES = int(os.environ.get("FOOD_NUTRITION_CACHE_MAX_ENTRIES", 100000))
+
+# Background refreshes of stale entries
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="nutrition-refresh")
+
+
+def make_nutrition_key(food_name, data_type):
+    """
+    Build the cache key for a nutrition lookup
+
+    Parameters:
+        food_name (str): Food name as asked for
+        data_type (str): Data set queried, e.g. the USDA data type
+
+    Returns:
+        str: Key on the normalized food name and data type
+    """
+    return f"{data_type}:{' '.join(food_name.lower().split())}"
+
+
+class NutritionCache:
+    """
+    Two-tier read-through cache: in-memory LRU in front of an optional shared SQLite file.
+    Entries past their TTL are served stale and refreshed in the background; misses
+    are cached for a shorter negative TTL.
+    """
+
+    def __init__(self, memory_size=NUTRITION_CACHE_SIZE, db_path=None, ttl=NUTRITION_CACHE_TTL,
+                 stale_ttl=NUTRITION_CACHE_STALE_TTL, negative_ttl=NUTRITION_CACHE_NEGATIVE_TTL,
+                 max_entries=NUTRITION_CACHE_MAX_ENTRIES, executor=None):
+        """
+        Parameters:
+            memory_size (int): Maximum number of lookups kept in memory
+            db_path (str): SQLite file for the on-disk tier, or None for memory only
+            ttl (float): Age in seconds after which a result is refreshed
+            stale_ttl (float): Age in seconds after which a result is no longer served
+            negative_ttl (float): Time in seconds a miss is remembered
+            max_entries (int): Maximum number of lookups kept on disk
+            executor: Executor for background refreshes, defaults to a shared two-thread pool
+        """
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.negative_ttl = negative_ttl
+        self.memory = LRUCache(maxsize=memory_size, ttl=self.stale_ttl)
+        self.disk = SQLiteCache(db_path, table="nutrition", ttl=self.stale_ttl, max_entries=max_entries) if db_path else None
+        self.executor = executor if executor is not None else _refresh_executor
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._refreshing = set()
+        self._refresh_tasks = set()
+        self._refresh_lock = threading.Lock()
+
+    def _lookup(self, key):
+        """Look a key up in the memory tier, then the disk tier"""
+        entry = self.memory.get(key)
+        if entry is MISSING and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not MISSING:
+                # Promote disk hits into the memory tier, keeping their remaining lifetime
+                ttl = (self.negative_ttl if entry["info"] is None else self.stale_ttl) - (time.time() - entry["created_at"])
+                self.memory.set(key, entry, ttl=max(ttl, 0))
+        return entry
+
+    def set(self, key, info, source):
+        """
+        Store a lookup result
+
+        Parameters:
+            key (str): Key from make_nutrition_key
+            info (dict): Calorie information, or None to cache a miss
+            source (str): Data source label, or None for a miss
+        """
+        entry = {"info": info, "source": source, "created_at": time.time()}
+        ttl = self.negative_ttl if info is None else self.stale_ttl
+        self.memory.set(key, entry, ttl=ttl)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, entry, ttl=ttl)
+            except Exception as e:
+                print(f"Error writing nutrition cache: {str(e)}")
+
+    def _get_cached(self, key):
+        """
+        Look a key up and count the outcome
+
+        Returns:
+            tuple: ((calories_info, source), stale) on a hit, or (MISSING, False) on a miss
+        """
+        entry = self._lookup(key)
+        if entry is MISSING:
+            self.misses += 1
+            return MISSING, False
+        if entry["info"] is None:
+            self.negative_hits += 1
+            return (None, None), False
+        stale = time.time() - entry["created_at"] >= self.ttl
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return (entry["info"], entry["source"]), stale
+
+    def _start_refresh(self, key):
+        """Claim the refresh of a key; returns False if one is already running"""
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _refreshed(self, key, info, source):
+        """Store a refreshed result, keeping the stale one if the sources have nothing right now"""
+        if info is not None:
+            self.set(key, info, source)
+            self.refreshes += 1
+
+    def _finish_refresh(self, key):
+        with self._refresh_lock:
+            self._refreshing.discard(key)
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Serve a lookup from the cache, calling fetch on a miss
+
+        Parameters:
+            key (str): Key from make_nutrition_key
+            fetch (callable): Returns (calories_info, source), or (None, None) if nothing was found
+
+        Returns:
+            tuple: (calories_info, source) or (None, None)
+        """
+        result, stale = self._get_cached(key)
+        if result is not MISSING:
+            if stale:
+                self._refresh_in_background(key, fetch)
+            return result
+
+        info, source = fetch()
+        self.set(key, info, source)
+        return info, source
+
+    async def get_or_fetch_async(self, key, fetch):
+        """
+        Asyncio counterpart of get_or_fetch
+
+        Parameters:
+            key (str): Key from make_nutrition_key
+            fetch (callable): Coroutine function returning (calories_info, source)
+
+        Returns:
+            tuple: (calories_info, source) or (None, None)
+        """
+        result, stale = await self._call_async(self._get_cached, key)
+        if result is not MISSING:
+            if stale and self._start_refresh(key):
+                task = asyncio.ensure_future(self._refresh_async(key, fetch))
+                # The loop only keeps weak references to tasks
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+            return result
+
+        info, source = await fetch()
+        await self._call_async(self.set, key, info, source)
+        return info, source
+
+    async def _call_async(self, function, *args):
+        """Call a method that may read or write the SQLite tier, in a thread when there is one"""
+        if self.disk is not None:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+
+    async def _refresh_async(self, key, fetch):
+        """Refetch a stale entry on the event loop"""
+        try:
+            await self._call_async(self._refreshed, key, *await fetch())
+        except Exception as e:
+            print(f"Error refreshing nutrition cache: {str(e)}")
+        finally:
+            self._finish_refresh(key)
+
+    def _refresh_in_background(self, key, fetch):
+        """Refetch a stale entry unless a refresh for it is already running"""
+        if not self._start_refresh(key):
+            return
+
+        def refresh():
+            try:
+                self._refreshed(key, *fetch())
+            except Exception as e:
+                print(f"Error refreshing nutrition cache: {str(e)}")
+            finally:
+                self._finish_refresh(key)
+
+        self.executor.submit(refresh)
+
+    def stats(self):
+        """Return hit, miss and refresh counters"""
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "memory_entries": len(self.memory)
+        }
+
+
+_nutrition_cache = None
+_nutrition_cache_lock = threading.Lock()
+
+
+def get_nutrition_cache():
+    """Return the process-wide nutrition cache, creating it on first use"""
+    global _nutrition_cache
+    if _nutrition_cache is None:
+        with _nutrition_cache_lock:
+            if _nutrition_cache is None:
+                _nutrition_cache = NutritionCache(db_path=NUTRITION_CACHE_DB)
+    return _nutrition_cache
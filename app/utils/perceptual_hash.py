@@ -0,0 +1,144 @@
+"""
+Perceptual Image Hashing
+Difference hashes and a BK-tree index for near-duplicate image lookup
+"""
+
+import threading
+from PIL import Image
+
+
+def dhash(image, hash_size=8):
+    """
+    Compute the difference hash (dHash) of an image
+
+    Parameters:
+        image (PIL.Image): Image to hash
+        hash_size (int): Hash side length; the hash has hash_size * hash_size bits
+
+    Returns:
+        int: Perceptual hash as an integer
+    """
+    # Grayscale and shrink to (hash_size + 1) x hash_size, then compare neighbouring pixels
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (1 if pixels[offset + col] < pixels[offset + col + 1] else 0)
+    return value
+
+
+def hamming_distance(hash_a, hash_b):
+    """Number of differing bits between two hashes"""
+    return bin(hash_a ^ hash_b).count("1")
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance.
+    Radius queries only visit children whose edge distance lies within the search
+    band, so lookups stay sublinear as the index grows. Removed items leave their
+    node behind to route searches; the tree is rebuilt once most nodes are empty.
+    """
+
+    def __init__(self):
+        # Each node is [hash, values, {distance: child_node}]
+        self._root = None
+        self._size = 0
+        self._nodes = 0
+        self._empty_nodes = 0
+        self._lock = threading.Lock()
+
+    def add(self, hash_value, item):
+        """Add an item under a hash; items sharing a hash are kept together, and re-adding an item is a no-op"""
+        with self._lock:
+            self._add(hash_value, item)
+
+    def _add(self, hash_value, item):
+        if self._root is None:
+            self._root = [hash_value, [item], {}]
+            self._nodes += 1
+            self._size += 1
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            if distance == 0:
+                if item not in node[1]:
+                    if not node[1]:
+                        self._empty_nodes -= 1
+                    node[1].append(item)
+                    self._size += 1
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [hash_value, [item], {}]
+                self._nodes += 1
+                self._size += 1
+                return
+            node = child
+
+    def remove(self, hash_value, item):
+        """
+        Remove an item stored under a hash
+
+        Returns:
+            bool: Whether the item was in the tree
+        """
+        with self._lock:
+            node = self._root
+            while node is not None:
+                distance = hamming_distance(hash_value, node[0])
+                if distance == 0:
+                    if item not in node[1]:
+                        return False
+                    node[1].remove(item)
+                    self._size -= 1
+                    if not node[1]:
+                        self._empty_nodes += 1
+                        if self._empty_nodes * 2 > self._nodes:
+                            self._rebuild()
+                    return True
+                node = node[2].get(distance)
+            return False
+
+    def _rebuild(self):
+        """Rebuild the tree from the nodes that still hold items"""
+        entries = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            entries.extend((node[0], item) for item in node[1])
+            stack.extend(node[2].values())
+        self._root = None
+        self._size = self._nodes = self._empty_nodes = 0
+        for hash_value, item in entries:
+            self._add(hash_value, item)
+
+    def search(self, hash_value, max_distance):
+        """
+        Find items whose hash is within max_distance of the given hash
+
+        Returns:
+            list: (distance, item) tuples sorted by distance, most recent item first on ties
+        """
+        results = []
+        with self._lock:
+            if self._root is None:
+                return results
+            stack = [self._root]
+            while stack:
+                node = stack.pop()
+                distance = hamming_distance(hash_value, node[0])
+                if distance <= max_distance:
+                    results.extend((distance, item) for item in reversed(node[1]))
+                low, high = distance - max_distance, distance + max_distance
+                for edge, child in node[2].items():
+                    if low <= edge <= high:
+                        stack.append(child)
+        results.sort(key=lambda result: result[0])
+        return results
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,370 @@
+"""
+Outbound Rate Limiting
+Per-endpoint token buckets with Retry-After handling and fair queuing across sessions
+"""
+
+import contextlib
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+
+# Endpoints limited by the API client
+ENDPOINT_GENAI = "genai"
+ENDPOINT_USDA = "usda"
+
+# Modes: fail immediately when no token is left, or wait in a fair queue up to a timeout
+MODE_FAIL_FAST = "fail_fast"
+MODE_QUEUED = "queued"
+
+RATE_LIMIT_MODE = os.environ.get("FOOD_RATE_LIMIT_MODE", MODE_QUEUED)
+RATE_LIMIT_QUEUE_TIMEOUT = float(os.environ.get("FOOD_RATE_LIMIT_QUEUE_TIMEOUT", 5))
+# Optional SQLite file holding the buckets, so all worker processes on the host share one quota
+RATE_LIMIT_DB = os.environ.get("FOOD_RATE_LIMIT_DB")
+
+# Sustained rate (requests per second) and burst size per endpoint;
+# the USDA DEMO_KEY allows 30 requests per hour
+ENDPOINT_LIMITS = {
+    ENDPOINT_USDA: (
+        float(os.environ.get("FOOD_USDA_RATE", 30 / 3600)),
+        float(os.environ.get("FOOD_USDA_BURST", 30))
+    )
+}
+# The model API publishes no quota, so it is only limited when FOOD_GENAI_RATE is set
+if os.environ.get("FOOD_GENAI_RATE"):
+    ENDPOINT_LIMITS[ENDPOINT_GENAI] = (
+        float(os.environ["FOOD_GENAI_RATE"]),
+        float(os.environ.get("FOOD_GENAI_BURST", 5))
+    )
+
+# Session the current call is made for, used to queue callers fairly
+_current_session = contextvars.ContextVar("rate_limit_session", default=None)
+# Endpoints whose quota refused a call, collected by track_rate_limits
+_rate_limited = contextvars.ContextVar("rate_limited", default=None)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would exceed an endpoint's quota"""
+
+    def __init__(self, endpoint, retry_in=None):
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+        message = f"Rate limit exceeded for {endpoint}"
+        if retry_in is not None:
+            message += f", retry in {retry_in:.1f}s"
+        super().__init__(message)
+
+
+def set_rate_limit_session(session_id):
+    """Mark calls made from the current context as belonging to a user session"""
+    _current_session.set(session_id)
+
+
+@contextlib.contextmanager
+def rate_limit_session(session_id):
+    """Attribute calls made inside the block to a user session; None keeps the current one"""
+    if session_id is None:
+        yield
+        return
+    token = _current_session.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+def current_rate_limit_session():
+    """Return the session of the current context, falling back to the current thread"""
+    session_id = _current_session.get()
+    return session_id if session_id is not None else threading.get_ident()
+
+
+@contextlib.contextmanager
+def track_rate_limits():
+    """
+    Collect the endpoints whose quota refuses a call made inside the block
+    The yielded set is shared with the threads and tasks started from the block
+    """
+    limited = set()
+    token = _rate_limited.set(limited)
+    try:
+        yield limited
+    finally:
+        _rate_limited.reset(token)
+
+
+def report_rate_limited(endpoint):
+    """Note in the current tracker, if any, that an endpoint's quota refused a call"""
+    limited = _rate_limited.get()
+    if limited is not None:
+        limited.add(endpoint)
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header
+
+    Parameters:
+        value (str): Delay in seconds or an HTTP date
+
+    Returns:
+        float: Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """In-process token bucket refilled continuously at a fixed rate"""
+
+    def __init__(self, rate, capacity):
+        """
+        Parameters:
+            rate (float): Tokens added per second
+            capacity (float): Maximum tokens, i.e. the allowed burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if available
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise seconds until they could be
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def penalize(self, seconds):
+        """Refuse all calls for the next seconds, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class SQLiteTokenBucket:
+    """Token bucket whose state lives in SQLite, shared by all processes using the same file"""
+
+    def __init__(self, db_path, name, rate, capacity):
+        """
+        Parameters:
+            db_path (str): SQLite file shared by the processes
+            name (str): Bucket name, e.g. the endpoint
+            rate (float): Tokens added per second
+            capacity (float): Maximum tokens
+        """
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, blocked_until REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO rate_limit_buckets (name, tokens, updated_at, blocked_until) VALUES (?, ?, ?, 0)",
+            (name, capacity, time.time())
+        )
+
+    def _transaction(self, update):
+        """Run update(tokens, updated_at, blocked_until, now) -> (new state, result) atomically"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated_at, blocked_until = self._conn.execute(
+                    "SELECT tokens, updated_at, blocked_until FROM rate_limit_buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                (tokens, updated_at, blocked_until), result = update(tokens, updated_at, blocked_until, time.time())
+                self._conn.execute(
+                    "UPDATE rate_limit_buckets SET tokens = ?, updated_at = ?, blocked_until = ? WHERE name = ?",
+                    (tokens, updated_at, blocked_until, self.name)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; returns 0 on success, otherwise seconds until they could be"""
+        def update(available, updated_at, blocked_until, now):
+            if now < blocked_until:
+                return (available, updated_at, blocked_until), blocked_until - now
+            available = min(self.capacity, available + max(now - updated_at, 0) * self.rate)
+            if available >= tokens:
+                return (available - tokens, now, blocked_until), 0.0
+            wait = (tokens - available) / self.rate if self.rate > 0 else float("inf")
+            return (available, now, blocked_until), wait
+
+        return self._transaction(update)
+
+    def penalize(self, seconds):
+        """Refuse all calls, in every process, for the next seconds"""
+        def update(available, updated_at, blocked_until, now):
+            return (0.0, now, max(blocked_until, now + seconds)), None
+
+        self._transaction(update)
+
+
+class FairQueue:
+    """
+    Grants an endpoint's tokens to waiting callers round-robin by session, so one
+    session submitting many calls cannot starve the others.
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self._sessions = OrderedDict()  # session -> deque of waiting tickets, in turn order
+        self._condition = threading.Condition()
+
+    def _is_next(self, session, ticket):
+        return bool(self._sessions) and next(iter(self._sessions)) == session and self._sessions[session][0] is ticket
+
+    def _remove(self, session, ticket, rotate):
+        tickets = self._sessions[session]
+        tickets.remove(ticket)
+        if not tickets:
+            del self._sessions[session]
+        elif rotate:
+            self._sessions.move_to_end(session)
+
+    def acquire(self, session, timeout):
+        """
+        Wait for a token in turn
+
+        Returns:
+            float: 0 once a token was taken, otherwise the last known wait when the timeout expired
+        """
+        ticket = object()
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._sessions.setdefault(session, deque()).append(ticket)
+            while True:
+                wait = None
+                if self._is_next(session, ticket):
+                    wait = self.bucket.try_acquire()
+                    if wait == 0:
+                        # Served: the session goes to the back of the turn order
+                        self._remove(session, ticket, rotate=True)
+                        self._condition.notify_all()
+                        return 0.0
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(session, ticket, rotate=False)
+                    self._condition.notify_all()
+                    return wait if wait is not None else timeout
+                # The head polls the bucket; everyone else waits to be notified
+                self._condition.wait(min(wait, remaining) if wait else remaining)
+
+
+class RateLimiter:
+    """Per-endpoint quotas for outbound calls, in fail-fast or queued mode"""
+
+    def __init__(self, limits=None, mode=RATE_LIMIT_MODE, queue_timeout=RATE_LIMIT_QUEUE_TIMEOUT, db_path=None):
+        """
+        Parameters:
+            limits (dict): Endpoint -> (rate per second, burst); unlisted endpoints are unlimited
+            mode (str): "fail_fast" or "queued"
+            queue_timeout (float): Longest wait for a token in queued mode
+            db_path (str): SQLite file to share the buckets across processes, or None for in-process
+        """
+        if mode not in (MODE_FAIL_FAST, MODE_QUEUED):
+            raise ValueError(f"Unknown rate limit mode: {mode}")
+        self.mode = mode
+        self.queue_timeout = queue_timeout
+        self.db_path = db_path
+        self._buckets = {}
+        self._queues = {}
+        for endpoint, (rate, capacity) in (ENDPOINT_LIMITS if limits is None else limits).items():
+            if db_path:
+                bucket = SQLiteTokenBucket(db_path, endpoint, rate, capacity)
+            else:
+                bucket = TokenBucket(rate, capacity)
+            self._buckets[endpoint] = bucket
+            self._queues[endpoint] = FairQueue(bucket)
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, endpoint, session=None):
+        """
+        Take a token for one call to an endpoint
+
+        Parameters:
+            endpoint (str): Endpoint name
+            session: Session the call is made for; defaults to the current context's session
+
+        Raises:
+            RateLimitExceeded: If the quota is used up (after queue_timeout in queued mode)
+        """
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            return
+        if self.mode == MODE_QUEUED:
+            session = session if session is not None else current_rate_limit_session()
+            wait = self._queues[endpoint].acquire(session, self.queue_timeout)
+        else:
+            wait = bucket.try_acquire()
+        if wait:
+            self.rejected += 1
+            report_rate_limited(endpoint)
+            raise RateLimitExceeded(endpoint, wait)
+        self.allowed += 1
+
+    def penalize(self, endpoint, retry_after):
+        """
+        Back off from an endpoint that answered 429
+
+        Parameters:
+            endpoint (str): Endpoint name
+            retry_after (float): Seconds from the Retry-After header, or None for a 1 second default
+        """
+        bucket = self._buckets.get(endpoint)
+        if bucket is not None:
+            bucket.penalize(retry_after if retry_after is not None else 1.0)
+
+    def stats(self):
+        """Return allowed and rejected call counters"""
+        return {"mode": self.mode, "allowed": self.allowed, "rejected": self.rejected}
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the process-wide rate limiter, creating it on first use"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(db_path=RATE_LIMIT_DB)
+    return _rate_limiter
@@ -0,0 +1,223 @@
+"""
+Recognition Result Cache
+Content-addressed cache of food recognition results keyed by image hash,
+with a perceptual-hash index for near-duplicate images
+"""
+
+import hashlib
+import os
+import threading
+
+from .cache import LRUCache, SQLiteCache, MISSING
+from .perceptual_hash import BKTree
+
+# Optional on-disk tier, enabled by pointing this at a SQLite file
+RECOGNITION_CACHE_DB = os.environ.get("FOOD_RECOGNITION_CACHE_DB")
+RECOGNITION_CACHE_SIZE = int(os.environ.get("FOOD_RECOGNITION_CACHE_SIZE", 1024))
+RECOGNITION_CACHE_TTL = float(os.environ.get("FOOD_RECOGNITION_CACHE_TTL", 30 * 24 * 3600))
+RECOGNITION_CACHE_MAX_ENTRIES = int(os.environ.get("FOOD_RECOGNITION_CACHE_MAX_ENTRIES", 200000))
+# Maximum Hamming distance between 64-bit dHashes treated as the same picture (negative disables)
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.environ.get("FOOD_NEAR_DUPLICATE_MAX_DISTANCE", 5))
+
+
+def hash_image_bytes(image_bytes):
+    """Return the SHA-256 hex digest of raw image bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def make_recognition_scope(language, models):
+    """Build the part of the cache key shared by all images of the same request type"""
+    return f"{language}:{'|'.join(models)}"
+
+
+def make_recognition_key(image_hash, language, models):
+    """
+    Build the cache key for a recognition request
+
+    Parameters:
+        image_hash (str): Content hash of the image bytes
+        language (str): Prompt language
+        models (list): Models the request may be answered by
+
+    Returns:
+        str: Cache key
+    """
+    return f"{image_hash}:{make_recognition_scope(language, models)}"
+
+
+class RecognitionCache:
+    """
+    Two-tier cache: in-memory LRU in front of an optional shared SQLite file.
+    Each stored result can also be indexed by a perceptual hash, so re-takes of
+    the same dish reuse the earlier result. A hash is dropped together with its
+    result when the last tier holding it evicts it.
+    """
+
+    def __init__(self, memory_size=RECOGNITION_CACHE_SIZE, db_path=None,
+                 ttl=RECOGNITION_CACHE_TTL, max_entries=RECOGNITION_CACHE_MAX_ENTRIES,
+                 max_distance=NEAR_DUPLICATE_MAX_DISTANCE):
+        """
+        Parameters:
+            memory_size (int): Maximum number of results kept in memory
+            db_path (str): SQLite file for the on-disk tier, or None for memory only
+            ttl (float): Time to live of cached results in seconds
+            max_entries (int): Maximum number of results kept on disk
+            max_distance (int): Hamming distance for near-duplicate hits, negative to disable
+        """
+        # Results live until the disk tier drops them; without one, until the memory tier does
+        self.memory = LRUCache(maxsize=memory_size, ttl=ttl, on_evict=None if db_path else self._forget)
+        self.disk = SQLiteCache(db_path, table="recognition", ttl=ttl, max_entries=max_entries,
+                                on_evict=self._forget) if db_path else None
+        self.max_distance = max_distance
+        self.hits = 0
+        self.near_duplicate_hits = 0
+        self.misses = 0
+        # One BK-tree per scope (language and models), mapping perceptual hashes to cache keys
+        self._indexes = {}
+        # Cache key -> (scope, perceptual hash) it is indexed under
+        self._phashes = {}
+        self._index_lock = threading.Lock()
+        if self.disk is not None:
+            self._load_perceptual_index()
+
+    def _load_perceptual_index(self):
+        """Rebuild the perceptual index from hashes persisted in the on-disk tier"""
+        self.disk.execute(
+            "CREATE TABLE IF NOT EXISTS recognition_phash ("
+            "key TEXT PRIMARY KEY, scope TEXT NOT NULL, phash TEXT NOT NULL)"
+        )
+        # Hashes whose results another process evicted are dropped here
+        self.disk.execute(f"DELETE FROM recognition_phash WHERE key NOT IN (SELECT key FROM {self.disk.table})")
+        rows = self.disk.execute("SELECT key, scope, phash FROM recognition_phash")
+        for key, scope, phash in rows:
+            self._phashes[key] = (scope, int(phash, 16))
+            self._get_index(scope).add(int(phash, 16), key)
+
+    def _forget(self, keys):
+        """Remove evicted keys from the perceptual index (and its on-disk table)"""
+        with self._index_lock:
+            entries = [(key, self._phashes.pop(key, None)) for key in keys]
+        for key, entry in entries:
+            if entry is not None:
+                self._get_index(entry[0]).remove(entry[1], key)
+        if self.disk is not None:
+            try:
+                self.disk.execute(
+                    f"DELETE FROM recognition_phash WHERE key IN ({', '.join('?' * len(keys))})", tuple(keys)
+                )
+            except Exception as e:
+                print(f"Error deleting perceptual hashes: {str(e)}")
+
+    def _get_index(self, scope):
+        """Get the BK-tree for a scope, creating it on first use"""
+        with self._index_lock:
+            index = self._indexes.get(scope)
+            if index is None:
+                index = BKTree()
+                self._indexes[scope] = index
+            return index
+
+    def _lookup(self, key):
+        """Look a key up in the memory tier, then the disk tier"""
+        result = self.memory.get(key)
+        if result is MISSING and self.disk is not None:
+            result = self.disk.get(key)
+            if result is not MISSING:
+                # Promote disk hits into the memory tier
+                self.memory.set(key, result)
+        return result
+
+    def get(self, key):
+        """Get a cached recognition result, or None on miss"""
+        result = self._lookup(key)
+        if result is MISSING:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def find_similar(self, scope, phash):
+        """
+        Find the result of a previously recognized, perceptually similar image
+
+        Parameters:
+            scope (str): Scope from make_recognition_scope
+            phash (int): Perceptual hash of the new image
+
+        Returns:
+            tuple: (result, distance), or (None, None) if no near duplicate is cached
+        """
+        if phash is None or self.max_distance < 0:
+            return None, None
+        stale = []
+        found = None, None
+        for distance, key in self._get_index(scope).search(phash, self.max_distance):
+            result = self._lookup(key)
+            if result is not MISSING:
+                self.near_duplicate_hits += 1
+                found = result, distance
+                break
+            # Expired, or evicted by another process sharing the disk tier
+            stale.append(key)
+        if stale:
+            self._forget(stale)
+        return found
+
+    def set(self, key, result, scope=None, phash=None):
+        """
+        Store a recognition result (a food name or a list of food names)
+
+        Parameters:
+            key (str): Exact cache key
+            result: Recognition result
+            scope (str): Scope used for near-duplicate lookups
+            phash (int): Perceptual hash of the image, or None to skip indexing
+        """
+        self.memory.set(key, result)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, result)
+            except Exception as e:
+                print(f"Error writing recognition cache: {str(e)}")
+
+        if scope is not None and phash is not None:
+            with self._index_lock:
+                previous = self._phashes.get(key)
+                self._phashes[key] = (scope, phash)
+            if previous == (scope, phash):
+                return
+            if previous is not None:
+                self._get_index(previous[0]).remove(previous[1], key)
+            self._get_index(scope).add(phash, key)
+            if self.disk is not None:
+                try:
+                    self.disk.execute(
+                        "INSERT OR REPLACE INTO recognition_phash (key, scope, phash) VALUES (?, ?, ?)",
+                        (key, scope, f"{phash:x}")
+                    )
+                except Exception as e:
+                    print(f"Error writing perceptual hash: {str(e)}")
+
+    def stats(self):
+        """Return hit and miss counters"""
+        return {
+            "hits": self.hits,
+            "near_duplicate_hits": self.near_duplicate_hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+            "indexed_images": sum(len(index) for index in self._indexes.values())
+        }
+
+
+_recognition_cache = None
+_recognition_cache_lock = threading.Lock()
+
+
+def get_recognition_cache():
+    """Return the process-wide recognition cache, creating it on first use"""
+    global _recognition_cache
+    if _recognition_cache is None:
+        with _recognition_cache_lock:
+            if _recognition_cache is None:
+                _recognition_cache = RecognitionCache(db_path=RECOGNITION_CACHE_DB)
+    return _recognition_cache
@@ -0,0 +1,30 @@
+"""
+Request Context
+Per-request settings passed explicitly to the client instead of read from a UI session
+"""
+
+# Interface languages the prompts and food name translations support
+LANGUAGES = ("en", "zh")
+
+
+class RequestContext:
+    """
+    Who a request is made for and how its results should be presented.
+    Plain attributes only, so it pickles into worker processes.
+    """
+
+    def __init__(self, language="en", session_id=None):
+        """
+        Parameters:
+            language (str): Interface language of the results, "en" or "zh"; anything else means "en"
+            session_id: Session the request belongs to, used to share outbound quotas fairly
+        """
+        self.language = language if language in LANGUAGES else "en"
+        self.session_id = session_id
+
+    def __repr__(self):
+        return f"RequestContext(language={self.language!r}, session_id={self.session_id!r})"
+
+
+# Context of requests made without one
+DEFAULT_CONTEXT = RequestContext()
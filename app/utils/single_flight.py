@@ -0,0 +1,136 @@
+"""
+Single-Flight Request Coalescing
+Concurrent calls with the same key share one in-flight execution and its result
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    """An in-flight call that waiting callers block on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers arriving while a call for the
+    same key is running wait for it and receive its result (or its exception).
+    Nothing is kept once the call finishes; caching is left to the caches.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.deduplicated = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Call fn(*args, **kwargs), or join an identical call already in flight
+
+        Parameters:
+            key: Hashable key identifying identical calls
+            fn (callable): Function to run
+
+        Returns:
+            The result of the shared call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+            else:
+                self.deduplicated += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        """Return the number of calls currently running"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        """Return how many calls ran and how many joined a call already in flight"""
+        return {"executed": self.executed, "deduplicated": self.deduplicated, "in_flight": self.in_flight()}
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio counterpart of SingleFlight for coroutines on one event loop. The shared
+    call runs as its own task: a cancelled caller stops waiting without affecting the
+    others, and the call itself is only cancelled once every caller has given up.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.deduplicated = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        """
+        Await fn(*args, **kwargs), or join an identical call already in flight
+
+        Parameters:
+            key: Hashable key identifying identical calls
+            fn (callable): Coroutine function to run
+
+        Returns:
+            The result of the shared call
+        """
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            call = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda _: self._calls.pop(key, None) if self._calls.get(key) is call else None)
+            self.executed += 1
+        else:
+            self.deduplicated += 1
+
+        task = call[0]
+        call[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not task.done():
+                task.cancel()
+
+    def in_flight(self):
+        """Return the number of calls currently running"""
+        return len(self._calls)
+
+    def stats(self):
+        """Return how many calls ran and how many joined a call already in flight"""
+        return {"executed": self.executed, "deduplicated": self.deduplicated, "in_flight": self.in_flight()}
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight():
+    """Return the process-wide single-flight group shared by all clients"""
+    return _single_flight
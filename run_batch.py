@@ -0,0 +1,287 @@
+"""
+Food Calorie Estimator Batch Script
+Recognizes a directory or manifest of meal photos without the Streamlit UI and writes
+one result per image to JSONL or Parquet, resumable through a checkpoint file
+"""
+
+import argparse
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "app"))
+
+from utils.api_client import GenAIClient
+from utils.api_key import load_api_key
+from utils.batch_recognition import BATCH_MAX_IMAGES, BatchSizer
+from utils.rate_limit import RateLimiter, MODE_QUEUED, RATE_LIMIT_DB
+from utils.image_utils import IngestedImage, VALID_IMAGE_EXTENSIONS
+from utils.request_context import RequestContext, DEFAULT_CONTEXT
+from pipeline import analyze_images, build_result_record
+
+_DONE = object()
+
+def iter_image_paths(source):
+    """
+    Yield image paths from a directory (walked recursively, in sorted order) or a manifest
+
+    A manifest is a .txt file with one path per line, or a .csv / .jsonl file with a
+    "path" column; relative paths are taken relative to the manifest.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in VALID_IMAGE_EXTENSIONS:
+                    yield os.path.join(root, name)
+        return
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    extension = os.path.splitext(source)[1].lower()
+    with open(source, "r", encoding="utf-8", newline="") as manifest:
+        if extension == ".csv":
+            paths = (row.get("path") for row in csv.DictReader(manifest))
+        elif extension == ".jsonl":
+            paths = (json.loads(line).get("path") for line in manifest if line.strip())
+        else:
+            paths = (line.strip() for line in manifest)
+        for path in paths:
+            if path and not path.startswith("#"):
+                yield path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+class Checkpoint:
+    """Append-only file of the image paths whose results have been written"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as checkpoint_file:
+                self.done = {line.rstrip("\n") for line in checkpoint_file if line.strip()}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def mark(self, paths):
+        """Record paths as done; call only once their results are durably written"""
+        self._file.write("".join(f"{path}\n" for path in paths))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.update(paths)
+
+    def close(self):
+        self._file.close()
+
+class JsonlResultWriter:
+    """Writes one JSON object per line, appending to the file unless told to start it over"""
+
+    def __init__(self, path, mode="a"):
+        self._file = open(path, mode, encoding="utf-8")
+
+    def write(self, records):
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+class ParquetResultWriter:
+    """
+    Writes a Parquet dataset directory: every run adds its own part file, written one
+    row group per flush, so a resumed run never rewrites earlier results
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        self._pa = pa
+        self.schema = pa.schema([
+            ("path", pa.string()),
+            ("foods", pa.list_(pa.string())),
+            ("sources", pa.list_(pa.string())),
+            ("calories", pa.list_(pa.float64())),
+            ("total_calories", pa.float64()),
+            ("protein", pa.float64()),
+            ("fat", pa.float64()),
+            ("carbohydrates", pa.float64()),
+            ("error", pa.string()),
+            ("elapsed", pa.float64())
+        ])
+        os.makedirs(path, exist_ok=True)
+        part = 0
+        while os.path.exists(os.path.join(path, f"part-{part:05d}.parquet")):
+            part += 1
+        self._writer = pq.ParquetWriter(os.path.join(path, f"part-{part:05d}.parquet"), self.schema)
+
+    def write(self, records):
+        self._writer.write_table(self._pa.Table.from_pylist(list(records), schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+def open_result_writer(path):
+    """Pick the writer from the output path: *.parquet for Parquet, anything else for JSONL"""
+    if path.lower().endswith(".parquet"):
+        return ParquetResultWriter(path)
+    return JsonlResultWriter(path)
+
+def process_chunk(client, paths, context=DEFAULT_CONTEXT):
+    """Ingest, recognize (several images per request) and look up nutrition for a chunk of images"""
+    records = analyze_images(client, [IngestedImage.from_path(path) for path in paths], context)
+    return [{"path": path, **record} for path, record in zip(paths, records)]
+
+def flush(writer, checkpoint, records, error_writer=None):
+    """
+    Write and checkpoint the images that succeeded; failures go to the error writer only,
+    so a resumed run retries them without ever writing a second row for an image
+    """
+    succeeded = [record for record in records if not record["error"]]
+    failed = [record for record in records if record["error"]]
+    writer.write(succeeded)
+    checkpoint.mark([record["path"] for record in succeeded])
+    if error_writer is not None and failed:
+        error_writer.write(failed)
+
+def run_batch(client, source, writer, checkpoint, workers=4, queue_size=None, chunk_size=BATCH_MAX_IMAGES,
+              flush_every=50, context=DEFAULT_CONTEXT, error_writer=None):
+    """
+    Stream images through ingest -> recognition -> nutrition lookup -> writer
+
+    A reader thread feeds a bounded queue of image chunks to the worker threads, and
+    the calling thread appends their results and checkpoints them after each flush.
+    Only successful results are written and checkpointed, so the output holds one row per
+    image and a resumed run retries the failed images; failed results go to error_writer.
+
+    Returns:
+        dict: Counts of processed, failed and skipped images
+
+    Raises:
+        FileNotFoundError: If source does not exist
+        Exception: Whatever stopped the reader (e.g. a malformed manifest), after the
+                   images read before it have been processed and written
+    """
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"No such image directory or manifest: {source}")
+    queue_size = queue_size or workers * 2
+    chunks = queue.Queue(maxsize=queue_size)
+    results = queue.Queue(maxsize=queue_size)
+    counts = {"processed": 0, "failed": 0, "skipped": 0}
+    reader_errors = []
+
+    def read():
+        chunk = []
+        try:
+            for path in iter_image_paths(source):
+                if path in checkpoint.done:
+                    counts["skipped"] += 1
+                    continue
+                chunk.append(path)
+                if len(chunk) >= chunk_size:
+                    chunks.put(chunk)
+                    chunk = []
+        except Exception as e:
+            reader_errors.append(e)
+        finally:
+            # The workers, and through them the writing loop, always learn that reading is over
+            if chunk:
+                chunks.put(chunk)
+            for _ in range(workers):
+                chunks.put(_DONE)
+
+    def work():
+        while True:
+            chunk = chunks.get()
+            if chunk is _DONE:
+                results.put(_DONE)
+                return
+            try:
+                records = process_chunk(client, chunk, context)
+            except Exception as e:
+                records = [{"path": path, **build_result_record([], [], time.time(), error=str(e))} for path in chunk]
+            results.put(records)
+
+    threads = [threading.Thread(target=read, name="batch-reader", daemon=True)]
+    threads += [threading.Thread(target=work, name=f"batch-worker-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    started_at = time.time()
+    pending = []
+    finished_workers = 0
+    while finished_workers < workers:
+        records = results.get()
+        if records is _DONE:
+            finished_workers += 1
+            continue
+        pending.extend(records)
+        counts["processed"] += len(records)
+        counts["failed"] += sum(1 for record in records if record["error"])
+        if len(pending) >= flush_every:
+            flush(writer, checkpoint, pending, error_writer)
+            pending = []
+            rate = counts["processed"] / max(time.time() - started_at, 1e-9)
+            print(f"Processed {counts['processed']} images ({counts['failed']} failed), {rate:.1f} images/s")
+    if pending:
+        flush(writer, checkpoint, pending, error_writer)
+    if reader_errors:
+        raise reader_errors[0]
+    return counts
+
+def main():
+    """Run a batch recognition job"""
+    parser = argparse.ArgumentParser(description="Recognize a directory or manifest of meal photos")
+    parser.add_argument("source", help="Image directory, or a .txt/.csv/.jsonl manifest of image paths")
+    parser.add_argument("--output", default="results.jsonl", help="Output file (.jsonl) or Parquet dataset directory (.parquet)")
+    parser.add_argument("--checkpoint", help="Checkpoint file, defaults to the output path plus .checkpoint")
+    parser.add_argument("--errors", help="JSONL file of the images that failed in this run, defaults to the output path plus .errors.jsonl")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent recognition workers")
+    parser.add_argument("--queue-size", type=int, help="Most image chunks waiting for a worker")
+    parser.add_argument("--batch-size", type=int, default=BATCH_MAX_IMAGES, help="Images per recognition request (1 disables batching)")
+    parser.add_argument("--flush-every", type=int, default=50, help="Results written per output flush and checkpoint")
+    parser.add_argument("--language", choices=["en", "zh"], default="en", help="Language of the food names and sources")
+    parser.add_argument("--api-key", help="HKBU GenAI Platform API key")
+    args = parser.parse_args()
+
+    api_key = load_api_key(args.api_key)
+    if not api_key:
+        parser.error("No API key: pass --api-key, set FOOD_GENAI_API_KEY or create config/api_key.txt")
+    if not os.path.exists(args.source):
+        parser.error(f"No such image directory or manifest: {args.source}")
+
+    # A batch job would rather wait for its quota than fall back to offline guesses
+    rate_limiter = RateLimiter(mode=MODE_QUEUED, queue_timeout=float(os.environ.get("FOOD_RATE_LIMIT_QUEUE_TIMEOUT", 120)),
+                               db_path=RATE_LIMIT_DB)
+    client = GenAIClient(api_key, rate_limiter=rate_limiter)
+    # The sizer caps the requested size at what one answer can hold
+    client.batch_sizer = BatchSizer(max_images=max(1, args.batch_size))
+    output = args.output.rstrip("/\\")
+    checkpoint = Checkpoint(args.checkpoint or output + ".checkpoint")
+    if checkpoint.done:
+        print(f"Resuming: {len(checkpoint.done)} images already done")
+    writer = open_result_writer(args.output)
+    # Every run retries the earlier failures, so the errors file is started over
+    error_writer = JsonlResultWriter(args.errors or output + ".errors.jsonl", mode="w")
+
+    started_at = time.time()
+    try:
+        counts = run_batch(client, args.source, writer, checkpoint, workers=max(1, args.workers),
+                           queue_size=args.queue_size, chunk_size=client.batch_sizer.max_images,
+                           flush_every=max(1, args.flush_every), context=RequestContext(language=args.language),
+                           error_writer=error_writer)
+    finally:
+        writer.close()
+        error_writer.close()
+        checkpoint.close()
+    print(f"Done in {time.time() - started_at:.1f}s: {counts['processed']} processed, "
+          f"{counts['failed']} failed, {counts['skipped']} skipped (already done)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Food Calorie Estimator Service Script
+Serves the recognition pipeline over HTTP (see app/service.py) with uvicorn
+"""
+
+import argparse
+import os
+import sys
+
+def main():
+    """Launch the recognition service"""
+    parser = argparse.ArgumentParser(description="Run the food recognition HTTP service")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--processes", type=int, default=1, help="Server processes, each with its own worker pool")
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("The service needs uvicorn: pip install -r requirements.txt")
+        sys.exit(1)
+
+    app_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+    uvicorn.run("service:app", app_dir=app_dir, host=args.host, port=args.port, workers=args.processes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Food Calorie Estimator Worker Script
+Runs recognition worker processes for the job queue (see app/jobs.py) separately from the web interface
+"""
+
+import argparse
+import os
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "app"))
+
+from utils.api_client import GenAIClient
+from utils.api_key import load_api_key
+from jobs import JobWorkerPool, JOB_DB_PATH, JOB_WORKERS
+
+def main():
+    """Run recognition workers until interrupted"""
+    parser = argparse.ArgumentParser(description="Run recognition workers for the job queue")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS or 2, help="Worker processes")
+    parser.add_argument("--db", default=JOB_DB_PATH, help="SQLite file of the job queue (FOOD_JOB_DB)")
+    parser.add_argument("--api-key", help="HKBU GenAI Platform API key")
+    args = parser.parse_args()
+
+    api_key = load_api_key(args.api_key)
+    if not api_key:
+        parser.error("No API key: pass --api-key, set FOOD_GENAI_API_KEY or create config/api_key.txt")
+
+    pool = JobWorkerPool(GenAIClient(api_key), processes=max(1, args.workers), db_path=args.db).start()
+    print(f"{pool.processes} workers running jobs from {args.db}")
+    try:
+        while pool.alive():
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping workers after their current jobs...")
+    finally:
+        pool.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Test configuration
+Puts app/ on sys.path the way streamlit run does, and provides isolated clients
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+
+from utils.api_client import GenAIClient
+from utils.circuit_breaker import CircuitBreakerRegistry
+from utils.color_features import get_color_engine
+from utils.nutrition_cache import NutritionCache
+from utils.rate_limit import RateLimiter
+from utils.recognition_cache import RecognitionCache
+from utils.single_flight import SingleFlight
+
+SAMPLE_DIR = ROOT_DIR
+
+
+class FakeResponse:
+    """Minimal stand-in for a requests response"""
+
+    def __init__(self, status_code=200, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload if payload is not None else {}
+        self.headers = headers or {}
+        self.text = str(self._payload)
+
+    def json(self):
+        return self._payload
+
+
+def usda_payload(calories=250, description="Pizza"):
+    """A USDA search answer with one food"""
+    return {"foods": [{
+        "description": description,
+        "foodNutrients": [{"nutrientName": "Energy", "unitName": "KCAL", "value": calories}]
+    }]}
+
+
+@pytest.fixture
+def make_client():
+    """Build GenAIClients that share no state with the process-wide caches, limiters and breakers"""
+    def make(**kwargs):
+        kwargs.setdefault("recognition_cache", RecognitionCache(memory_size=64))
+        kwargs.setdefault("nutrition_cache", NutritionCache(memory_size=64))
+        kwargs.setdefault("single_flight", SingleFlight())
+        kwargs.setdefault("rate_limiter", RateLimiter(limits={}))
+        kwargs.setdefault("circuit_breakers", CircuitBreakerRegistry())
+        kwargs.setdefault("color_engine", get_color_engine())
+        return GenAIClient("test-key", **kwargs)
+
+    return make
+
+
+@pytest.fixture
+def sample_image_path():
+    return os.path.join(SAMPLE_DIR, "pizza.jpg")
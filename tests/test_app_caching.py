@@ -0,0 +1,53 @@
+"""Tests for the cached pure computations and the per-result macro totals of the Streamlit app"""
+
+import pytest
+
+import app
+
+
+CACHED_CALLS = [
+    (app.calculate_daily_calories, (170, 65, 30, "male", "moderate")),
+    (app.calculate_daily_calories, (None, 65, 30, "female", "light")),
+    (app.get_fitness_recommendations, ("female", 45, 27.5, "light")),
+    (app.get_nutrition_plan, ("male", 80, "active", "lose")),
+    (app.get_food_suggestions, ("Grilled chicken",)),
+    (app.get_food_suggestions, ("mystery stew",)),
+    (app.get_portion_suggestion, ("pizza",)),
+    (app.get_meal_balance_suggestion, (["rice", "broccoli"],)),
+]
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for function in {function for function, _ in CACHED_CALLS}:
+        function.clear()
+    yield
+
+
+@pytest.mark.parametrize("function, args", CACHED_CALLS)
+def test_cached_results_match_the_plain_functions(function, args):
+    expected = function.__wrapped__(*args)
+    assert function(*args) == expected
+    assert function(*args) == expected
+
+
+def test_callers_cannot_change_a_cached_result():
+    suggestions = app.get_food_suggestions("apple")
+    suggestions["en"].append("changed")
+    assert "changed" not in app.get_food_suggestions("apple")["en"]
+
+
+def test_single_food_suggestions_fall_back_to_the_meal_balance():
+    assert app.get_food_suggestions("mystery stew") == app.get_meal_balance_suggestion(["mystery stew"])
+
+
+def test_meal_totals_are_computed_once_per_result_list(monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, "meal_macro_totals", lambda results: calls.append(results) or (1, 2, 3))
+    results = [{"food": "pizza"}]
+    assert app.get_meal_totals(results) == (1.0, 2.0, 3.0)
+    assert app.get_meal_totals(results) == (1.0, 2.0, 3.0)
+    assert len(calls) == 1
+    # A new recognition result is a new list, even with the same content
+    app.get_meal_totals(list(results))
+    assert len(calls) == 2
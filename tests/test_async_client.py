@@ -0,0 +1,142 @@
+"""Tests for the asyncio client: call signatures and keeping SQLite work off the event loop"""
+
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from utils.api_client import ENDPOINT_GENAI
+from utils.async_api_client import AsyncGenAIClient
+from utils.circuit_breaker import CircuitBreakerRegistry
+from utils.color_features import get_color_engine
+from utils.image_utils import IngestedImage
+from utils.nutrition_cache import NutritionCache
+from utils.rate_limit import RateLimiter
+from utils.recognition_cache import RecognitionCache
+from utils.single_flight import AsyncSingleFlight
+
+from conftest import SAMPLE_DIR
+
+
+def model_answer(request):
+    return httpx.Response(200, json={"choices": [{"message": {"content": "pizza"}}]})
+
+
+def record_threads(monkeypatch, target, name, threads):
+    """Wrap a method so each call records the thread it ran on"""
+    function = getattr(target, name)
+
+    def recorded(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return function(*args, **kwargs)
+
+    monkeypatch.setattr(target, name, recorded)
+
+
+@pytest.fixture
+def ingested():
+    with open(f"{SAMPLE_DIR}/pizza.jpg", "rb") as image_file:
+        return IngestedImage(image_file.read(), "photo.jpg")
+
+
+@pytest.fixture
+def make_async_client(tmp_path):
+    def make(handler=model_answer, **kwargs):
+        kwargs.setdefault("recognition_cache", RecognitionCache(memory_size=64))
+        kwargs.setdefault("nutrition_cache", NutritionCache(memory_size=64))
+        kwargs.setdefault("single_flight", AsyncSingleFlight())
+        kwargs.setdefault("rate_limiter", RateLimiter(limits={}))
+        kwargs.setdefault("circuit_breakers", CircuitBreakerRegistry())
+        kwargs.setdefault("color_engine", get_color_engine())
+        return AsyncGenAIClient("test-key", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                                models=["model-a"], **kwargs)
+
+    return make
+
+
+def test_deadline_is_keyword_only(make_async_client, ingested):
+    client = make_async_client()
+    with pytest.raises(TypeError):
+        asyncio.run(client.identify_food_in_image(ingested, None, 5))
+    with pytest.raises(TypeError):
+        asyncio.run(client.identify_food_in_images([ingested], None, 5))
+
+
+def test_recognition_result_is_cached(make_async_client, ingested):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return model_answer(request)
+
+    client = make_async_client(handler)
+    assert asyncio.run(client.identify_food_in_image(ingested, deadline=10)) == "pizza"
+    assert asyncio.run(client.identify_food_in_image(ingested, deadline=10)) == "pizza"
+    assert len(calls) == 1
+
+
+def test_sqlite_cache_and_quota_run_off_the_event_loop(make_async_client, ingested, tmp_path, monkeypatch):
+    recognition_cache = RecognitionCache(memory_size=64, db_path=str(tmp_path / "recognition.sqlite3"))
+    rate_limiter = RateLimiter(limits={ENDPOINT_GENAI: (10, 10)}, db_path=str(tmp_path / "quota.sqlite3"))
+    cache_threads, quota_threads = [], []
+    record_threads(monkeypatch, recognition_cache, "get", cache_threads)
+    record_threads(monkeypatch, recognition_cache, "set", cache_threads)
+    record_threads(monkeypatch, rate_limiter._buckets[ENDPOINT_GENAI], "try_acquire", quota_threads)
+    client = make_async_client(recognition_cache=recognition_cache, rate_limiter=rate_limiter)
+
+    async def recognize():
+        return threading.current_thread(), await client.identify_food_in_image(ingested, deadline=10)
+
+    loop_thread, result = asyncio.run(recognize())
+    assert result == "pizza"
+    assert len(cache_threads) == 2 and len(quota_threads) == 1
+    assert loop_thread not in cache_threads + quota_threads
+
+
+def test_memory_only_cache_stays_on_the_event_loop(make_async_client, ingested, monkeypatch):
+    recognition_cache = RecognitionCache(memory_size=64)
+    cache_threads = []
+    record_threads(monkeypatch, recognition_cache, "get", cache_threads)
+    client = make_async_client(recognition_cache=recognition_cache)
+
+    async def recognize():
+        return threading.current_thread(), await client.identify_food_in_image(ingested, deadline=10)
+
+    loop_thread, _ = asyncio.run(recognize())
+    assert cache_threads == [loop_thread]
+
+
+def test_nutrition_cache_with_sqlite_tier_runs_in_threads(tmp_path, monkeypatch):
+    cache = NutritionCache(memory_size=8, db_path=str(tmp_path / "nutrition.sqlite3"))
+    threads = []
+    record_threads(monkeypatch, cache, "_get_cached", threads)
+    record_threads(monkeypatch, cache, "set", threads)
+
+    async def fetch():
+        return {"calories": 250}, "USDA Database"
+
+    async def lookup():
+        first = await cache.get_or_fetch_async("usda:pizza", fetch)
+        second = await cache.get_or_fetch_async("usda:pizza", fetch)
+        return threading.current_thread(), first, second
+
+    loop_thread, first, second = asyncio.run(lookup())
+    assert first == second == ({"calories": 250}, "USDA Database")
+    assert len(threads) == 3 and loop_thread not in threads
+
+
+def test_shared_quota_is_penalized_off_the_event_loop(make_async_client, ingested, tmp_path, monkeypatch):
+    rate_limiter = RateLimiter(limits={ENDPOINT_GENAI: (10, 10)}, db_path=str(tmp_path / "quota.sqlite3"))
+    penalize_threads = []
+    record_threads(monkeypatch, rate_limiter._buckets[ENDPOINT_GENAI], "penalize", penalize_threads)
+    client = make_async_client(lambda request: httpx.Response(429, headers={"Retry-After": "30"}),
+                               rate_limiter=rate_limiter)
+
+    async def recognize():
+        return threading.current_thread(), await client.identify_food_in_image(ingested, deadline=10)
+
+    loop_thread, result = asyncio.run(recognize())
+    # The model refused, so the answer is the offline guess
+    assert result
+    assert len(penalize_threads) == 1 and loop_thread not in penalize_threads
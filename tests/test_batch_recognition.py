@@ -0,0 +1,85 @@
+"""Tests for batch recognition: answer parsing, adaptive batch sizes and the client's batch mode"""
+
+import json
+
+import pytest
+
+import utils.api_client as api_client
+from utils.batch_recognition import BatchItem, BatchSizer, estimate_image_tokens, parse_batch_answer
+
+from conftest import FakeResponse, SAMPLE_DIR
+
+
+@pytest.mark.parametrize("content, answers", [
+    ('{"1": ["pizza"], "2": [], "3": ["rice", "egg"]}', {0: ["pizza"], 1: [], 2: ["rice", "egg"]}),
+    ('```json\n[["soup"], "tea"]\n```', {0: ["soup"], 1: ["tea"]}),
+    ('{"1": ["pizza"], "7": ["cake"], "x": ["bread"]}', {0: ["pizza"]}),
+    ('{"1": ["pizza"], "2": ["sal', {0: ["pizza"]}),
+    ("no foods here", {}),
+])
+def test_batch_answers_are_split_per_image(content, answers):
+    assert parse_batch_answer(content, 3) == answers
+
+
+def test_image_token_estimate_follows_the_tiling():
+    assert estimate_image_tokens(512, 512) == 85 + 170
+    assert estimate_image_tokens(4000, 3000) == 85 + 170 * 4
+
+
+def item(tokens):
+    return BatchItem(None, None, None, None, None, tokens)
+
+
+def test_batches_respect_the_size_and_token_budget():
+    sizer = BatchSizer(max_images=3, max_input_tokens=1000)
+    pending = [item(400) for _ in range(5)]
+    assert len(sizer.take(pending)) == 2
+    pending = [item(2000)] + pending
+    assert len(sizer.take(pending)) == 1
+
+
+def test_batch_size_adapts_to_outcomes():
+    sizer = BatchSizer(max_images=8)
+    sizer.record(8, 5)
+    assert sizer.size == 4
+    sizer.record(4, 4, truncated=True)
+    assert sizer.size == 2
+    sizer.record(2, 2)
+    assert sizer.size == 3
+    assert BatchSizer(max_images=50, answer_tokens=40, max_output_tokens=400).max_images == 9
+
+
+def batch_answer(count):
+    return json.dumps({str(number): ["pizza"] for number in range(1, count + 1)})
+
+
+class BatchSession:
+    """Answers batch requests for every image but the last, and single requests with "salad" """
+
+    def __init__(self):
+        self.batches = []
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        images = [part for part in json["messages"][0]["content"] if part["type"] == "image_url"]
+        self.batches.append(len(images))
+        if len(images) == 1 and "numbered" not in json["messages"][0]["content"][0]["text"]:
+            return self.answer("salad")
+        return self.answer(batch_answer(len(images) - 1))
+
+    @staticmethod
+    def answer(content):
+        return FakeResponse(200, {"choices": [{"message": {"content": content}, "finish_reason": "stop"}]})
+
+
+def test_client_batches_images_and_retries_the_missed_ones(make_client, monkeypatch):
+    session = BatchSession()
+    monkeypatch.setattr(api_client, "get_session", lambda host: session)
+    client = make_client(models=["model-a"])
+    paths = [f"{SAMPLE_DIR}/{name}.jpg" for name in ("pizza", "apple", "pizza", "meal")]
+    results = client.identify_food_in_images(paths)
+    # The repeated image is sent once; the image the batch missed is recognized on its own
+    assert session.batches == [3, 1]
+    assert results == ["pizza", "pizza", "pizza", "salad"]
+    # Everything is cached now
+    assert client.identify_food_in_images(paths[:2]) == ["pizza", "pizza"]
+    assert session.batches == [3, 1]
@@ -0,0 +1,82 @@
+"""Tests for the per-endpoint circuit breakers and how the client reacts to them"""
+
+import time
+
+import pytest
+
+import utils.api_client as api_client
+from utils.circuit_breaker import (CircuitBreaker, CircuitBreakerRegistry, CircuitOpenError,
+                                   STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN)
+from utils.rate_limit import ENDPOINT_GENAI
+
+from conftest import FakeResponse, SAMPLE_DIR
+
+
+class FailingSession:
+    """Answers every model request with a server error"""
+
+    def __init__(self):
+        self.posts = 0
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.posts += 1
+        return FakeResponse(503, {"error": "unavailable"})
+
+
+def test_consecutive_failures_open_the_circuit():
+    breaker = CircuitBreaker("api", failure_threshold=3, recovery_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN and breaker.is_open()
+    assert not breaker.allow_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats() == {"state": STATE_OPEN, "consecutive_failures": 3, "times_opened": 1, "rejected": 2}
+
+
+def test_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker("api", failure_threshold=1, recovery_timeout=0.05, half_open_max_calls=1)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request() and breaker.is_open()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+
+
+def test_released_probe_can_be_retaken():
+    breaker = CircuitBreaker("api", failure_threshold=1, recovery_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+
+
+def test_registry_keeps_one_breaker_per_endpoint():
+    registry = CircuitBreakerRegistry(failure_threshold=7)
+    assert registry.get("a") is registry.get("a")
+    assert registry.get("b").failure_threshold == 7
+    assert set(registry.stats()) == {"a", "b"}
+
+
+def test_failing_models_open_the_circuit_and_later_images_skip_them(make_client, monkeypatch):
+    session = FailingSession()
+    monkeypatch.setattr(api_client, "get_session", lambda host: session)
+    breakers = CircuitBreakerRegistry(failure_threshold=2, recovery_timeout=60)
+    client = make_client(models=["model-a", "model-b"], circuit_breakers=breakers)
+    # Both models fail: the answer comes from offline analysis and the circuit opens
+    assert client.identify_food_in_image(f"{SAMPLE_DIR}/pizza.jpg")
+    assert session.posts == 2
+    assert breakers.get(ENDPOINT_GENAI).state == STATE_OPEN
+    assert client.identify_food_in_image(f"{SAMPLE_DIR}/apple.jpg")
+    assert session.posts == 2
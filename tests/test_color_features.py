@@ -0,0 +1,69 @@
+"""Tests for the offline color analysis"""
+
+import random
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.color_features import ColorFeatureEngine, DEFAULT_COLOR_RULES
+
+from conftest import SAMPLE_DIR
+
+BROWN = (150, 100, 50)
+RED = (230, 50, 50)
+
+
+def reference_infer_foods(image):
+    """The per-color loop the engine replaced: a class matches when one exact color in it covers over 50 pixels"""
+    colors = image.resize((50, 50)).getcolors(2500)
+    return [rule["food"] for rule in DEFAULT_COLOR_RULES if any(
+        rule["r"][0] < r < rule["r"][1] and rule["g"][0] < g < rule["g"][1] and rule["b"][0] < b < rule["b"][1]
+        for count, (r, g, b) in colors if count > 50
+    )]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return ColorFeatureEngine()
+
+
+def test_solid_colors_suggest_their_food(engine):
+    assert engine.infer_foods(Image.new("RGB", (80, 80), BROWN)) == ["hamburger"]
+    assert engine.infer_foods(Image.new("RGB", (80, 80), (255, 255, 255))) == []
+
+
+def test_a_color_needs_more_than_fifty_pixels(engine):
+    image = Image.new("RGB", (50, 50), (255, 255, 255))
+    image.paste(RED, (0, 0, 10, 5))
+    assert engine.infer_foods(image) == []
+    image.paste(RED, (0, 0, 51, 1))
+    assert engine.infer_foods(image) == ["pizza"]
+
+
+def test_scattered_shades_do_not_add_up(engine):
+    # Half the image is red, but no single shade covers more than 50 pixels
+    rng = random.Random(5)
+    pixels = np.full((50, 50, 3), 255, dtype=np.uint8)
+    pixels[:25] = [[(rng.randrange(201, 255), rng.randrange(1, 100), rng.randrange(1, 100)) for _ in range(50)]
+                   for _ in range(25)]
+    image = Image.fromarray(pixels)
+    assert engine.pixel_fractions(image)["red"] > 0.4
+    assert engine.infer_foods(image) == []
+
+
+def test_transparent_areas_read_as_white(engine):
+    image = Image.new("RGBA", (50, 50), (0, 0, 0, 0))
+    assert engine.infer_foods(image) == []
+
+
+def test_matches_the_reference_analysis(engine):
+    rng = random.Random(0)
+    images = [Image.open(f"{SAMPLE_DIR}/{name}.jpg").convert("RGB") for name in ("pizza", "apple", "meal", "hambeger")]
+    for _ in range(100):
+        image = Image.new("RGB", (64, 64), tuple(rng.randrange(256) for _ in range(3)))
+        for _ in range(3):
+            image.paste(tuple(rng.randrange(256) for _ in range(3)), (0, 0, rng.randrange(1, 64), rng.randrange(1, 64)))
+        images.append(image)
+    for image in images:
+        assert engine.infer_foods(image) == reference_infer_foods(image)
@@ -0,0 +1,142 @@
+"""Tests for food name resolution, the binary food database and get_food_calories"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import data.food_calories as food_calories
+from data.builtin_foods import FOOD_CALORIES, FOOD_ALIASES
+from data.food_binary_db import BinaryFoodDatabase, build_binary_db, load_foods_csv
+from data.food_index import FoodNameResolver, edit_distance
+from data.nutrient_table import NutrientTable
+
+from conftest import ROOT_DIR
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return FoodNameResolver(FOOD_CALORIES.keys(), FOOD_ALIASES)
+
+
+@pytest.mark.parametrize("query, key", [
+    ("Apple", "apple"),
+    ("  PIZZA ", "pizza"),
+    ("hamburger", "burger"),
+    ("汉堡包", "burger"),
+    ("vanilla ice cream", "ice cream"),
+    ("grilled salmon fillet", "salmon"),
+    ("fries", "french fries"),
+    ("hamberger", "burger"),
+])
+def test_resolver_ranking(resolver, query, key):
+    assert resolver.resolve(query) == key
+
+
+def test_resolver_prefers_the_longest_contained_name():
+    resolver = FoodNameResolver(["rice", "fried rice", "chicken"])
+    assert resolver.resolve("chicken fried rice bowl") == "fried rice"
+
+
+def test_resolver_prefers_whole_word_then_shortest_containing_name():
+    resolver = FoodNameResolver(["sweet potato", "potatoes au gratin", "xpotato"])
+    assert resolver.resolve("potat") == "sweet potato"
+
+
+def test_resolver_rejects_low_confidence_typos():
+    resolver = FoodNameResolver(["beef"])
+    assert resolver.resolve("beer") is None
+    assert resolver.resolve("") is None
+
+
+def test_exact_names_do_not_build_the_indexes():
+    fresh = FoodNameResolver(FOOD_CALORIES.keys(), FOOD_ALIASES)
+    assert fresh.resolve("banana") == "banana"
+    assert fresh._indexes is None
+    assert fresh.resolve("bananas") == "banana"
+    assert fresh._indexes is not None
+
+
+def test_edit_distance_counts_transpositions():
+    assert edit_distance("pizza", "pizaz") == 1
+    assert edit_distance("apple", "banana", max_distance=2) == 3
+
+
+@pytest.fixture(scope="module")
+def binary_db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("foods") / "foods.bin")
+    build_binary_db(NutrientTable(FOOD_CALORIES), FOOD_ALIASES, path)
+    db = BinaryFoodDatabase(path)
+    yield db
+    db.close()
+
+
+def nutrient_tuple(nutrient):
+    return nutrient["name"], nutrient["value"], nutrient["unit"]
+
+
+def test_binary_db_round_trip(binary_db):
+    assert len(binary_db) == len(FOOD_CALORIES)
+    assert sorted(binary_db.keys()) == sorted(FOOD_CALORIES)
+    for key, entry in FOOD_CALORIES.items():
+        info = binary_db.food_info(key)
+        assert (info["calories"], info["portion"]) == (entry["calories"], entry["portion"])
+        assert info["details"]["food_name"] == entry["details"]["food_name"]
+        # Nutrients come back in column order rather than the entry's order
+        assert sorted(map(nutrient_tuple, info["details"]["nutrients"])) == sorted(
+            map(nutrient_tuple, entry["details"]["nutrients"]))
+
+
+def test_binary_db_finds_aliases_and_misses(binary_db):
+    assert binary_db.key(binary_db.find(" Hamburger ")) == "burger"
+    assert binary_db.key(binary_db.find("苹果")) == "apple"
+    assert binary_db.aliases()["cheeseburger"] == "burger"
+    assert binary_db.find("zz unknown") is None
+    assert binary_db.food_info("zz unknown") is None
+
+
+def test_binary_db_rejects_other_files(tmp_path):
+    path = tmp_path / "not_a_db.bin"
+    path.write_bytes(b"\x00" * 128)
+    with pytest.raises(ValueError):
+        BinaryFoodDatabase(str(path))
+
+
+def test_csv_source_builds_a_binary_db(tmp_path):
+    csv_path = tmp_path / "foods.csv"
+    csv_path.write_text("key,food_name,calories,portion,aliases,Protein (g)\n"
+                        "Tofu,Firm Tofu,144,100g,bean curd|豆腐,15.8\n", encoding="utf-8")
+    foods, aliases = load_foods_csv(str(csv_path))
+    build_binary_db(NutrientTable(foods), aliases, str(tmp_path / "foods.bin"))
+    db = BinaryFoodDatabase(str(tmp_path / "foods.bin"))
+    info = db.food_info("豆腐")
+    assert info["calories"] == 144
+    assert info["details"] == {"food_name": "Firm Tofu",
+                               "nutrients": [{"name": "Protein", "value": 15.8, "unit": "g"}]}
+    db.close()
+
+
+def test_get_food_calories_reads_the_binary_db(binary_db, monkeypatch):
+    monkeypatch.setattr(food_calories, "FOOD_BINARY_DB", binary_db)
+    monkeypatch.setattr(food_calories, "NUTRIENT_TABLE", None)
+    monkeypatch.setattr(food_calories, "_food_name_resolver", None)
+    assert food_calories.get_food_calories("Hamburger")["calories"] == FOOD_CALORIES["burger"]["calories"]
+    # Exact names are found by the binary search without building a resolver
+    assert food_calories._food_name_resolver is None
+    assert food_calories.get_food_calories("grilled salmon fillet")["calories"] == FOOD_CALORIES["salmon"]["calories"]
+    assert food_calories._food_name_resolver is not None
+
+
+def test_get_food_calories_reads_the_builtin_table():
+    assert food_calories.get_food_calories("Apple")["calories"] == FOOD_CALORIES["apple"]["calories"]
+    assert food_calories.get_food_calories("zz unknown food") is None
+
+
+def test_binary_db_process_does_not_load_the_builtin_table(binary_db):
+    script = ("import sys; import data.food_calories as fc; "
+              "assert fc.get_food_calories('apple')['calories'] == 95; "
+              "assert 'data.builtin_foods' not in sys.modules; "
+              "assert fc.FOOD_CALORIES['apple']['calories'] == 95")
+    env = dict(os.environ, FOOD_BINARY_DB_PATH=binary_db.path)
+    subprocess.run([sys.executable, "-c", script], cwd=os.path.join(ROOT_DIR, "app"), env=env, check=True)
@@ -0,0 +1,80 @@
+"""Tests for the pooled HTTP sessions and their retry policy"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils.http_session import SessionManager
+
+
+class CountingHandler(BaseHTTPRequestHandler):
+    """Answers every request with the server's status after its delay, counting requests per method"""
+
+    def _answer(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.command] = server.hits.get(self.command, 0) + 1
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(server.delay)
+        self.send_response(server.status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = _answer
+    do_POST = _answer
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    httpd.hits = {}
+    httpd.lock = threading.Lock()
+    httpd.status = 200
+    httpd.delay = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def test_session_is_shared_per_host():
+    manager = SessionManager()
+    assert manager.get_session("a") is manager.get_session("a")
+    assert manager.get_session("a") is not manager.get_session("b")
+
+
+def test_error_status_of_get_is_retried(server):
+    server.status = 503
+    session = SessionManager(max_retries=2, backoff_factor=0).get_session("test")
+    assert session.get(url(server), timeout=5).status_code == 503
+    assert server.hits["GET"] == 3
+
+
+def test_error_status_of_post_is_not_retried(server):
+    server.status = 503
+    session = SessionManager(max_retries=2, backoff_factor=0).get_session("test")
+    assert session.post(url(server), json={"a": 1}, timeout=5).status_code == 503
+    assert server.hits["POST"] == 1
+
+
+@pytest.mark.parametrize("method", ["GET", "POST"])
+def test_read_timeout_is_not_retried(server, method):
+    server.delay = 0.3
+    session = SessionManager(max_retries=2, backoff_factor=0).get_session("test")
+    with pytest.raises(requests.exceptions.RequestException):
+        session.request(method, url(server), timeout=0.1)
+    time.sleep(0.4)
+    assert server.hits[method] == 1
@@ -0,0 +1,83 @@
+"""Tests for the managed image store: quotas, expiry, holds and ownership of files"""
+
+import os
+import time
+
+import pytest
+
+from utils.image_store import ImageStore, MODE_DISK, MODE_MEMORY
+
+
+@pytest.fixture(params=[MODE_DISK, MODE_MEMORY])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        return ImageStore(root=str(tmp_path), mode=request.param, **kwargs)
+
+    return make
+
+
+def test_put_get_delete(make_store):
+    store = make_store()
+    ref = store.put(b"image bytes", ".png")
+    assert ref.endswith(".png")
+    assert store.get(ref) == b"image bytes"
+    store.delete(ref)
+    assert store.get(ref) is None
+    assert store.stats()["files"] == 0
+
+
+def test_oldest_images_are_evicted_over_quota(make_store):
+    store = make_store(max_files=2, max_bytes=100)
+    refs = [store.put(bytes(10)) for _ in range(3)]
+    assert [store.get(ref) is not None for ref in refs] == [False, True, True]
+    store.put(bytes(95))
+    assert store.stats() == {"mode": store.mode, "files": 1, "bytes": 95, "held": 0}
+
+
+def test_held_images_survive_quota_and_expiry(make_store):
+    store = make_store(max_files=1, max_age=0.05)
+    held = store.put(b"held")
+    store.hold(held)
+    other = store.put(b"other")
+    assert store.get(held) == b"held" and store.get(other) == b"other"
+    time.sleep(0.06)
+    assert store.cleanup() == 1
+    assert store.get(held) == b"held" and store.get(other) is None
+    store.release(held)
+    store.cleanup()
+    assert store.get(held) is None
+
+
+def test_hold_is_counted(make_store):
+    store = make_store(max_age=0)
+    ref = store.put(b"x")
+    store.hold(ref)
+    store.hold(ref)
+    store.release(ref)
+    store.cleanup()
+    assert store.get(ref) == b"x"
+
+
+def test_disk_store_leaves_foreign_files_alone(tmp_path):
+    loose = tmp_path / "photo.jpg"
+    loose.write_bytes(b"tracked image")
+    os.utime(loose, (0, 0))
+    first = ImageStore(root=str(tmp_path), max_age=0)
+    second = ImageStore(root=str(tmp_path), max_age=3600)
+    ref = second.put(b"second's image")
+    first.put(b"first's image")
+    assert first.cleanup() == 1
+    assert loose.read_bytes() == b"tracked image"
+    assert second.get(ref) == b"second's image"
+    assert first.directory != second.directory and os.path.dirname(ref) == second.directory
+
+
+def test_directories_of_stopped_stores_are_removed(tmp_path):
+    stopped = ImageStore(root=str(tmp_path))
+    stopped.put(b"left behind")
+    os.utime(stopped.directory, (0, 0))
+    running = ImageStore(root=str(tmp_path))
+    running.put(b"in use")
+    ImageStore(root=str(tmp_path))
+    assert not os.path.exists(stopped.directory)
+    assert os.path.isdir(running.directory) and running.stats()["files"] == 1
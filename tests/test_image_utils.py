@@ -0,0 +1,102 @@
+"""Tests for image ingestion: validation, orientation and the upload payload"""
+
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from utils.circuit_breaker import CircuitBreakerRegistry
+from utils.image_utils import IngestedImage, prepare_image_for_upload, save_uploaded_image
+from utils.image_store import ImageStore
+from utils.rate_limit import ENDPOINT_GENAI
+
+from conftest import SAMPLE_DIR
+
+
+class FakeUpload:
+    """Stand-in for a Streamlit UploadedFile"""
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+    def getvalue(self):
+        return self.data
+
+
+def open_breakers():
+    breakers = CircuitBreakerRegistry(failure_threshold=1)
+    breakers.get(ENDPOINT_GENAI).record_failure()
+    return breakers
+
+
+def encode(image, image_format="JPEG", **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **params)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def photo_bytes():
+    with open(f"{SAMPLE_DIR}/pizza.jpg", "rb") as image_file:
+        return image_file.read()
+
+
+@pytest.mark.parametrize("name, data, valid", [
+    ("photo.jpg", None, True),
+    ("PHOTO.JPEG", None, True),
+    ("photo.gif", None, False),
+    ("photo.png", b"not an image", False),
+])
+def test_uploads_are_validated(photo_bytes, name, data, valid):
+    ingested = IngestedImage.from_uploaded_file(FakeUpload(name, photo_bytes if data is None else data))
+    assert (ingested is not None) == valid
+    assert IngestedImage.from_uploaded_file(None) is None
+
+
+def test_exif_orientation_is_applied():
+    image = Image.new("RGB", (40, 20), "red")
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    ingested = IngestedImage(encode(image, exif=exif), "rotated.jpg")
+    assert ingested.image.size == (20, 40)
+    assert not ingested._unchanged
+
+
+def test_large_images_are_downscaled_once_per_setting(photo_bytes):
+    ingested = IngestedImage(photo_bytes, "pizza.jpg", max_edge=400)
+    assert max(ingested.image.size) <= 400
+    upload = ingested.prepare_upload(max_edge=128)
+    assert max(upload["image"].size) == 128
+    assert upload["mime_type"] == "image/jpeg"
+    assert Image.open(io.BytesIO(base64.b64decode(upload["base64"]))).size == upload["image"].size
+    assert ingested.prepare_upload(max_edge=128) is upload
+
+
+def test_small_originals_are_sent_as_is():
+    original = encode(Image.linear_gradient("L").resize((48, 48)).convert("RGB"), quality=20, optimize=True)
+    prepared = prepare_image_for_upload(original, max_edge=64, quality=95)
+    assert base64.b64decode(prepared["base64"]) == original
+    assert prepared["stats"]["bytes_saved"] == 0
+    assert prepare_image_for_upload(b"not an image") is None
+
+
+def test_saved_uploads_keep_the_original_bytes(photo_bytes, tmp_path):
+    store = ImageStore(root=str(tmp_path))
+    ref = save_uploaded_image(FakeUpload("pizza.jpg", photo_bytes), store)
+    assert ref.endswith(".jpg") and store.get(ref) == photo_bytes
+    assert IngestedImage.from_path(ref).content_hash == IngestedImage(photo_bytes).content_hash
+    assert save_uploaded_image(FakeUpload("notes.txt", b"text"), store) is None
+
+
+def test_an_upload_is_decoded_once(photo_bytes, make_client, monkeypatch):
+    decodes = []
+    open_image = Image.open
+    monkeypatch.setattr(Image, "open", lambda *args, **kwargs: decodes.append(1) or open_image(*args, **kwargs))
+    ingested = IngestedImage.from_uploaded_file(FakeUpload("meal.jpg", photo_bytes))
+    ingested.prepare_upload()
+    ingested.prepare_upload(max_edge=256)
+    client = make_client(circuit_breakers=open_breakers())
+    assert client.identify_food_in_image(ingested)
+    assert len(decodes) == 1
@@ -0,0 +1,154 @@
+"""Tests for the recognition job queue, its workers and the page polling a job"""
+
+import os
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue, work_jobs, STATUS_DONE, STATUS_FAILED, STATUS_QUEUED
+from utils.request_context import RequestContext
+
+from conftest import ROOT_DIR, SAMPLE_DIR
+
+
+@pytest.fixture
+def queue(tmp_path):
+    job_queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=60, max_attempts=2)
+    yield job_queue
+    job_queue.close()
+
+
+@pytest.fixture(scope="module")
+def image_bytes():
+    with open(f"{SAMPLE_DIR}/apple.jpg", "rb") as image_file:
+        return image_file.read()
+
+
+class FakeClient:
+    def identify_food_in_image(self, image, context=None):
+        return ["apple"]
+
+    def get_online_food_calories(self, food_name):
+        return None, None
+
+    def fetch_nutrition_data_from_nutritionix(self, food_name):
+        return None
+
+
+def test_submit_claim_complete(queue):
+    job_id = queue.submit(b"bytes", "a.jpg", RequestContext(language="zh", session_id="s1"))
+    assert queue.get(job_id)["status"] == STATUS_QUEUED
+    claimed_id, image_bytes, file_name, context = queue.claim()
+    assert (claimed_id, image_bytes, file_name) == (job_id, b"bytes", "a.jpg")
+    assert (context.language, context.session_id) == ("zh", "s1")
+    assert queue.claim() is None
+    queue.complete(job_id, {"food_names": ["apple"], "nutrition": [[{"calories": 95}, "local"]]})
+    job = queue.get(job_id)
+    assert job["status"] == STATUS_DONE and job["attempts"] == 1
+    assert job["result"]["nutrition"] == [[{"calories": 95}, "local"]]
+
+
+def test_jobs_are_claimed_oldest_first(queue):
+    first = queue.submit(b"1")
+    queue.submit(b"2")
+    assert queue.claim()[0] == first
+
+
+def test_expired_lease_is_reclaimed_then_failed(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.05, max_attempts=2)
+    job_id = queue.submit(b"x")
+    assert queue.claim()[0] == job_id
+    assert queue.claim() is None
+    time.sleep(0.06)
+    assert queue.claim()[0] == job_id
+    assert queue.get(job_id)["attempts"] == 2
+    time.sleep(0.06)
+    assert queue.claim() is None
+    job = queue.get(job_id)
+    assert (job["status"], job["error"]) == (STATUS_FAILED, "Worker stopped while running the job")
+    queue.close()
+
+
+def test_finished_jobs_are_purged_after_retention(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), retention=0.05)
+    old = queue.submit(b"x")
+    queue.fail(old, "boom")
+    time.sleep(0.06)
+    queue.complete(queue.submit(b"y"), {})
+    assert queue.get(old) is None
+    queue.close()
+
+
+def test_live_workers_follow_heartbeats(queue):
+    queue.heartbeat("w1")
+    queue.heartbeat("w2")
+    assert queue.live_workers() == 2
+    queue.unregister("w1")
+    assert queue.live_workers() == 1
+    time.sleep(0.06)
+    assert queue.live_workers(timeout=0.05) == 0
+
+
+def test_worker_runs_jobs_and_unregisters(queue, image_bytes):
+    stop_event = threading.Event()
+    worker = threading.Thread(target=work_jobs, args=(FakeClient(), queue, stop_event),
+                              kwargs={"poll_interval": 0.01, "heartbeat_interval": 0.01})
+    worker.start()
+    try:
+        good = queue.submit(image_bytes, "apple.jpg")
+        bad = queue.submit(b"not an image", "bad.jpg")
+        assert queue.wait(good, timeout=10, poll_interval=0.01)["status"] == STATUS_DONE
+        assert queue.wait(bad, timeout=10, poll_interval=0.01)["status"] == STATUS_FAILED
+        assert queue.live_workers() == 1
+    finally:
+        stop_event.set()
+        worker.join(10)
+    assert queue.get(good)["result"]["food_names"] == ["apple"]
+    assert queue.live_workers() == 0
+
+
+@pytest.fixture
+def app_test(queue, monkeypatch):
+    from streamlit.testing.v1 import AppTest
+
+    monkeypatch.setattr(jobs, "_job_queue", queue)
+    monkeypatch.setattr(jobs, "JOB_WORKERS", 0)
+    return AppTest.from_file(os.path.join(ROOT_DIR, "app", "app.py"), default_timeout=60)
+
+
+def test_page_shows_a_finished_job(app_test, queue):
+    job_id = queue.submit(b"x")
+    queue.claim()
+    queue.complete(job_id, {"food_names": ["apple"], "nutrition": [[{"calories": 95}, "Built-in Database"]]})
+    app_test.session_state["pending_job"] = job_id
+    app_test.run()
+    assert app_test.session_state["pending_job"] is None
+    assert app_test.session_state["food_names"] == ["apple"]
+
+
+def test_page_fails_fast_without_workers(app_test, queue):
+    job_id = queue.submit(b"x")
+    app_test.session_state["pending_job"] = job_id
+    started_at = time.time()
+    app_test.run()
+    assert time.time() - started_at < 30
+    assert app_test.session_state["pending_job"] is None
+    assert queue.get(job_id)["status"] == STATUS_FAILED
+    assert any("No recognition worker" in error.value for error in app_test.error)
+
+
+def test_page_polls_a_running_job_without_blocking(app_test, queue):
+    job_id = queue.submit(b"x")
+    queue.claim()
+    app_test.session_state["pending_job"] = job_id
+
+    def finish():
+        time.sleep(1)
+        queue.complete(job_id, {"food_names": ["pizza"], "nutrition": [[None, None]]})
+
+    threading.Thread(target=finish).start()
+    app_test.run()
+    assert queue.get(job_id)["status"] == STATUS_DONE
+    assert app_test.session_state["food_names"] == ["pizza"]
@@ -0,0 +1,160 @@
+"""Tests for the model dispatch strategies and the latency statistics behind the hedge delay"""
+
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+from urllib3.exceptions import MaxRetryError
+
+import utils.model_dispatch as model_dispatch
+from utils.http_session import CancellableRetry
+from utils.model_dispatch import (ModelDispatcher, ModelLatencyStats, dispatch_cancelled,
+                                  STRATEGY_SEQUENTIAL, STRATEGY_HEDGED, STRATEGY_RACE)
+from utils.rate_limit import RateLimiter, ENDPOINT_GENAI, MODE_FAIL_FAST
+
+
+def make_dispatcher(strategy, **settings):
+    return ModelDispatcher(strategy, stats=ModelLatencyStats(**settings))
+
+
+def cancelled_context():
+    """A context in which the running model call has lost its race"""
+    event = threading.Event()
+    event.set()
+    context = contextvars.copy_context()
+    context.run(model_dispatch._cancel_event.set, event)
+    return context
+
+
+def test_sequential_falls_back_in_order():
+    calls = []
+
+    def call(model):
+        calls.append(model)
+        if model == "b":
+            return ["pizza"]
+        raise RuntimeError("down") if model == "a" else AssertionError("not reached")
+
+    assert make_dispatcher(STRATEGY_SEQUENTIAL).dispatch(["a", "b", "c"], call) == ["pizza"]
+    assert calls == ["a", "b"]
+
+
+def test_race_tells_losers_they_lost():
+    loser_checked = threading.Event()
+    seen = []
+
+    def call(model):
+        if model == "fast":
+            return ["salad"]
+        time.sleep(0.2)
+        seen.append(dispatch_cancelled())
+        loser_checked.set()
+        return None
+
+    dispatcher = make_dispatcher(STRATEGY_RACE)
+    assert dispatcher.dispatch(["slow", "fast"], call) == ["salad"]
+    assert loser_checked.wait(5)
+    assert seen == [True]
+    # The loser's give-up is not counted as a failure of its model
+    time.sleep(0.05)
+    assert "slow" not in dispatcher.stats.snapshot()
+    assert dispatcher.stats.snapshot()["fast"]["success"] == 1
+
+
+def test_race_returns_none_when_every_model_fails():
+    assert make_dispatcher(STRATEGY_RACE).dispatch(["a", "b"], lambda model: None) is None
+    assert not dispatch_cancelled()
+
+
+def test_hedge_starts_the_next_model_after_the_delay():
+    started = []
+
+    def call(model):
+        started.append(model)
+        time.sleep(1 if model == "slow" else 0)
+        return [model]
+
+    dispatcher = make_dispatcher(STRATEGY_HEDGED, default_delay=0.05, min_delay=0.01)
+    started_at = time.time()
+    assert dispatcher.dispatch(["slow", "backup"], call) == ["backup"]
+    assert time.time() - started_at < 0.9
+    assert started == ["slow", "backup"]
+
+
+def test_async_race_cancels_losers():
+    cancelled = []
+
+    async def call(model):
+        if model == "fast":
+            return ["rice"]
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+
+    dispatcher = make_dispatcher(STRATEGY_RACE)
+
+    async def race():
+        result = await dispatcher.dispatch_async(["slow", "fast"], call)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(race()) == ["rice"]
+    assert cancelled == ["slow"]
+    # The cancelled loser is not counted as a failure of its model
+    assert set(dispatcher.stats.snapshot()) == {"fast"}
+
+
+def test_hedge_delay_follows_the_p95():
+    stats = ModelLatencyStats(min_samples=5, default_delay=8.0, min_delay=0.5, max_delay=30.0)
+    assert stats.hedge_delay("m") == 8.0
+    for seconds in (1, 1, 1, 1, 2, 100):
+        stats.record("m", seconds, True)
+    stats.record("m", 0.1, False)
+    assert stats.hedge_delay("m") == 30.0
+    assert stats.percentile("m", 50) == 1
+    assert stats.snapshot()["m"] == {"success": 6, "failure": 1, "p50": 1, "p95": 100}
+
+
+def test_snapshot_is_a_copy_taken_under_the_lock():
+    stats = ModelLatencyStats()
+    stats.record("m", 1, True)
+    snapshot = stats.snapshot()
+    snapshot["m"]["success"] = 99
+    assert stats.snapshot()["m"]["success"] == 1
+
+    stop = threading.Event()
+
+    def record():
+        position = 0
+        while not stop.is_set():
+            stats.record(f"model-{position % 50}", 0.1, position % 2 == 0)
+            position += 1
+
+    writer = threading.Thread(target=record)
+    writer.start()
+    try:
+        for _ in range(200):
+            for counts in stats.snapshot().values():
+                assert set(counts) == {"success", "failure", "p50", "p95"}
+    finally:
+        stop.set()
+        writer.join()
+
+
+def test_lost_calls_are_not_retried():
+    retry = CancellableRetry(total=3, read=0)
+    assert retry.increment("POST", "/x", error=ConnectionError("refused")).total == 2
+    with pytest.raises(MaxRetryError):
+        cancelled_context().run(retry.increment, "POST", "/x", error=ConnectionError("refused"))
+
+
+def test_lost_calls_take_no_quota(make_client):
+    limiter = RateLimiter(limits={ENDPOINT_GENAI: (0.001, 1)}, mode=MODE_FAIL_FAST)
+    client = make_client(rate_limiter=limiter)
+    assert cancelled_context().run(client._admit_model_call, "model-a") is None
+    assert limiter.stats()["allowed"] == 0
+    assert client._admit_model_call("model-a") is not None
@@ -0,0 +1,68 @@
+"""Tests for the columnar nutrient table and meal macro totals"""
+
+import pytest
+
+from data.nutrient_table import NutrientTable, convert_unit, macro_row, meal_macro_totals, nutrient_rows
+
+
+def entry(calories, nutrients, name="Food"):
+    return {"calories": calories, "portion": "100g",
+            "details": {"food_name": name, "nutrients": [{"name": n, "value": v, "unit": u} for n, v, u in nutrients]}}
+
+
+FOODS = {
+    "tofu": entry(144, [("Protein", 15.8, "g"), ("Calcium", 350, "mg"), ("Fat", 8.7, "g")], "Firm Tofu"),
+    "juice": entry(45, [("Carbohydrates", 10.4, "g"), ("Calcium", 0.011, "g")], "Orange Juice"),
+}
+
+
+@pytest.fixture
+def table():
+    return NutrientTable(FOODS)
+
+
+def test_records_read_like_the_source_entries(table):
+    record = table.food_info("tofu")
+    assert dict(record) == {"calories": 144, "portion": "100g", "details": FOODS["tofu"]["details"]}
+    assert record is table.food_info("tofu")
+    assert table.food_info("missing") is None
+    assert "juice" in table and len(table) == 2
+
+
+def test_values_are_stored_in_the_first_unit_seen(table):
+    calcium = table.nutrient_id("Calcium")
+    assert table.units[calcium] == "mg"
+    assert table.values[table.food_id("juice"), calcium] == pytest.approx(11)
+    assert table.food_info("juice")["details"]["nutrients"][1] == {"name": "Calcium", "value": 11.0, "unit": "mg"}
+
+
+def test_unit_conversion():
+    assert convert_unit(1500, "mg", "g") == pytest.approx(1.5)
+    assert convert_unit(2, "g", "g") == 2
+    with pytest.raises(ValueError):
+        convert_unit(1, "kcal", "g")
+
+
+def test_macro_totals_skip_missing_nutrients(table):
+    tofu, juice = table.food_id("tofu"), table.food_id("juice")
+    assert list(table.macro_totals([tofu, tofu, juice])) == pytest.approx([31.6, 17.4, 10.4])
+    assert list(table.macro_totals([])) == [0, 0, 0]
+
+
+def test_meal_totals_mix_table_rows_and_online_results(table):
+    nutritionix = {"details": {"nutrients": [{"name": "Protein", "value": 2}, {"name": "Total Fat", "value": 1}]}}
+    usda = {"details": {"nutrients": [{"nutrientName": "Carbohydrate, by difference", "value": 5},
+                                      {"nutrientName": "Total lipid (fat)", "value": 3}]}}
+    assert list(macro_row(usda)) == [0, 3, 5]
+    totals = meal_macro_totals([table.food_info("tofu"), nutritionix, None, usda, table.food_info("juice")])
+    assert list(totals) == pytest.approx([17.8, 12.7, 15.4])
+
+
+def test_nutrient_rows_come_from_the_columns_or_the_online_lists(table, monkeypatch):
+    record = table.food_info("juice")
+    monkeypatch.setattr(table, "build_details", None)
+    assert nutrient_rows(record) == [("Carbohydrates", 10.4, "g"), ("Calcium", 11.0, "mg")]
+    usda = {"details": {"nutrients": [{"nutrientName": "Protein", "value": 2, "unitName": "G"},
+                                      {"nutrientName": "Iron", "value": None, "unitName": "MG"}]}}
+    assert nutrient_rows(usda) == [("Protein", 2, "G")]
+    assert nutrient_rows(None) == [] and nutrient_rows({"details": {}}) == []
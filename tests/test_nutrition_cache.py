@@ -0,0 +1,135 @@
+"""Tests for the nutrition lookup cache and the client's online lookups through it"""
+
+import time
+
+import pytest
+
+import utils.api_client as api_client
+from utils.api_client import USDA_SOURCE, NUTRITIONIX_SOURCE
+from utils.cache import MISSING
+from utils.nutrition_cache import NutritionCache, make_nutrition_key
+
+from conftest import FakeResponse, usda_payload
+
+
+class InlineExecutor:
+    """Runs background refreshes synchronously"""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def test_key_normalizes_case_and_whitespace():
+    assert make_nutrition_key("  Fried   Rice ", "X") == make_nutrition_key("fried rice", "X")
+
+
+def test_fetches_once_then_serves_from_cache():
+    cache = NutritionCache(memory_size=8)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {"calories": 100}, "USDA"
+
+    assert cache.get_or_fetch("k", fetch) == ({"calories": 100}, "USDA")
+    assert cache.get_or_fetch("k", fetch) == ({"calories": 100}, "USDA")
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_miss_is_cached_for_the_negative_ttl_only():
+    cache = NutritionCache(memory_size=8, negative_ttl=0.05)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return None, None
+
+    assert cache.get_or_fetch("k", fetch) == (None, None)
+    assert cache.get_or_fetch("k", fetch) == (None, None)
+    assert len(calls) == 1
+    time.sleep(0.06)
+    cache.get_or_fetch("k", fetch)
+    assert len(calls) == 2
+
+
+def test_stale_entry_is_served_and_refreshed():
+    cache = NutritionCache(memory_size=8, ttl=0.01, stale_ttl=60, executor=InlineExecutor())
+    cache.set("k", {"calories": 1}, "old")
+    time.sleep(0.02)
+    assert cache.get_or_fetch("k", lambda: ({"calories": 2}, "new")) == ({"calories": 1}, "old")
+    assert cache.get_or_fetch("k", lambda: ({"calories": 3}, "newer")) == ({"calories": 2}, "new")
+    assert cache.stats()["refreshes"] == 1
+
+
+def test_failed_refresh_keeps_the_stale_entry():
+    cache = NutritionCache(memory_size=8, ttl=0.01, stale_ttl=60, executor=InlineExecutor())
+    cache.set("k", {"calories": 1}, "old")
+    time.sleep(0.02)
+
+    def fetch():
+        raise TimeoutError("slow")
+
+    assert cache.get_or_fetch("k", fetch) == ({"calories": 1}, "old")
+    assert cache._lookup("k")["source"] == "old"
+
+
+def test_disk_tier_is_shared(tmp_path):
+    db_path = str(tmp_path / "nutrition.sqlite3")
+    NutritionCache(memory_size=8, db_path=db_path).set("k", {"calories": 5}, "USDA")
+    assert NutritionCache(memory_size=8, db_path=db_path).get_or_fetch("k", lambda: pytest.fail("fetched")) == (
+        {"calories": 5}, "USDA")
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def usda(monkeypatch):
+    def install(*responses):
+        session = FakeSession(responses)
+        monkeypatch.setattr(api_client, "get_session", lambda host: session)
+        return session
+
+    return install
+
+
+def test_usda_answer_is_cached(make_client, usda):
+    client = make_client()
+    session = usda(FakeResponse(200, usda_payload(300)))
+    info, source = client.get_online_food_calories("pizza")
+    assert (info["calories"], source) == (300, USDA_SOURCE)
+    assert client.get_online_food_calories("Pizza")[0]["calories"] == 300
+    assert session.calls == 1
+
+
+@pytest.mark.parametrize("failure", [FakeResponse(503), FakeResponse(429), TimeoutError("read timed out")])
+def test_transient_usda_failure_returns_an_uncached_estimate(make_client, usda, failure):
+    client = make_client()
+    usda(failure, FakeResponse(200, usda_payload(300)))
+    info, source = client.get_online_food_calories("pizza")
+    assert source == NUTRITIONIX_SOURCE
+    key = make_nutrition_key("pizza", api_client.USDA_DATA_TYPE)
+    assert client.nutrition_cache._lookup(key) is MISSING
+    # The next lookup asks USDA again and gets the real answer
+    assert client.get_online_food_calories("pizza") == (client.nutrition_cache._lookup(key)["info"], USDA_SOURCE)
+
+
+def test_usda_no_match_is_negatively_cached_but_estimate_is_not(make_client, usda):
+    client = make_client()
+    session = usda(FakeResponse(200, {"foods": []}))
+    assert client.get_online_food_calories("zzfood")[1] == NUTRITIONIX_SOURCE
+    assert client.get_online_food_calories("zzfood")[1] == NUTRITIONIX_SOURCE
+    assert session.calls == 1
+    entry = client.nutrition_cache._lookup(make_nutrition_key("zzfood", api_client.USDA_DATA_TYPE))
+    assert entry["info"] is None
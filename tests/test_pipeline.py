@@ -0,0 +1,67 @@
+"""Tests for the concurrent nutrition lookups of the recognition pipeline"""
+
+import threading
+import time
+
+from pipeline import get_source_label, lookup_nutrition_for_foods, build_result_record
+from utils.rate_limit import rate_limit_session, current_rate_limit_session
+
+
+class SlowClient:
+    """Answers online lookups after a per-food delay, recording where each call ran"""
+
+    def __init__(self, delays, failing=()):
+        self.delays = delays
+        self.failing = failing
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def get_online_food_calories(self, food_name):
+        with self.lock:
+            self.sessions.append(current_rate_limit_session())
+        time.sleep(self.delays.get(food_name, 0))
+        if food_name in self.failing:
+            raise ConnectionError("offline")
+        return {"calories": len(food_name)}, "USDA"
+
+    def fetch_nutrition_data_from_nutritionix(self, food_name):
+        return None
+
+
+def test_lookups_run_concurrently_and_keep_their_order():
+    foods = ["pizza", "salad", "rice", "soup"]
+    client = SlowClient({food: 0.3 for food in foods})
+    started_at = time.time()
+    results = lookup_nutrition_for_foods(client, foods, deadline=5)
+    assert time.time() - started_at < 0.9
+    assert results == [({"calories": len(food)}, "USDA") for food in foods]
+
+
+def test_lookups_past_the_deadline_fall_back_to_the_local_table():
+    client = SlowClient({"apple": 2})
+    started_at = time.time()
+    results = lookup_nutrition_for_foods(client, ["pizza", "apple"], language="zh", deadline=0.2)
+    assert time.time() - started_at < 1.5
+    assert results[0] == ({"calories": 5}, "USDA")
+    assert results[1][0]["calories"] == 95 and results[1][1] == get_source_label("local", "zh")
+
+
+def test_failed_online_lookups_fall_back_and_unknown_foods_stay_empty():
+    client = SlowClient({}, failing=("apple", "zz unknown"))
+    assert lookup_nutrition_for_foods(client, ["apple", "zz unknown"])[1] == (None, None)
+    assert lookup_nutrition_for_foods(client, ["apple"])[0][1] == get_source_label("local")
+
+
+def test_lookups_run_in_the_callers_session():
+    client = SlowClient({})
+    with rate_limit_session("session-1"):
+        lookup_nutrition_for_foods(client, ["pizza", "rice"])
+    assert client.sessions == ["session-1", "session-1"]
+
+
+def test_result_record_totals_found_foods_only():
+    record = build_result_record(["apple", "zz"], [({"calories": 95, "portion": "1 medium"}, "local"), (None, None)],
+                                 time.time())
+    assert record["calories"] == [95.0, None]
+    assert record["total_calories"] == 95.0
+    assert record["sources"] == ["local", None] and record["error"] is None
@@ -0,0 +1,136 @@
+"""Tests for outbound rate limiting: token buckets, admission order and flagging rate-limited results"""
+
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import utils.api_client as api_client
+from pipeline import get_source_label, recognize_image, resolve_food_nutrition
+from utils.api_client import USDA_SOURCE
+from utils.circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from utils.image_utils import IngestedImage
+from utils.rate_limit import (RateLimiter, RateLimitExceeded, track_rate_limits, parse_retry_after,
+                              ENDPOINT_GENAI, ENDPOINT_USDA, MODE_FAIL_FAST)
+
+from conftest import FakeResponse, SAMPLE_DIR, usda_payload
+
+# A quota with no tokens left: every call is refused
+EXHAUSTED = (0.001, 0)
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return self.response
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        raise AssertionError("no model call should be made")
+
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = FakeSession(FakeResponse(200, usda_payload(250)))
+    monkeypatch.setattr(api_client, "get_session", lambda host: fake)
+    return fake
+
+
+@pytest.fixture
+def ingested():
+    with open(f"{SAMPLE_DIR}/pizza.jpg", "rb") as image_file:
+        return IngestedImage(image_file.read(), "photo.jpg")
+
+
+def open_breakers(**settings):
+    breakers = CircuitBreakerRegistry(failure_threshold=1, **settings)
+    for endpoint in (ENDPOINT_GENAI, ENDPOINT_USDA):
+        breakers.get(endpoint).record_failure()
+    return breakers
+
+
+def test_fail_fast_bucket_allows_the_burst_then_refuses():
+    limiter = RateLimiter(limits={"api": (0.001, 2)}, mode=MODE_FAIL_FAST)
+    limiter.acquire("api")
+    limiter.acquire("api")
+    with pytest.raises(RateLimitExceeded) as refused:
+        limiter.acquire("api")
+    assert refused.value.retry_in > 0
+    limiter.acquire("unlisted")
+    assert limiter.stats() == {"mode": "fail_fast", "allowed": 2, "rejected": 1}
+
+
+def test_retry_after_blocks_the_bucket():
+    limiter = RateLimiter(limits={"api": (100, 100)}, mode=MODE_FAIL_FAST)
+    limiter.penalize("api", parse_retry_after("5"))
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("api")
+
+
+def test_tracker_collects_refusals_from_worker_threads():
+    limiter = RateLimiter(limits={ENDPOINT_USDA: EXHAUSTED}, mode=MODE_FAIL_FAST)
+
+    def call():
+        with pytest.raises(RateLimitExceeded):
+            limiter.acquire(ENDPOINT_USDA)
+
+    with track_rate_limits() as limited:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(contextvars.copy_context().run, call).result()
+    assert limited == {ENDPOINT_USDA}
+    # Outside a tracker refusals are only counted
+    call()
+    assert limited == {ENDPOINT_USDA}
+
+
+def test_open_circuit_is_checked_before_the_quota(make_client):
+    limiter = RateLimiter(limits={ENDPOINT_GENAI: (0.001, 1), ENDPOINT_USDA: (0.001, 1)}, mode=MODE_FAIL_FAST)
+    client = make_client(rate_limiter=limiter, circuit_breakers=open_breakers())
+    assert client._admit_model_call("model-a") is None
+    with pytest.raises(CircuitOpenError):
+        client._admit_usda_call()
+    # No token was spent on the refused calls
+    assert limiter.stats()["allowed"] == 0
+    limiter.acquire(ENDPOINT_GENAI)
+    limiter.acquire(ENDPOINT_USDA)
+
+
+def test_refused_quota_gives_back_the_probe_slot(make_client):
+    breakers = open_breakers(recovery_timeout=0)
+    limiter = RateLimiter(limits={ENDPOINT_GENAI: EXHAUSTED, ENDPOINT_USDA: EXHAUSTED}, mode=MODE_FAIL_FAST)
+    client = make_client(rate_limiter=limiter, circuit_breakers=breakers)
+    assert client._admit_model_call("model-a") is None
+    with pytest.raises(RateLimitExceeded):
+        client._admit_usda_call()
+    assert breakers.get(ENDPOINT_GENAI).allow_request()
+    assert breakers.get(ENDPOINT_USDA).allow_request()
+
+
+def test_over_quota_recognition_is_flagged_in_the_source(make_client, session, ingested):
+    client = make_client(rate_limiter=RateLimiter(limits={ENDPOINT_GENAI: EXHAUSTED}, mode=MODE_FAIL_FAST))
+    food_names, nutrition = recognize_image(client, ingested)
+    assert food_names
+    label = get_source_label(ENDPOINT_GENAI)
+    assert all(source == f"{USDA_SOURCE} ({label})" for _, source in nutrition)
+
+
+def test_over_quota_nutrition_lookup_is_flagged_in_the_source(make_client, session):
+    client = make_client(rate_limiter=RateLimiter(limits={ENDPOINT_USDA: EXHAUSTED}, mode=MODE_FAIL_FAST))
+    info, source = resolve_food_nutrition(client, "apple", "zh")
+    assert info["calories"] == 95
+    assert source == f"{get_source_label('local', 'zh')} ({get_source_label(ENDPOINT_USDA, 'zh')})"
+    assert session.calls == 0
+
+
+def test_answers_within_quota_are_not_flagged(make_client, session):
+    client = make_client(rate_limiter=RateLimiter(limits={ENDPOINT_USDA: (1, 5)}, mode=MODE_FAIL_FAST))
+    assert resolve_food_nutrition(client, "pizza")[1] == USDA_SOURCE
+
+
+def test_model_calls_are_unlimited_and_queued_by_default():
+    limiter = RateLimiter()
+    assert limiter.mode == "queued"
+    assert ENDPOINT_GENAI not in limiter._buckets and ENDPOINT_USDA in limiter._buckets
@@ -0,0 +1,182 @@
+"""Tests for the recognition result cache and its perceptual-hash index"""
+
+import random
+import time
+
+from PIL import Image
+
+import utils.api_client as api_client
+from utils.cache import SQLiteCache
+from utils.image_utils import IngestedImage
+from utils.perceptual_hash import BKTree, dhash, hamming_distance
+from utils.recognition_cache import RecognitionCache, make_recognition_key, make_recognition_scope
+from utils.request_context import RequestContext
+
+from conftest import FakeResponse, SAMPLE_DIR
+
+SCOPE = make_recognition_scope("en", ["model-a"])
+
+
+class FakeModelSession:
+    """Answers every model request with the same food"""
+
+    def __init__(self, food):
+        self.food = food
+        self.posts = 0
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.posts += 1
+        return FakeResponse(200, {"choices": [{"message": {"content": self.food}}]})
+
+
+def phash_rows(cache):
+    return sorted(cache.disk.execute("SELECT key, phash FROM recognition_phash"))
+
+
+def test_dhash_matches_rescaled_copies_only():
+    image = Image.open(f"{SAMPLE_DIR}/pizza.jpg")
+    rescaled = image.resize((image.width // 2, image.height // 2))
+    other = Image.open(f"{SAMPLE_DIR}/apple.jpg")
+    assert hamming_distance(dhash(image), dhash(rescaled)) <= 5
+    assert hamming_distance(dhash(image), dhash(other)) > 5
+
+
+def test_bk_tree_search_matches_a_linear_scan():
+    rng = random.Random(7)
+    hashes = [rng.getrandbits(64) for _ in range(300)]
+    tree = BKTree()
+    for position, value in enumerate(hashes):
+        tree.add(value, position)
+    query = hashes[42] ^ 0b1011
+    expected = sorted(hamming_distance(query, value) for value in hashes if hamming_distance(query, value) <= 20)
+    assert [distance for distance, _ in tree.search(query, 20)] == expected
+    assert tree.search(query, 3)[0] == (3, 42)
+
+
+def test_bk_tree_dedupes_and_removes():
+    tree = BKTree()
+    tree.add(0b1111, "a")
+    tree.add(0b1111, "a")
+    tree.add(0b1111, "b")
+    assert len(tree) == 2
+    assert tree.search(0b1111, 0) == [(0, "b"), (0, "a")]
+    assert tree.remove(0b1111, "a") and not tree.remove(0b1111, "a")
+    assert tree.search(0b1111, 0) == [(0, "b")]
+    assert len(tree) == 1
+
+
+def test_bk_tree_is_rebuilt_once_mostly_empty():
+    rng = random.Random(3)
+    hashes = [rng.getrandbits(64) for _ in range(200)]
+    tree = BKTree()
+    for position, value in enumerate(hashes):
+        tree.add(value, position)
+    for position, value in enumerate(hashes[:150]):
+        tree.remove(value, position)
+    assert len(tree) == 50 and tree._nodes < 200
+    assert [item for _, item in tree.search(hashes[180], 0)] == [180]
+    assert tree.search(hashes[10], 0) == []
+
+
+def test_exact_hits_and_misses():
+    cache = RecognitionCache(memory_size=8)
+    key = make_recognition_key("abc", "en", ["model-a"])
+    assert cache.get(key) is None
+    cache.set(key, ["pizza"])
+    assert cache.get(key) == ["pizza"]
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_near_duplicate_lookup_within_distance():
+    cache = RecognitionCache(memory_size=8, max_distance=2)
+    cache.set("k1", ["salad"], scope=SCOPE, phash=0b1100)
+    assert cache.find_similar(SCOPE, 0b1101) == (["salad"], 1)
+    assert cache.find_similar(SCOPE, 0b0011) == (None, None)
+    assert cache.find_similar("zh:model-a", 0b1100) == (None, None)
+
+
+def test_memory_eviction_removes_the_hash():
+    cache = RecognitionCache(memory_size=2, max_distance=0)
+    for position in range(5):
+        cache.set(f"k{position}", ["food"], scope=SCOPE, phash=1 << position)
+    assert cache.stats()["indexed_images"] == 2
+    assert cache.find_similar(SCOPE, 1) == (None, None)
+    assert cache.find_similar(SCOPE, 1 << 4) == (["food"], 0)
+
+
+def test_re_adding_a_key_does_not_duplicate_it():
+    cache = RecognitionCache(memory_size=8)
+    cache.set("k", ["rice"], scope=SCOPE, phash=0xFF)
+    cache.set("k", ["rice"], scope=SCOPE, phash=0xFF)
+    assert cache.stats()["indexed_images"] == 1
+    cache.set("k", ["rice"], scope=SCOPE, phash=0xFF00)
+    assert cache.stats()["indexed_images"] == 1
+    assert cache.find_similar(SCOPE, 0xFF) == (None, None)
+
+
+def test_disk_eviction_removes_persisted_hashes(tmp_path):
+    db_path = str(tmp_path / "recognition.sqlite3")
+    cache = RecognitionCache(memory_size=8, db_path=db_path, max_entries=2)
+    for position in range(4):
+        cache.set(f"k{position}", ["food"], scope=SCOPE, phash=1 << position)
+    assert [key for key, _ in phash_rows(cache)] == ["k2", "k3"]
+    assert cache.stats()["indexed_images"] == 2
+    # A new process rebuilds the same index from the file
+    reloaded = RecognitionCache(memory_size=8, db_path=db_path, max_entries=2)
+    assert reloaded.stats()["indexed_images"] == 2
+    assert reloaded.find_similar(SCOPE, 1 << 3) == (["food"], 0)
+
+
+def test_large_disk_tiers_evict_periodically_through_indexes(tmp_path, monkeypatch):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=10000)
+    passes = []
+    evict = cache._evict
+    monkeypatch.setattr(cache, "_evict", lambda: passes.append(1) or evict())
+    for position in range(25):
+        cache.set(f"k{position}", position)
+    assert len(passes) == 2
+    plan = cache.execute(f"EXPLAIN QUERY PLAN SELECT key FROM {cache.table} "
+                         "WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+    assert any("expires_idx" in row[-1] for row in plan)
+    cache.close()
+
+
+def test_stale_keys_are_forgotten_when_found(tmp_path):
+    db_path = str(tmp_path / "recognition.sqlite3")
+    cache = RecognitionCache(memory_size=1, db_path=db_path, max_distance=4)
+    cache.set("old", ["soup"], scope=SCOPE, phash=0b1)
+    cache.set("new", ["tea"], scope=SCOPE, phash=0b11)
+    # Another process sharing the file evicts "old", which already left this process's memory tier
+    RecognitionCache(memory_size=1, db_path=db_path).disk.delete("old")
+    assert cache.find_similar(SCOPE, 0b1) == (["tea"], 1)
+    assert cache.stats()["indexed_images"] == 1
+    assert [key for key, _ in phash_rows(cache)] == ["new"]
+
+
+def test_keys_depend_on_content_language_and_models():
+    key = make_recognition_key("abc", "en", ["model-a"])
+    assert make_recognition_key("abc", "en", ["model-a"]) == key
+    assert len({key, make_recognition_key("abd", "en", ["model-a"]), make_recognition_key("abc", "zh", ["model-a"]),
+                make_recognition_key("abc", "en", ["model-b"])}) == 4
+
+
+def test_results_persist_and_expire(tmp_path):
+    db_path = str(tmp_path / "recognition.sqlite3")
+    RecognitionCache(memory_size=8, db_path=db_path).set("k", ["noodles", "egg"])
+    assert RecognitionCache(memory_size=8, db_path=db_path).get("k") == ["noodles", "egg"]
+    cache = RecognitionCache(memory_size=8, ttl=0.05)
+    cache.set("k", "tea")
+    time.sleep(0.06)
+    assert cache.get("k") is None
+
+
+def test_identical_uploads_reuse_the_recognition(make_client, monkeypatch):
+    session = FakeModelSession("pizza")
+    monkeypatch.setattr(api_client, "get_session", lambda host: session)
+    client = make_client(models=["model-a"])
+    with open(f"{SAMPLE_DIR}/pizza.jpg", "rb") as image_file:
+        image_bytes = image_file.read()
+    assert client.identify_food_in_image(IngestedImage(image_bytes, "first.jpg")) == "pizza"
+    assert client.identify_food_in_image(IngestedImage(image_bytes, "second.jpg")) == "pizza"
+    assert client.identify_food_in_image(IngestedImage(image_bytes, "third.jpg"), RequestContext("zh")) == "披萨"
+    assert session.posts == 2
@@ -0,0 +1,55 @@
+"""Tests for using the client outside Streamlit: request contexts, pickling and the prompt language"""
+
+import os
+import pickle
+import subprocess
+import sys
+
+import utils.api_client as api_client
+from utils.api_client import GenAIClient, PROMPT_ZH
+from utils.batch_recognition import BatchSizer
+from utils.request_context import RequestContext, DEFAULT_CONTEXT
+
+from conftest import FakeResponse, ROOT_DIR, SAMPLE_DIR
+
+
+class RecordingSession:
+    def __init__(self, food):
+        self.food = food
+        self.prompts = []
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.prompts.append(json["messages"][0]["content"][0]["text"])
+        return FakeResponse(200, {"choices": [{"message": {"content": self.food}}]})
+
+
+def test_context_defaults_and_pickles():
+    assert (DEFAULT_CONTEXT.language, DEFAULT_CONTEXT.session_id) == ("en", None)
+    assert RequestContext(language="fr").language == "en"
+    context = pickle.loads(pickle.dumps(RequestContext(language="zh", session_id="abc")))
+    assert (context.language, context.session_id) == ("zh", "abc")
+
+
+def test_client_pickles_its_settings_but_not_its_state():
+    client = GenAIClient("key", models=["model-a"], dispatch_strategy="race")
+    client.upload_max_edge = 512
+    copy = pickle.loads(pickle.dumps(client))
+    assert (copy.api_key, copy.models, copy.dispatcher.strategy, copy.upload_max_edge) == ("key", ["model-a"], "race", 512)
+    assert copy.recognition_cache is client.recognition_cache
+    # The batch size goes back through the sizer, which caps it at what one answer can hold
+    client.batch_sizer.max_images = 10 ** 6
+    assert pickle.loads(pickle.dumps(client)).batch_sizer.max_images == BatchSizer(max_images=10 ** 6).max_images < 10 ** 6
+
+
+def test_context_language_picks_the_prompt_and_names(make_client, monkeypatch):
+    session = RecordingSession("pizza")
+    monkeypatch.setattr(api_client, "get_session", lambda host: session)
+    client = make_client(models=["model-a"])
+    assert client.identify_food_in_image(f"{SAMPLE_DIR}/pizza.jpg", RequestContext(language="zh")) == "披萨"
+    assert session.prompts == [PROMPT_ZH]
+
+
+def test_client_and_pipeline_import_without_streamlit():
+    script = ("import sys, pipeline, utils.api_client, utils.async_api_client; "
+              "assert 'streamlit' not in sys.modules")
+    subprocess.run([sys.executable, "-c", script], cwd=os.path.join(ROOT_DIR, "app"), check=True)
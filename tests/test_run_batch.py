@@ -0,0 +1,119 @@
+"""Tests for the headless batch script: manifests, checkpoint resume and failure handling"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+import run_batch
+from run_batch import Checkpoint, JsonlResultWriter, iter_image_paths
+
+from conftest import SAMPLE_DIR
+
+
+class FakeClient:
+    """Recognizes every image as an apple, failing for paths containing "bad" while it is told to"""
+
+    def __init__(self):
+        self.seen = []
+        self.fail_bad = True
+
+    def identify_food_in_images(self, images, context=None):
+        self.seen.extend(image.path for image in images)
+        return [RuntimeError("model unavailable") if self.fail_bad and "bad" in image.path else ["apple"]
+                for image in images]
+
+    def get_online_food_calories(self, food_name):
+        return None, None
+
+    def fetch_nutrition_data_from_nutritionix(self, food_name):
+        return None
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+    images = tmp_path / "images"
+    (images / "sub").mkdir(parents=True)
+    for name in ["a.jpg", "b.jpg", "sub/c.jpg", "sub/bad.jpg"]:
+        shutil.copy(f"{SAMPLE_DIR}/apple.jpg", images / name)
+    (images / "notes.txt").write_text("not an image")
+    return images
+
+
+def run(client, source, tmp_path, **kwargs):
+    writer = JsonlResultWriter(str(tmp_path / "out.jsonl"))
+    error_writer = JsonlResultWriter(str(tmp_path / "out.errors.jsonl"), mode="w")
+    checkpoint = Checkpoint(str(tmp_path / "out.checkpoint"))
+    try:
+        return run_batch.run_batch(client, str(source), writer, checkpoint, workers=2, chunk_size=2,
+                                   flush_every=1, error_writer=error_writer, **kwargs)
+    finally:
+        writer.close()
+        error_writer.close()
+        checkpoint.close()
+
+
+def read_records(tmp_path, name="out.jsonl"):
+    with open(tmp_path / name, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_directory_is_walked_in_sorted_order(image_dir):
+    assert [path[len(str(image_dir)) + 1:] for path in iter_image_paths(str(image_dir))] == [
+        "a.jpg", "b.jpg", "sub/bad.jpg", "sub/c.jpg"]
+
+
+def test_manifests_resolve_relative_paths(tmp_path):
+    (tmp_path / "list.txt").write_text("# comment\na.jpg\n\n/abs/b.jpg\n")
+    (tmp_path / "list.csv").write_text("path,label\na.jpg,x\n")
+    (tmp_path / "list.jsonl").write_text('{"path": "a.jpg"}\n\n')
+    assert list(iter_image_paths(str(tmp_path / "list.txt"))) == [str(tmp_path / "a.jpg"), "/abs/b.jpg"]
+    assert list(iter_image_paths(str(tmp_path / "list.csv"))) == [str(tmp_path / "a.jpg")]
+    assert list(iter_image_paths(str(tmp_path / "list.jsonl"))) == [str(tmp_path / "a.jpg")]
+
+
+def test_results_are_written_and_failures_not_checkpointed(image_dir, tmp_path):
+    counts = run(FakeClient(), image_dir, tmp_path)
+    assert counts == {"processed": 4, "failed": 1, "skipped": 0}
+    records = {record["path"].rsplit("/", 1)[1]: record for record in read_records(tmp_path)}
+    assert sorted(records) == ["a.jpg", "b.jpg", "c.jpg"]
+    assert records["a.jpg"]["foods"] == ["apple"] and records["a.jpg"]["calories"][0] > 0
+    [failure] = read_records(tmp_path, "out.errors.jsonl")
+    assert failure["path"].endswith("bad.jpg") and failure["error"] == "model unavailable"
+    done = (tmp_path / "out.checkpoint").read_text().split()
+    assert sorted(path.rsplit("/", 1)[1] for path in done) == ["a.jpg", "b.jpg", "c.jpg"]
+
+
+def test_resume_skips_done_images_and_retries_failures(image_dir, tmp_path):
+    run(FakeClient(), image_dir, tmp_path)
+    client = FakeClient()
+    client.fail_bad = False
+    counts = run(client, image_dir, tmp_path)
+    assert counts == {"processed": 1, "failed": 0, "skipped": 3}
+    assert [path.rsplit("/", 1)[1] for path in client.seen] == ["bad.jpg"]
+    assert len((tmp_path / "out.checkpoint").read_text().split()) == 4
+    # Each image has exactly one row, and the errors file only lists this run's failures
+    paths = [record["path"] for record in read_records(tmp_path)]
+    assert len(paths) == len(set(paths)) == 4
+    assert read_records(tmp_path, "out.errors.jsonl") == []
+
+
+def test_importing_the_script_leaves_the_environment_alone(monkeypatch):
+    import importlib
+    monkeypatch.delenv("FOOD_RATE_LIMIT_MODE", raising=False)
+    importlib.reload(run_batch)
+    assert "FOOD_RATE_LIMIT_MODE" not in os.environ
+
+
+def test_missing_source_fails_before_starting(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        run(FakeClient(), tmp_path / "missing.txt", tmp_path)
+
+
+def test_reader_error_is_raised_after_processing_what_was_read(image_dir, tmp_path):
+    manifest = tmp_path / "list.jsonl"
+    manifest.write_text(json.dumps({"path": str(image_dir / "a.jpg")}) + "\nnot json\n")
+    with pytest.raises(ValueError):
+        run(FakeClient(), manifest, tmp_path)
+    assert [record["foods"] for record in read_records(tmp_path)] == [["apple"]]
@@ -0,0 +1,156 @@
+"""Tests for the ASGI recognition service: routing, multipart parsing, admission and NDJSON streaming"""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import service
+from service import RecognitionService, parse_multipart, HTTPError
+
+from conftest import SAMPLE_DIR
+
+BOUNDARY = "----test-boundary"
+
+
+def multipart(files):
+    body = b""
+    for filename, data in files:
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"{filename}\"\r\n"
+                 "Content-Type: application/octet-stream\r\n\r\n").encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def call(app, method, path, body=b"", headers=(), chunk_size=None):
+    """Run one request through the ASGI app and return the messages it sent"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] if chunk_size else [body]
+    incoming = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": [(b"content-length", str(len(body)).encode())] + list(headers)}
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def response(sent):
+    starts = [message for message in sent if message["type"] == "http.response.start"]
+    assert len(starts) == 1
+    assert not sent[-1].get("more_body")
+    return starts[0]["status"], b"".join(message.get("body", b"") for message in sent[1:])
+
+
+@pytest.fixture
+def app(monkeypatch):
+    calls = []
+
+    def analyze_images(client, images, context=None):
+        calls.append([image.name if image else None for image in images])
+        if any(image is not None and image.name.startswith("fail") for image in images):
+            raise RuntimeError("model crashed")
+        return [{"foods": ["pizza"], "error": None} if image else {"foods": [], "error": "Invalid image"}
+                for image in images]
+
+    monkeypatch.setattr(service, "analyze_images", analyze_images)
+    recognition_service = RecognitionService(workers=1, queue_size=7, max_body_bytes=1024 * 1024)
+    recognition_service.client = object()
+    recognition_service.executor = ThreadPoolExecutor(max_workers=1)
+    recognition_service.calls = calls
+    yield recognition_service
+    recognition_service.executor.shutdown()
+
+
+@pytest.fixture(scope="module")
+def image_bytes():
+    with open(f"{SAMPLE_DIR}/apple.jpg", "rb") as image_file:
+        return image_file.read()
+
+
+def test_multipart_parser_keeps_binary_bodies_intact():
+    payload = bytes(range(256)) * 4 + b"\r\n--" + BOUNDARY.encode() + b"x\r\n\r\n\x00"
+    files = parse_multipart(f"multipart/form-data; boundary={BOUNDARY}",
+                            multipart([("../a.jpg", payload), ("b.png", b"")]))
+    assert files == [("a.jpg", payload), ("b.png", b"")]
+
+
+def test_multipart_parser_rejects_bodies_without_parts():
+    with pytest.raises(HTTPError):
+        parse_multipart("multipart/form-data", b"not multipart")
+
+
+def test_routing_errors(app):
+    assert response(call(app, "GET", "/health"))[0] == 200
+    assert response(call(app, "GET", "/nope"))[0] == 404
+    sent = call(app, "GET", "/recognize")
+    assert response(sent)[0] == 405 and (b"allow", b"POST") in sent[0]["headers"]
+
+
+def test_recognize_raw_body(app, image_bytes):
+    status, body = response(call(app, "POST", "/recognize", image_bytes, chunk_size=4096))
+    assert status == 200
+    assert json.loads(body) == {"filename": "image.jpg", "foods": ["pizza"], "error": None}
+
+
+def test_oversized_body_is_refused(app):
+    app.max_body_bytes = 10
+    assert response(call(app, "POST", "/recognize", b"x" * 11))[0] == 413
+
+
+def test_full_service_answers_429(app, image_bytes):
+    app.admission.try_acquire(app.admission.capacity)
+    sent = call(app, "POST", "/recognize", image_bytes)
+    assert response(sent)[0] == 429 and (b"retry-after", b"1") in sent[0]["headers"]
+
+
+def test_batch_streams_one_line_per_image(app, image_bytes, monkeypatch):
+    monkeypatch.setattr(service, "BATCH_MAX_IMAGES", 2)
+    files = [(f"{name}.jpg", image_bytes) for name in "abc"] + [("d.jpg", b"not an image")]
+    status, body = response(call(app, "POST", "/recognize/batch", multipart(files),
+                                 [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]))
+    lines = [json.loads(line) for line in body.decode().splitlines()]
+    assert status == 200
+    assert sorted((line["index"], line["filename"], line["error"]) for line in lines) == [
+        (0, "a.jpg", None), (1, "b.jpg", None), (2, "c.jpg", None), (3, "d.jpg", "Invalid image")]
+    assert app.calls == [["a.jpg", "b.jpg"], ["c.jpg", None]]
+    assert app.admission.in_use == 0
+
+
+def test_failure_after_headers_ends_the_stream_with_an_error_line(app, image_bytes, monkeypatch):
+    monkeypatch.setattr(service, "BATCH_MAX_IMAGES", 1)
+    files = [("a.jpg", image_bytes), ("fail.jpg", image_bytes)]
+    sent = call(app, "POST", "/recognize/batch", multipart(files),
+                [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())])
+    status, body = response(sent)
+    lines = [json.loads(line) for line in body.decode().splitlines()]
+    assert status == 200
+    assert lines[-1] == {"error": "Internal server error"}
+    assert app.metrics.requests == {("/recognize/batch", 200): 1}
+
+
+def test_disconnect_frees_the_room_of_dropped_groups(app, image_bytes, monkeypatch):
+    monkeypatch.setattr(service, "BATCH_MAX_IMAGES", 1)
+    files = [(f"{index}.jpg", image_bytes) for index in range(6)]
+    body = multipart(files)
+    incoming = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            raise ConnectionResetError("client went away")
+
+    scope = {"type": "http", "method": "POST", "path": "/recognize/batch", "query_string": b"",
+             "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]}
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(app(scope, receive, send))
+    app.executor.shutdown(wait=True)
+    assert app.admission.in_use == 0
@@ -0,0 +1,96 @@
+"""Tests for coalescing concurrent identical calls"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.single_flight import SingleFlight, AsyncSingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    group = SingleFlight()
+    calls = []
+
+    def fetch(name):
+        calls.append(name)
+        time.sleep(0.2)
+        return f"{name} info"
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        results = list(executor.map(lambda _: group.do("pizza", fetch, "pizza"), range(5)))
+    assert results == ["pizza info"] * 5
+    assert calls == ["pizza"]
+    assert group.stats() == {"executed": 1, "deduplicated": 4, "in_flight": 0}
+
+
+def test_waiting_callers_get_the_error_and_nothing_is_remembered():
+    group = SingleFlight()
+    started = threading.Event()
+
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise ConnectionError("down")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(group.do, "k", fail)
+        started.wait(5)
+        follower = executor.submit(group.do, "k", fail)
+        for future in (leader, follower):
+            with pytest.raises(ConnectionError):
+                future.result()
+    assert group.do("k", lambda: "fresh") == "fresh"
+
+
+def test_different_keys_run_separately():
+    group = SingleFlight()
+    assert [group.do(key, str.upper, key) for key in ("a", "b")] == ["A", "B"]
+    assert group.stats()["executed"] == 2
+
+
+def test_async_callers_share_one_call():
+    group = AsyncSingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "rice"
+
+    async def run():
+        return await asyncio.gather(*(group.do("k", fetch) for _ in range(4)))
+
+    assert asyncio.run(run()) == ["rice"] * 4
+    assert calls == [1] and group.in_flight() == 0
+
+
+def test_async_call_survives_one_cancelled_caller_but_not_all():
+    group = AsyncSingleFlight()
+    cancelled = []
+
+    async def fetch():
+        try:
+            await asyncio.sleep(0.1)
+            return "soup"
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        impatient = asyncio.ensure_future(group.do("a", fetch))
+        patient = asyncio.ensure_future(group.do("a", fetch))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        first = await patient
+        # Once every caller of a call gives up, the call itself is cancelled
+        alone = asyncio.ensure_future(group.do("b", fetch))
+        await asyncio.sleep(0.01)
+        alone.cancel()
+        await asyncio.sleep(0.01)
+        return first
+
+    assert asyncio.run(run()) == "soup"
+    assert cancelled == [1]
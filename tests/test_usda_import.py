@@ -0,0 +1,121 @@
+"""Tests for the FoodData Central importer and the local food database it builds"""
+
+import csv
+import io
+import json
+import zipfile
+
+import pytest
+
+import data.food_calories as food_calories
+from data.food_db import FoodDatabase, lookup_names
+from data.usda_import import import_bulk, iter_json_array_items, canonical_amount
+
+CSV_FILES = {
+    "food.csv": [
+        ("fdc_id", "data_type", "description"),
+        (1, "foundation_food", "Apples, raw, with skin"),
+        (2, "branded_food", "Apples"),
+        (3, "experimental_food", "Moon cheese"),
+    ],
+    "nutrient.csv": [("id", "name", "unit_name"), (1008, "Energy", "KCAL"), (1003, "Protein", "G"),
+                     (1093, "Sodium, Na", "MG"), (1087, "Calcium, Ca", "G")],
+    "food_nutrient.csv": [
+        ("id", "fdc_id", "nutrient_id", "amount"),
+        (10, 1, 1008, 52), (11, 1, 1003, 0.3), (12, 1, 1093, 1), (13, 1, 1087, 0.006),
+        (20, 2, 1008, 60), (30, 3, 1008, 400),
+    ],
+    "measure_unit.csv": [("id", "name"), (1000, "cup")],
+    "food_portion.csv": [("id", "fdc_id", "seq_num", "amount", "measure_unit_id", "portion_description",
+                          "modifier", "gram_weight"),
+                         (1, 1, 2, 1, 1000, "", "sliced", 110), (2, 1, 1, 1, 9999, "1 medium", "", 200)],
+}
+
+
+def write_csv_download(directory):
+    directory.mkdir()
+    for name, rows in CSV_FILES.items():
+        with open(directory / name, "w", newline="", encoding="utf-8") as csv_file:
+            csv.writer(csv_file).writerows(rows)
+    return directory
+
+
+def json_food(fdc_id, description, nutrients, data_type="Foundation", **extra):
+    return {"fdcId": fdc_id, "description": description, "dataType": data_type, **extra, "foodNutrients": [
+        {"nutrient": {"id": nutrient_id, "unitName": unit}, "amount": amount} for nutrient_id, unit, amount in nutrients
+    ]}
+
+
+def test_json_items_are_decoded_across_chunk_boundaries():
+    items = [{"description": "a ] tricky, name"}, [1, 2], {"nested": {"x": "[y]"}}]
+    stream = io.StringIO(json.dumps({"FoundationFoods": items}, indent=2))
+    assert list(iter_json_array_items(stream, chunk_size=3)) == items
+    assert list(iter_json_array_items(io.StringIO('{"Foods": []}'))) == []
+
+
+def test_amounts_are_converted_to_the_apps_units():
+    assert canonical_amount(1093, "2.5", "G") == pytest.approx(2500)
+    assert canonical_amount(1008, 52, "KCAL") == 52
+    assert canonical_amount(1008, 200, "KJ") is None
+    assert canonical_amount(9999, 1, "G") is None
+
+
+def test_lookup_names_cover_the_head_and_its_singular():
+    assert lookup_names("Apples, raw, with skin") == {"apples raw with skin", "apples", "apple"}
+
+
+def test_csv_download_is_imported(tmp_path):
+    db_path = str(tmp_path / "foods.db")
+    assert import_bulk([str(write_csv_download(tmp_path / "csv"))], db_path, vacuum=False) == 2
+    db = FoodDatabase(db_path)
+    apple = db.lookup("Apple")
+    # The foundation food beats the branded one, scaled to its first portion
+    assert apple["details"]["fdc_id"] == 1
+    assert (apple["calories"], apple["portion"]) == (104, "1 medium (200g)")
+    nutrients = {nutrient["name"]: (nutrient["value"], nutrient["unit"]) for nutrient in apple["details"]["nutrients"]}
+    assert nutrients == {"Protein": (0.6, "g"), "Sodium": (2.0, "mg"), "Calcium": (12.0, "mg")}
+    assert db.lookup("moon cheese") is None
+    db.close()
+
+
+def test_json_download_in_a_zip_is_imported(tmp_path):
+    foods = [
+        json_food(5, "Kale, raw", [(2047, "KCAL", 35), (1003, "G", 2.9)],
+                  foodPortions=[{"sequenceNumber": 1, "amount": 1, "measureUnit": {"name": "cup"}, "gramWeight": 20}]),
+        json_food(6, "Tea bag", [(1003, "G", 0)]),
+        json_food(7, "Granola", [(1008, "KCAL", 470)], data_type="Branded", brandOwner="Oats Co",
+                  servingSize=50, servingSizeUnit="g", householdServingFullText="1/2 cup"),
+    ]
+    archive = tmp_path / "foods.zip"
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("export/foundation.json", json.dumps({"FoundationFoods": foods}))
+    db_path = str(tmp_path / "foods.db")
+    # The tea bag has no energy value and is skipped
+    assert import_bulk([str(archive)], db_path) == 2
+    db = FoodDatabase(db_path)
+    kale = db.lookup("kale")
+    assert (kale["calories"], kale["portion"]) == (7, "1 cup (20g)")
+    granola = db.lookup("granola")
+    assert (granola["calories"], granola["portion"], granola["details"]["brand"]) == (235, "1/2 cup (50g)", "Oats Co")
+    db.close()
+
+
+def test_sources_without_food_files_are_rejected(tmp_path):
+    (tmp_path / "empty").mkdir()
+    with pytest.raises(ValueError):
+        import_bulk([str(tmp_path / "empty")], str(tmp_path / "foods.db"))
+
+
+def test_exact_usda_names_beat_loose_builtin_matches(tmp_path, monkeypatch):
+    archive = tmp_path / "foods.zip"
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("pie.json", json.dumps({"FoundationFoods": [json_food(8, "Apple pie", [(1008, "KCAL", 237)])]}))
+    db_path = str(tmp_path / "foods.db")
+    import_bulk([str(archive)], db_path)
+    db = FoodDatabase(db_path)
+    monkeypatch.setattr(food_calories, "get_food_database", lambda: db)
+    assert food_calories.get_food_calories("Apple pie")["calories"] == 237
+    # Exact built-in names still come first, and loose matches still fall back to the built-in table
+    assert food_calories.get_food_calories("apple")["calories"] == 95
+    assert food_calories.get_food_calories("green apple slices")["calories"] == 95
+    db.close()